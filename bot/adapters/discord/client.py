@@ -15,6 +15,7 @@ from bot import exceptions
 from bot import logger
 from bot import service
 from bot.adapters import mixins
+from bot.common import media
 from bot.common import utils
 
 MAX_RESIZE_TRIES = 3
@@ -73,6 +74,8 @@ class DiscordClient(mixins.BotMixin, discord.Client):
 
     def __init__(self, *, intents: discord.Intents, **options: typing.Any) -> None:
         super().__init__(intents=intents, **options)
+        # Tasks handling a message, keyed by the id of their "working on it" message
+        self._tasks: typing.Dict[int, asyncio.Task] = {}
 
         commands: typing.List[app_commands.Command] = [
             app_commands.Command(
@@ -141,12 +144,29 @@ class DiscordClient(mixins.BotMixin, discord.Client):
             )
         )[1]
 
+        # Deleting the working message cancels the download and any queued transcoding
+        self._tasks[new_message.id] = asyncio.current_task()
+        try:
+            msg = await self._fetch_and_send_post(message=message, new_message=new_message, user=user, url=url)
+        finally:
+            self._tasks.pop(new_message.id, None)
+
+        await asyncio.gather(msg.add_reaction('❌'), new_message.delete())
+
+    async def _fetch_and_send_post(
+        self,
+        message: discord.Message,
+        new_message: discord.Message,
+        user: discord.User,
+        url: str,
+    ) -> discord.Message:
         try:
             post = await service.get_post(
                 url=url,
                 server_vendor=constants.ServerVendor.DISCORD,
                 server_uid=str(message.guild.id),
                 author_uid=str(message.author.id),
+                upload_limit=message.guild.filesize_limit,
             )
             if not post:
                 raise exceptions.IntegrationClientError('Failed to fetch post')
@@ -167,6 +187,7 @@ class DiscordClient(mixins.BotMixin, discord.Client):
                 post=post,
                 send_func=message.channel.send,
                 author=user,
+                upload_limit=message.guild.filesize_limit,
                 reference=message.reference,
             )
             logger.info('User sent message with url', user=user.display_name, url=url)
@@ -176,7 +197,7 @@ class DiscordClient(mixins.BotMixin, discord.Client):
                 content=f'Failed sending discord message for {url} ({user.mention}).\nError: {str(e)}'
             )
 
-        await asyncio.gather(msg.add_reaction('❌'), new_message.delete())
+        return msg
 
     async def on_message(self, message: discord.Message):
         if message.author == self.user or message.guild is None:
@@ -184,6 +205,12 @@ class DiscordClient(mixins.BotMixin, discord.Client):
 
         await self._handle_message(message=message, user=message.author)
 
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        task = self._tasks.pop(payload.message_id, None)
+        if task is not None and not task.done():
+            logger.info('Working message deleted, cancelling', message_id=payload.message_id)
+            task.cancel()
+
     async def on_reaction_add(self, reaction: discord.Reaction, user: discord.User):
         if not self.user:
             logger.warning('Discord bot not logged in')
@@ -228,6 +255,7 @@ class DiscordClient(mixins.BotMixin, discord.Client):
                 server_vendor=constants.ServerVendor.DISCORD,
                 server_uid=str(interaction.guild_id),
                 author_uid=str(interaction.user.id),
+                upload_limit=interaction.guild.filesize_limit if interaction.guild else None,
             )
             if not post:
                 raise exceptions.IntegrationClientError('Failed to fetch post')
@@ -245,6 +273,7 @@ class DiscordClient(mixins.BotMixin, discord.Client):
             post=post,
             send_func=partial(interaction.followup.send, view=CustomView()),
             author=interaction.user,
+            upload_limit=interaction.guild.filesize_limit if interaction.guild else media.DEFAULT_UPLOAD_LIMIT,
         )
 
     async def get_comments_cmd(
@@ -418,6 +447,7 @@ class DiscordClient(mixins.BotMixin, discord.Client):
         post: domain.Post,
         send_func: typing.Callable,
         author: typing.Union[discord.User, discord.Member],
+        upload_limit: int = media.DEFAULT_UPLOAD_LIMIT,
         reference: typing.Optional[discord.MessageReference] = None,
         retries: int = 0,
     ) -> discord.Message:
@@ -429,6 +459,17 @@ class DiscordClient(mixins.BotMixin, discord.Client):
         file = None
         if post.buffer:
             extension = utils.guess_extension_from_buffer(buffer=post.buffer)
+            if retries == 0:
+                # Discord would reject it anyway, fit it before uploading
+                try:
+                    post.buffer = await utils.fit_to_size(
+                        buffer=post.buffer,
+                        max_size=upload_limit,
+                        extension=extension,
+                    )
+                    extension = utils.guess_extension_from_buffer(buffer=post.buffer)
+                except Exception as e:
+                    logger.warning('Failed fitting media to upload limit', upload_limit=upload_limit, error=str(e))
             file = discord.File(
                 fp=post.buffer,
                 filename=f'{"SPOILER_" if post.spoiler else ""}file{extension}',
@@ -446,10 +487,17 @@ class DiscordClient(mixins.BotMixin, discord.Client):
             if e.status != 413:  # Payload too large
                 raise e
             if post.buffer is not None and retries < MAX_RESIZE_TRIES:
-                logger.info('File too large, resizing...', size=post.buffer.getbuffer().nbytes)
+                logger.info('File too large, resizing...', size=media.buffer_size(post.buffer))
                 post.buffer.seek(0)
                 post.buffer = await utils.resize(buffer=post.buffer, extension=extension)
-                return await self._send_post(post=post, send_func=send_func, author=author, retries=retries + 1)
+                return await self._send_post(
+                    post=post,
+                    send_func=send_func,
+                    author=author,
+                    upload_limit=upload_limit,
+                    reference=reference,
+                    retries=retries + 1,
+                )
             if retries >= MAX_RESIZE_TRIES:
                 try:
                     content = (
@@ -474,7 +522,14 @@ class DiscordClient(mixins.BotMixin, discord.Client):
         except utils.SSL_ERRORS as e:
             # Retry on SSL errors
             logger.error('SSL Error, retrying', error=str(e))
-            return await self._send_post(post=post, send_func=send_func, author=author)
+            return await self._send_post(
+                post=post,
+                send_func=send_func,
+                author=author,
+                upload_limit=upload_limit,
+                reference=reference,
+                retries=retries,
+            )
 
     async def _send_comments(
         self,
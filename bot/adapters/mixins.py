@@ -1,7 +1,7 @@
 import typing
 
 from bot import constants
-from bot import models
+from bot import repository
 
 
 class BotMixin:
@@ -15,6 +15,4 @@ class BotMixin:
         if integration:
             kwargs['integration'] = integration
 
-        num_deleted, _ = models.Post.objects.filter(**kwargs).delete()
-
-        return num_deleted
+        return repository.delete_posts(**kwargs)
@@ -1,8 +1,8 @@
 import json
 import os
+import shutil
 import sys
 import typing
-from io import BytesIO
 
 from django.conf import settings
 
@@ -12,6 +12,7 @@ from bot import service
 from bot.adapters import base
 from bot.adapters import mixins
 from bot.adapters.terminal import config
+from bot.common import media
 from bot.common import utils
 
 
@@ -100,7 +101,7 @@ class TerminalBot(base.BaseBot, mixins.BotMixin):
             logger.exception('Failed processing URL', url=url, error=str(e))
             return {'url': url, 'success': False, 'error': str(e)}
 
-    async def _save_media_file(self, buffer: BytesIO, url: str) -> str:
+    async def _save_media_file(self, buffer: typing.BinaryIO, url: str) -> str:
         """Save media buffer to working directory and return filename."""
 
         # Generate filename
@@ -121,7 +122,7 @@ class TerminalBot(base.BaseBot, mixins.BotMixin):
         # Write buffer to file
         buffer.seek(0)
         with open(filename, 'wb') as f:
-            f.write(buffer.read())
+            shutil.copyfileobj(buffer, f, media.CHUNK_SIZE)
 
         logger.info('Saved media file', filename=filename)
         return filename
@@ -1,14 +1,26 @@
+import collections
+import copy
 import enum
+import threading
+import time
 import typing
+from dataclasses import dataclass
 
+from django.conf import settings
 from django.core import cache
 
+from bot import logger
+
 
 class Store(enum.Enum):
     SERVER = 'server'
-    SERVER_POST_COUNT = 'server_post_count'
     SERVER_USER_BANNED = 'server_user_banned'
     SERVER_INTEGRATION_POST_FORMAT = 'srv_int_post_fmt'
+    SERVER_POST_RATE = 'server_post_rate'
+
+
+# Counters change in other processes all the time, so they are never kept in process
+_L1_EXCLUDED_STORES = frozenset([Store.SERVER_POST_RATE])
 
 
 NO_HIT = -1
@@ -16,6 +28,118 @@ NO_HIT = -1
 _DEFAULT_TTL = 60 * 60 * 2  # 2 hours
 _KEY_FORMAT = '{store}_{key}'
 
+# In-process cache in front of the django cache, values are copied in and out like the django cache pickles them
+_DEFAULT_L1_MAX_ENTRIES = 4096
+_DEFAULT_L1_TTL = 60
+# Nothing to save in front of these, and the dummy cache can not share the epoch with other processes
+_L1_DISABLED_BACKENDS = frozenset(
+    [
+        'django.core.cache.backends.dummy.DummyCache',
+        'django.core.cache.backends.locmem.LocMemCache',
+    ]
+)
+# Deletes bump a shared epoch, other processes drop their L1 once they notice it changed
+_EPOCH_KEY = 'l1_epoch'
+_EPOCH_CHECK_INTERVAL = 1.0
+
+
+@dataclass
+class StoreStats:
+    l1_hits: int = 0
+    l2_hits: int = 0
+    misses: int = 0
+
+    @property
+    def l1_hit_ratio(self) -> float:
+        total = self.l1_hits + self.l2_hits + self.misses
+        return self.l1_hits / total if total else 0.0
+
+    @property
+    def l2_hit_ratio(self) -> float:
+        total = self.l2_hits + self.misses
+        return self.l2_hits / total if total else 0.0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.l1_hits + self.l2_hits + self.misses
+        return (self.l1_hits + self.l2_hits) / total if total else 0.0
+
+
+class _LRU:
+    def __init__(self, max_entries: int, ttl: int) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[str, typing.Tuple[float, typing.Any]] = collections.OrderedDict()
+        self._epoch: typing.Any = None
+        self._epoch_checked_at = 0.0
+
+    def _sync(self) -> None:
+        now = time.monotonic()
+        if now - self._epoch_checked_at < _EPOCH_CHECK_INTERVAL:
+            return
+
+        self._epoch_checked_at = now
+        epoch = cache.cache.get(_EPOCH_KEY)
+        if epoch != self._epoch:
+            with self._lock:
+                self._entries.clear()
+            self._epoch = epoch
+
+    def get(self, key: str) -> typing.Any:
+        if self.max_entries <= 0:
+            return NO_HIT
+
+        self._sync()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return NO_HIT
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return NO_HIT
+
+            self._entries.move_to_end(key)
+            value = entry[1]
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: typing.Any, timeout: int) -> None:
+        if self.max_entries <= 0:
+            return
+
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + min(timeout, self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+        cache.cache.add(_EPOCH_KEY, 0, timeout=None)
+        try:
+            cache.cache.incr(_EPOCH_KEY)
+        except ValueError:
+            pass
+
+
+_l1: typing.Optional[_LRU] = None
+_stats: typing.Dict[Store, StoreStats] = {store: StoreStats() for store in Store}
+
+
+def _get_l1() -> _LRU:
+    global _l1  # pylint: disable=global-statement
+    if _l1 is None:
+        config = getattr(settings, 'L1_CACHE', {})
+        backend = settings.CACHES.get('default', {}).get('BACKEND')
+        _l1 = _LRU(
+            max_entries=0 if backend in _L1_DISABLED_BACKENDS else config.get('max_entries', _DEFAULT_L1_MAX_ENTRIES),
+            ttl=config.get('ttl', _DEFAULT_L1_TTL),
+        )
+    return _l1
+
 
 def _build_key(store: Store, key: str) -> str:
     return _KEY_FORMAT.format(store=store.value, key=key)
@@ -27,23 +151,90 @@ def set(  # pylint: disable=redefined-builtin
     value: typing.Any,
     override_timeout: typing.Optional[int] = None,
 ) -> None:
-    cache.cache.set(key=_build_key(store=store, key=key), value=value, timeout=override_timeout or _DEFAULT_TTL)
+    set_many(values={(store, key): value}, override_timeout=override_timeout)
 
 
-def get(store: Store, key: str) -> typing.Any:
-    return cache.cache.get(
-        key=_build_key(store=store, key=key),
-        default=NO_HIT,
-    )
+def set_many(
+    values: typing.Dict[typing.Tuple[Store, str], typing.Any],
+    override_timeout: typing.Optional[int] = None,
+) -> None:
+    timeout = override_timeout or _DEFAULT_TTL
+    built = {(store, _build_key(store=store, key=key)): value for (store, key), value in values.items()}
 
+    cache.cache.set_many({k: value for (_, k), value in built.items()}, timeout=timeout)
+    for (store, k), value in built.items():
+        if store not in _L1_EXCLUDED_STORES:
+            _get_l1().set(key=k, value=value, timeout=timeout)
 
-def delete(store: Store, key: str) -> None:
-    cache.cache.delete(key=_build_key(store=store, key=key))
+
+def get(store: Store, key: str) -> typing.Any:
+    return get_many(keys=[(store, key)]).get((store, key), NO_HIT)
+
+
+def get_many(keys: typing.Iterable[typing.Tuple[Store, str]]) -> typing.Dict[typing.Tuple[Store, str], typing.Any]:
+    """
+    Returns hits only, keys missing from the in-process cache are fetched in a single round trip.
+    """
+    hits = {}
+    l2_keys = {}
+    for store, key in keys:
+        k = _build_key(store=store, key=key)
+        value = _get_l1().get(k) if store not in _L1_EXCLUDED_STORES else NO_HIT
+        if value != NO_HIT:
+            _stats[store].l1_hits += 1
+            hits[(store, key)] = value
+        else:
+            l2_keys[k] = (store, key)
+
+    if not l2_keys:
+        return hits
+
+    values = cache.cache.get_many(list(l2_keys))
+    for k, (store, key) in l2_keys.items():
+        if k not in values:
+            _stats[store].misses += 1
+            continue
+
+        _stats[store].l2_hits += 1
+        hits[(store, key)] = values[k]
+        if store not in _L1_EXCLUDED_STORES:
+            # The remaining L2 TTL is unknown, so the L1 TTL is used
+            _get_l1().set(key=k, value=values[k], timeout=_DEFAULT_TTL)
+
+    return hits
+
+
+def increment(store: Store, key: str, override_timeout: typing.Optional[int] = None) -> None:
+    k = _build_key(store=store, key=key)
+    timeout = override_timeout or _DEFAULT_TTL
+    # add is a no-op if the key exists, so concurrent increments never overwrite each other
+    cache.cache.add(key=k, value=0, timeout=timeout)
+    try:
+        cache.cache.incr(key=k)
+    except ValueError:
+        # Evicted in between
+        cache.cache.add(key=k, value=1, timeout=timeout)
 
 
-def increment(store: Store, key: str, delta: int = 1) -> None:
+def delete(store: Store, key: str) -> None:
     k = _build_key(store=store, key=key)
-    if cache.cache.has_key(k):
-        cache.cache.incr(key=k, delta=delta)
-    else:
-        cache.cache.set(key=k, value=delta)
+    cache.cache.delete(key=k)
+    _get_l1().delete(key=k)
+
+
+def stats() -> typing.Dict[Store, StoreStats]:
+    return {store: StoreStats(**vars(store_stats)) for store, store_stats in _stats.items()}
+
+
+def log_stats() -> None:
+    for store, store_stats in stats().items():
+        logger.info(
+            'Cache stats',
+            store=store.value,
+            l1_hits=store_stats.l1_hits,
+            l2_hits=store_stats.l2_hits,
+            misses=store_stats.misses,
+            l1_hit_ratio=round(store_stats.l1_hit_ratio, 3),
+            l2_hit_ratio=round(store_stats.l2_hit_ratio, 3),
+            hit_ratio=round(store_stats.hit_ratio, 3),
+        )
@@ -0,0 +1,279 @@
+import abc
+import datetime
+import functools
+import hashlib
+import hmac
+import os
+import tempfile
+import typing
+from urllib import parse
+
+import pydantic
+import requests
+from django.conf import settings
+
+from bot import exceptions
+from bot import logger
+from bot.common import media
+
+_EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+
+
+def content_hash(buffer: typing.BinaryIO) -> str:
+    buffer.seek(0)
+    digest = hashlib.sha256()
+    while chunk := buffer.read(media.CHUNK_SIZE):
+        digest.update(chunk)
+    buffer.seek(0)
+    return digest.hexdigest()
+
+
+class BlobStore(abc.ABC):
+    """
+    Content addressed storage for media, blobs are keyed by the sha256 hex digest of their content,
+    so identical media is stored only once.
+    """
+
+    @abc.abstractmethod
+    def put(self, buffer: typing.BinaryIO) -> str:
+        """
+        Stores the buffer (if not stored yet) and returns its key.
+        """
+
+    @abc.abstractmethod
+    def open(self, key: str) -> typing.Optional[typing.BinaryIO]:
+        """
+        Returns a readable buffer for the blob or None if it does not exist.
+        """
+
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+
+class LocalConfig(pydantic.BaseModel):
+    path: str
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Stores blobs as files under <path>/<key[:2]>/<key[2:4]>/<key>, reads are streamed from the file.
+    """
+
+    def __init__(self, config: LocalConfig) -> None:
+        self.root = config.path
+        self._tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(self._tmp_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, buffer: typing.BinaryIO) -> str:
+        digest = hashlib.sha256()
+        buffer.seek(0)
+        # Hash while copying, the temp file is in the same filesystem so it can be atomically moved in place
+        with tempfile.NamedTemporaryFile(dir=self._tmp_dir, delete=False) as tmp:
+            while chunk := buffer.read(media.CHUNK_SIZE):
+                digest.update(chunk)
+                tmp.write(chunk)
+        buffer.seek(0)
+
+        key = digest.hexdigest()
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(tmp.name)
+            return key
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp.name, path)
+        return key
+
+    def open(self, key: str) -> typing.Optional[typing.BinaryIO]:
+        try:
+            return media.FileBuffer(self._path(key))
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Config(pydantic.BaseModel):
+    endpoint_url: str
+    bucket: str
+    access_key: str
+    secret_key: str
+    region: str = 'us-east-1'
+    prefix: str = ''
+    timeout: float = 30.0
+
+
+class S3BlobStore(BlobStore):
+    """
+    Stores blobs in an S3 compatible bucket (AWS, MinIO, R2, ...) using path style addressing.
+    """
+
+    def __init__(self, config: S3Config) -> None:
+        self.config = config
+        self._host = parse.urlsplit(config.endpoint_url).netloc
+        self._session = requests.Session()
+
+    def _path(self, key: str) -> str:
+        return f'/{self.config.bucket}/{self.config.prefix}{key}'
+
+    def _request(
+        self,
+        method: str,
+        key: str,
+        payload_hash: str = _EMPTY_SHA256,
+        headers: typing.Optional[typing.Dict[str, str]] = None,
+        **kwargs: typing.Any,
+    ) -> requests.Response:
+        path = self._path(key)
+        headers = sign_v4(
+            method=method,
+            host=self._host,
+            path=path,
+            headers=headers or {},
+            payload_hash=payload_hash,
+            region=self.config.region,
+            access_key=self.config.access_key,
+            secret_key=self.config.secret_key,
+        )
+        return self._session.request(
+            method=method,
+            url=self.config.endpoint_url.rstrip('/') + path,
+            headers=headers,
+            timeout=self.config.timeout,
+            **kwargs,
+        )
+
+    def put(self, buffer: typing.BinaryIO) -> str:
+        key = content_hash(buffer)
+        if self.exists(key):
+            return key
+
+        # The key is the sha256 of the content, which is also the payload hash the request is signed with
+        resp = self._request(
+            method='PUT',
+            key=key,
+            payload_hash=key,
+            headers={'Content-Length': str(media.buffer_size(buffer))},
+            data=buffer,
+        )
+        buffer.seek(0)
+        resp.raise_for_status()
+        return key
+
+    def open(self, key: str) -> typing.Optional[typing.BinaryIO]:
+        with self._request(method='GET', key=key, stream=True) as resp:
+            if resp.status_code == 404:
+                return None
+            resp.raise_for_status()
+
+            buffer = media.spooled_buffer()
+            for chunk in resp.iter_content(chunk_size=media.CHUNK_SIZE):
+                buffer.write(chunk)
+
+        buffer.seek(0)
+        return buffer
+
+    def exists(self, key: str) -> bool:
+        resp = self._request(method='HEAD', key=key)
+        if resp.status_code == 404:
+            return False
+        resp.raise_for_status()
+        return True
+
+    def delete(self, key: str) -> None:
+        self._request(method='DELETE', key=key).raise_for_status()
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+def sign_v4(
+    method: str,
+    host: str,
+    path: str,
+    headers: typing.Dict[str, str],
+    payload_hash: str,
+    region: str,
+    access_key: str,
+    secret_key: str,
+    service: str = 's3',
+    now: typing.Optional[datetime.datetime] = None,
+) -> typing.Dict[str, str]:
+    """
+    Returns headers signed with AWS signature version 4.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    date = now.strftime('%Y%m%d')
+
+    headers = {
+        **headers,
+        'Host': host,
+        'X-Amz-Date': amz_date,
+        'X-Amz-Content-SHA256': payload_hash,
+    }
+    canonical = {name.lower(): str(value).strip() for name, value in headers.items()}
+    signed_headers = ';'.join(sorted(canonical))
+    canonical_request = '\n'.join(
+        [
+            method,
+            parse.quote(path),
+            '',
+            ''.join(f'{name}:{canonical[name]}\n' for name in sorted(canonical)),
+            signed_headers,
+            payload_hash,
+        ]
+    )
+
+    scope = f'{date}/{region}/{service}/aws4_request'
+    string_to_sign = '\n'.join(
+        [
+            'AWS4-HMAC-SHA256',
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+
+    signing_key = _hmac(('AWS4' + secret_key).encode(), date)
+    for part in (region, service, 'aws4_request'):
+        signing_key = _hmac(signing_key, part)
+    signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    headers['Authorization'] = (
+        f'AWS4-HMAC-SHA256 Credential={access_key}/{scope}, SignedHeaders={signed_headers}, Signature={signature}'
+    )
+    return headers
+
+
+@functools.cache
+def get_store() -> BlobStore:
+    config = dict(getattr(settings, 'BLOB_STORE', {}))
+    backend = config.pop('backend', 'local')
+
+    if backend == 'local':
+        config['path'] = str(config.get('path') or os.path.join(settings.BASE_DIR, 'blobs'))
+        store: BlobStore = LocalBlobStore(LocalConfig.model_validate(config))
+    elif backend == 's3':
+        store = S3BlobStore(S3Config.model_validate(config))
+    else:
+        raise exceptions.ConfigurationError(f'Unknown blob store backend: {backend}')
+
+    logger.info('Blob store initialized', backend=backend)
+    return store
@@ -0,0 +1,176 @@
+import asyncio
+import contextlib
+import typing
+import urllib.parse
+from dataclasses import dataclass
+
+import pydantic
+from playwright import async_api as playwright
+
+from bot import logger
+
+_LAUNCH_ARGS = [
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-setuid-sandbox',
+]
+
+
+class BrowserConfig(pydantic.BaseModel):
+    browsers: int = 1
+    # Contexts (requests) served by a browser before it is replaced
+    max_pages: int = 50
+    blocked_resource_types: typing.List[str] = ['image', 'media', 'font']
+    blocked_domains: typing.List[str] = [
+        'bat.bing.com',
+        'doubleclick.net',
+        'facebook.net',
+        'google-analytics.com',
+        'googletagmanager.com',
+        'px.ads.linkedin.com',
+        'scorecardresearch.com',
+        'snap.licdn.com',
+    ]
+
+
+@dataclass
+class PoolStats:
+    contexts: int = 0
+    launched: int = 0
+    recycled: int = 0
+    crashed: int = 0
+    blocked_requests: int = 0
+
+
+class _Browser:
+    def __init__(self, browser: playwright.Browser) -> None:
+        self.browser = browser
+        self.pages = 0
+        self.active = 0
+        self.retired = False
+
+
+class BrowserPool:
+    """
+    Keeps up to config.browsers headless Chromium browsers running, bound to the running event loop. Every request
+    gets its own isolated context on the least busy browser. Browsers are replaced after config.max_pages contexts
+    or once they crash. Blocked resource types and domains are aborted instead of loaded.
+    """
+
+    def __init__(self, name: str, config: typing.Optional[BrowserConfig] = None) -> None:
+        self.name = name
+        self.config = config or BrowserConfig()
+        self._stats = PoolStats()
+        self._playwright: typing.Optional[playwright.Playwright] = None
+        self._browsers: typing.List[_Browser] = []
+        self._lock: typing.Optional[asyncio.Lock] = None
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            # Browsers of a previous loop can't be used anymore
+            self._lock = asyncio.Lock()
+            self._loop = loop
+            self._playwright = None
+            self._browsers = []
+        return self._lock
+
+    async def _launch(self) -> _Browser:
+        if self._playwright is None:
+            self._playwright = await playwright.async_playwright().start()
+
+        browser = _Browser(await self._playwright.chromium.launch(headless=True, args=_LAUNCH_ARGS))
+        browser.browser.on('disconnected', lambda _: self._on_disconnected(browser))
+        self._stats.launched += 1
+        logger.debug('Launched browser', pool=self.name)
+        return browser
+
+    def _on_disconnected(self, browser: _Browser) -> None:
+        if browser.retired:
+            return
+
+        self._stats.crashed += 1
+        logger.warning('Browser disconnected, replacing it', pool=self.name, pages=browser.pages)
+        if browser in self._browsers:
+            self._browsers.remove(browser)
+
+    async def _acquire(self) -> _Browser:
+        async with self._get_lock():
+            self._browsers = [browser for browser in self._browsers if browser.browser.is_connected()]
+            if len(self._browsers) < self.config.browsers:
+                self._browsers.append(await self._launch())
+
+            browser = min(self._browsers, key=lambda browser: browser.active)
+            browser.pages += 1
+            browser.active += 1
+            if browser.pages >= self.config.max_pages:
+                # Serves this last context, a new browser is launched for the next one
+                browser.retired = True
+                self._browsers.remove(browser)
+            return browser
+
+    async def _release(self, browser: _Browser) -> None:
+        browser.active -= 1
+        if browser.retired and browser.active == 0:
+            self._stats.recycled += 1
+            with contextlib.suppress(playwright.Error):
+                await browser.browser.close()
+
+    def _is_blocked(self, request: playwright.Request) -> bool:
+        if request.resource_type in self.config.blocked_resource_types:
+            return True
+
+        host = urllib.parse.urlsplit(request.url).hostname or ''
+        return any(host == domain or host.endswith(f'.{domain}') for domain in self.config.blocked_domains)
+
+    async def _route(self, route: playwright.Route) -> None:
+        if self._is_blocked(route.request):
+            self._stats.blocked_requests += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    @contextlib.asynccontextmanager
+    async def context(self, **kwargs: typing.Any) -> typing.AsyncIterator[playwright.BrowserContext]:
+        """
+        Yields a new browser context, kwargs are passed to Browser.new_context. It is closed on exit.
+        """
+        browser = await self._acquire()
+        context = None
+        try:
+            context = await browser.browser.new_context(**kwargs)
+            await context.route('**/*', self._route)
+            self._stats.contexts += 1
+            yield context
+        finally:
+            if context is not None:
+                with contextlib.suppress(playwright.Error):
+                    await context.close()
+            await self._release(browser)
+
+    def stats(self) -> PoolStats:
+        return PoolStats(**vars(self._stats))
+
+    async def close(self) -> None:
+        if self._playwright is None:
+            return
+
+        for browser in self._browsers:
+            browser.retired = True
+            with contextlib.suppress(playwright.Error):
+                await browser.browser.close()
+        await self._playwright.stop()
+        self._browsers = []
+        self._playwright = None
+
+        stats = self.stats()
+        logger.info(
+            'Closed browser pool',
+            pool=self.name,
+            contexts=stats.contexts,
+            launched=stats.launched,
+            recycled=stats.recycled,
+            crashed=stats.crashed,
+            blocked_requests=stats.blocked_requests,
+        )
@@ -0,0 +1,128 @@
+import asyncio
+import typing
+from dataclasses import dataclass
+
+import aiohttp
+import pydantic
+
+from bot import logger
+
+
+class HttpConfig(pydantic.BaseModel):
+    limit: int = 100
+    limit_per_host: int = 10
+    dns_cache_ttl: int = 300
+    keepalive_timeout: float = 30.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 60.0
+    total_timeout: typing.Optional[float] = None
+
+
+@dataclass
+class PoolStats:
+    requests: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+    open_connections: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        total = self.connections_created + self.connections_reused
+        return self.connections_reused / total if total else 0.0
+
+
+class SessionPool:
+    """
+    Long-lived aiohttp session with keep-alive connection pooling, bound to the running event loop.
+    """
+
+    def __init__(self, name: str, config: typing.Optional[HttpConfig] = None) -> None:
+        self.name = name
+        self.config = config or HttpConfig()
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._stats = PoolStats()
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(*_: typing.Any) -> None:
+            self._stats.requests += 1
+
+        async def on_connection_create_end(*_: typing.Any) -> None:
+            self._stats.connections_created += 1
+
+        async def on_connection_reuseconn(*_: typing.Any) -> None:
+            self._stats.connections_reused += 1
+
+        async def on_dns_cache_hit(*_: typing.Any) -> None:
+            self._stats.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(*_: typing.Any) -> None:
+            self._stats.dns_cache_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+
+        return trace_config
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.config.limit,
+                limit_per_host=self.config.limit_per_host,
+                ttl_dns_cache=self.config.dns_cache_ttl,
+                keepalive_timeout=self.config.keepalive_timeout,
+            ),
+            timeout=aiohttp.ClientTimeout(
+                total=self.config.total_timeout,
+                sock_connect=self.config.connect_timeout,
+                sock_read=self.config.read_timeout,
+            ),
+            # Shared by every server and request, so nothing is kept between requests. Cookies are passed per request
+            # and sent along its redirects.
+            cookie_jar=aiohttp.DummyCookieJar(),
+            trace_configs=[self._trace_config()],
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = self._create_session()
+            self._loop = loop
+            logger.debug('Opened http session', pool=self.name)
+
+        return self._session
+
+    def stats(self) -> PoolStats:
+        stats = PoolStats(**vars(self._stats))
+        if self._session is not None and not self._session.closed:
+            connector = self._session.connector
+            # aiohttp does not expose these publicly
+            idle = sum(len(conns) for conns in getattr(connector, '_conns', {}).values())
+            stats.open_connections = idle + len(getattr(connector, '_acquired', ()))
+
+        return stats
+
+    async def close(self) -> None:
+        if self._session is None or self._session.closed:
+            return
+
+        stats = self.stats()
+        await self._session.close()
+        self._session = None
+
+        logger.info(
+            'Closed http session',
+            pool=self.name,
+            requests=stats.requests,
+            connections_created=stats.connections_created,
+            connections_reused=stats.connections_reused,
+            reuse_ratio=round(stats.reuse_ratio, 3),
+        )
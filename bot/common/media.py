@@ -0,0 +1,124 @@
+import contextlib
+import contextvars
+import io
+import os
+import shutil
+import tempfile
+import threading
+import typing
+
+DEFAULT_UPLOAD_LIMIT = 10 * 1024 * 1024  # Discord limit for servers without boosts
+# Media above the upload limit still gets a chance to be resized, anything above this many times the limit is dropped
+MAX_DOWNLOAD_FACTOR = 8
+SPOOL_THRESHOLD = 8 * 1024 * 1024  # Keep smaller downloads in memory, spool bigger ones to disk
+CHUNK_SIZE = 64 * 1024
+
+upload_limit: contextvars.ContextVar[int] = contextvars.ContextVar('upload_limit', default=DEFAULT_UPLOAD_LIMIT)
+
+
+@contextlib.contextmanager
+def upload_limit_scope(limit: typing.Optional[int]) -> typing.Iterator[None]:
+    """
+    Sets the upload limit of the requesting server for everything fetched within the scope.
+    """
+    token = upload_limit.set(limit or DEFAULT_UPLOAD_LIMIT)
+    try:
+        yield
+    finally:
+        upload_limit.reset(token)
+
+
+def max_download_size() -> int:
+    return upload_limit.get() * MAX_DOWNLOAD_FACTOR
+
+
+def spooled_buffer() -> typing.BinaryIO:
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD)  # pylint: disable=consider-using-with
+
+
+def buffer_size(buffer: typing.BinaryIO) -> int:
+    if isinstance(buffer, io.BytesIO):
+        return buffer.getbuffer().nbytes
+
+    position = buffer.tell()
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(position)
+    return size
+
+
+class _TempFile:
+    """
+    Removes the file once every buffer reading it is closed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._refs = 0
+
+    def acquire(self) -> None:
+        with self._lock:
+            self._refs += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class FileBuffer(io.BufferedReader):
+    """
+    Read only buffer backed by a file on disk. Consumers that can work with files (ffmpeg, image workers,
+    uploads) use the path directly instead of a copy in memory, see file_path.
+    With delete, the file is removed once the last buffer reading it (see share) is closed or collected.
+    """
+
+    def __init__(self, path: str, delete: bool = False, _temp_file: typing.Optional[_TempFile] = None) -> None:
+        super().__init__(io.FileIO(path, 'rb'), buffer_size=CHUNK_SIZE)
+        self.path = path
+        self._temp_file = _temp_file or (_TempFile(path) if delete else None)
+        if self._temp_file:
+            self._temp_file.acquire()
+
+    def reopen(self) -> 'FileBuffer':
+        return FileBuffer(self.path, _temp_file=self._temp_file)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        super().close()
+        if self._temp_file:
+            self._temp_file.release()
+
+
+def file_path(buffer: typing.BinaryIO) -> typing.Optional[str]:
+    """
+    Returns the path of the file backing the buffer or None if it is only in memory.
+    """
+    return buffer.path if isinstance(buffer, FileBuffer) else None
+
+
+def share(buffer: typing.BinaryIO) -> typing.BinaryIO:
+    """
+    Returns an independent buffer (own position) with the same content, without copying it where possible.
+    """
+    if isinstance(buffer, FileBuffer):
+        return buffer.reopen()
+    if isinstance(buffer, io.BytesIO):
+        # Bytes returned by getvalue are shared copy-on-write with the new buffer
+        return io.BytesIO(buffer.getvalue())
+
+    position = buffer.tell()
+    buffer.seek(0)
+    copy = spooled_buffer()
+    shutil.copyfileobj(buffer, copy, CHUNK_SIZE)
+    buffer.seek(position)
+    copy.seek(0)
+    return copy
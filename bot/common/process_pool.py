@@ -0,0 +1,188 @@
+import asyncio
+import multiprocessing
+import resource
+import typing
+from dataclasses import dataclass
+from multiprocessing import connection
+
+from bot import exceptions
+from bot import logger
+
+_T = typing.TypeVar('_T')
+
+_DEFAULT_MAX_JOBS = 100
+_DEFAULT_MAX_RSS = 512 * 1024 * 1024
+_STOP_TIMEOUT = 1
+
+
+def _peak_rss() -> int:
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _worker_main(conn: connection.Connection, initializer: typing.Optional[typing.Callable[[], None]]) -> None:
+    if initializer is not None:
+        initializer()
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+
+        func, args, kwargs = job
+        try:
+            reply = (True, func(*args, **kwargs))
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            reply = (False, e)
+
+        try:
+            conn.send((*reply, _peak_rss()))
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Result or exception can't be pickled
+            conn.send((False, exceptions.BotError(f'{type(e).__name__}: {e}'), _peak_rss()))
+
+
+@dataclass
+class Stats:
+    jobs: int = 0
+    started: int = 0
+    recycled: int = 0
+    killed: int = 0
+
+
+class _Worker:
+    def __init__(self, initializer: typing.Optional[typing.Callable[[], None]]) -> None:
+        self.conn, child_conn = multiprocessing.Pipe()
+        # Spawned instead of forked, the bot process runs an event loop and DB threads
+        self.process = multiprocessing.get_context('spawn').Process(
+            target=_worker_main,
+            args=(child_conn, initializer),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.peak_rss = 0
+
+    async def call(self, func: typing.Callable[..., _T], *args: typing.Any, **kwargs: typing.Any) -> _T:
+        self.conn.send((func, args, kwargs))
+
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        loop.add_reader(self.conn.fileno(), lambda: readable.done() or readable.set_result(None))
+        try:
+            await readable
+        finally:
+            loop.remove_reader(self.conn.fileno())
+
+        try:
+            ok, result, self.peak_rss = self.conn.recv()
+        except (EOFError, OSError) as e:
+            self.kill()
+            raise exceptions.BotError(f'Worker process exited with {self.process.exitcode}') from e
+
+        self.jobs += 1
+        if not ok:
+            raise result
+        return result
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(_STOP_TIMEOUT)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class Pool:
+    """
+    Long-lived worker processes running jobs sent over a pipe, at most size at a time. Workers keep their state
+    (imports, initialized clients) between jobs and are replaced after max_jobs jobs or once their peak RSS
+    reaches max_rss. Cancelling a job kills its worker, so the job stops right away.
+    Functions, arguments and results must be picklable.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_jobs: int = _DEFAULT_MAX_JOBS,
+        max_rss: int = _DEFAULT_MAX_RSS,
+        initializer: typing.Optional[typing.Callable[[], None]] = None,
+        name: str = 'pool',
+    ) -> None:
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss
+        self.initializer = initializer
+        self.name = name
+        self.stats = Stats()
+        self._idle: typing.List[_Worker] = []
+        self._slots: typing.Optional[asyncio.Semaphore] = None
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._loop is not loop:
+            # Bound to the loop it is first used in
+            self._slots = asyncio.Semaphore(self.size)
+            self._loop = loop
+        return self._slots
+
+    def _get_worker(self) -> _Worker:
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.process.is_alive():
+                return worker
+            worker.kill()
+
+        self.stats.started += 1
+        return _Worker(initializer=self.initializer)
+
+    def _release(self, worker: _Worker) -> None:
+        if worker.jobs < self.max_jobs and worker.peak_rss < self.max_rss:
+            self._idle.append(worker)
+            return
+
+        logger.info(
+            'Recycling worker process',
+            pool=self.name,
+            jobs=worker.jobs,
+            peak_rss=worker.peak_rss,
+        )
+        self.stats.recycled += 1
+        # Waiting for the worker to exit would block the loop, the replacement initializes in the meantime
+        asyncio.get_running_loop().run_in_executor(None, worker.stop)
+        self.stats.started += 1
+        self._idle.append(_Worker(initializer=self.initializer))
+
+    async def run(self, func: typing.Callable[..., _T], *args: typing.Any, **kwargs: typing.Any) -> _T:
+        async with self._get_slots():
+            worker = self._get_worker()
+            self.stats.jobs += 1
+            try:
+                return await worker.call(func, *args, **kwargs)
+            except asyncio.CancelledError:
+                self.stats.killed += 1
+                worker.kill()
+                worker = None
+                raise
+            finally:
+                if worker is not None:
+                    if worker.process.is_alive():
+                        self._release(worker)
+                    else:
+                        worker.kill()
+
+    def close(self) -> None:
+        while self._idle:
+            self._idle.pop().stop()
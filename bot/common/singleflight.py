@@ -0,0 +1,60 @@
+import asyncio
+import functools
+import typing
+from dataclasses import dataclass
+
+_T = typing.TypeVar('_T')
+
+
+@dataclass
+class Stats:
+    executed: int = 0
+    coalesced: int = 0
+
+
+@dataclass
+class _Call:
+    task: asyncio.Future
+    waiters: int = 0
+
+
+class SingleFlight(typing.Generic[_T]):
+    """
+    Runs at most one call per key at a time, concurrent callers with the same key await the running call.
+    """
+
+    def __init__(self) -> None:
+        self._calls: typing.Dict[typing.Hashable, _Call] = {}
+        self.stats = Stats()
+
+    def _done(self, key: typing.Hashable, task: asyncio.Future) -> None:
+        self._calls.pop(key, None)
+        # Mark the exception as retrieved in case every caller got cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def do(
+        self,
+        key: typing.Hashable,
+        func: typing.Callable[[], typing.Awaitable[_T]],
+    ) -> typing.Tuple[_T, bool]:
+        """
+        Returns the result of func and whether it was shared with other callers.
+        Shared results must be copied before they are modified.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(task=asyncio.ensure_future(func()))
+            call.task.add_done_callback(functools.partial(self._done, key))
+            self._calls[key] = call
+            self.stats.executed += 1
+        else:
+            call.waiters += 1
+            self.stats.coalesced += 1
+
+        # Cancelling one caller must not cancel the call for the others
+        result = await asyncio.shield(call.task)
+        return result, call.waiters > 0
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -1,34 +1,210 @@
-import io
+import functools
+import glob
+import json
 import os
 import sys
+import time
+import typing
 import uuid
 
 import fake_useragent
 import yt_dlp
+from django.conf import settings
+from yt_dlp import utils as yt_dlp_utils
+
+from bot import exceptions
+from bot import logger
+from bot.common import media
+from bot.common import process_pool
+
+# yt-dlp blocks for the whole download, long-lived worker processes keep it off the event loop, bound concurrency
+# and keep imports and extractors initialized between downloads
+_DEFAULT_STREAM_DOWNLOAD_POOL_SIZE = 2
+_DEFAULT_STREAM_WORKER_MAX_JOBS = 100
+_DEFAULT_STREAM_WORKER_MAX_RSS = 512 * 1024 * 1024
+_PROGRESS_LOG_INTERVAL = 5.0
+_pool: typing.Optional[process_pool.Pool] = None
+
+# Worker process state
+_instances: typing.Dict[str, yt_dlp.YoutubeDL] = {}
+_progress: typing.Optional['_ProgressHook'] = None
+
+
+def _get_pool() -> process_pool.Pool:
+    global _pool  # pylint: disable=global-statement
+    if _pool is None:
+        _pool = process_pool.Pool(
+            size=getattr(settings, 'STREAM_DOWNLOAD_POOL_SIZE', _DEFAULT_STREAM_DOWNLOAD_POOL_SIZE),
+            max_jobs=getattr(settings, 'STREAM_WORKER_MAX_JOBS', _DEFAULT_STREAM_WORKER_MAX_JOBS),
+            max_rss=getattr(settings, 'STREAM_WORKER_MAX_RSS', _DEFAULT_STREAM_WORKER_MAX_RSS),
+            initializer=_init_worker,
+            name='yt-dlp',
+        )
+    return _pool
+
+
+def _init_worker() -> None:
+    # Loads the extractor classes, the slowest part of the first extraction
+    yt_dlp.extractor.gen_extractor_classes()
+
+
+class _ProgressHook:
+    """
+    Logs download progress and aborts the download once it grows above max_size.
+    yt-dlp calls it after every chunk.
+    """
+
+    def __init__(self, stream_url: str, max_size: int) -> None:
+        self.stream_url = stream_url
+        self.max_size = max_size
+        self.too_large: typing.Optional[int] = None
+        self._logged_at = time.monotonic()
+
+    def __call__(self, status: typing.Dict[str, typing.Any]) -> None:
+        size = max(
+            status.get('total_bytes') or 0,
+            status.get('total_bytes_estimate') or 0,
+            status.get('downloaded_bytes') or 0,
+        )
+        if size > self.max_size:
+            self.too_large = size
+            raise yt_dlp_utils.DownloadCancelled('Download too large')
+
+        now = time.monotonic()
+        if status.get('status') == 'downloading' and now - self._logged_at >= _PROGRESS_LOG_INTERVAL:
+            self._logged_at = now
+            logger.debug(
+                'Stream download progress',
+                url=self.stream_url,
+                downloaded=status.get('downloaded_bytes'),
+                total=status.get('total_bytes') or status.get('total_bytes_estimate'),
+                speed=status.get('speed'),
+            )
+
+
+@functools.cache
+def _user_agent() -> str:
+    # Picked once, warm instances are keyed by their options
+    return fake_useragent.UserAgent().random
+
+
+def _on_progress(status: typing.Dict[str, typing.Any]) -> None:
+    # Warm instances outlive downloads, so their hook forwards to the running download
+    if _progress is not None:
+        _progress(status)
+
+
+def _get_ydl(params: typing.Dict[str, typing.Any]) -> yt_dlp.YoutubeDL:
+    """
+    Returns the YoutubeDL for params. Instances are reused across downloads, so initialized extractors, cookies
+    and connections stay warm.
+    """
+    key = json.dumps(params, sort_keys=True)
+    ydl = _instances.get(key)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL(
+            {
+                **params,
+                'noplaylist': True,
+                'progress_hooks': [_on_progress],
+                'quiet': True,
+                'no_warnings': True,
+                'noprogress': True,
+            }
+        )
+        _instances[key] = ydl
+    return ydl
+
+
+def _download(
+    url: str,
+    params: typing.Dict[str, typing.Any],
+    path: str,
+    max_size: int,
+) -> typing.Tuple[typing.Dict[str, typing.Any], str]:
+    """
+    Runs in a worker process, downloads to path with the extension of the selected format.
+    """
+    global _progress  # pylint: disable=global-statement
+    ydl = _get_ydl(params)
+    progress = _ProgressHook(stream_url=url, max_size=max_size)
+
+    _progress = progress
+    try:
+        # One page fetch for both, the selected format is downloaded with the cookies of the extraction
+        info = ydl.extract_info(url, download=False)
+        if info.get('requested_formats'):
+            raise exceptions.BotError('Formats with separate video and audio streams are not supported')
+
+        size = info.get('filesize') or info.get('filesize_approx')
+        if size and size > max_size:
+            raise exceptions.MediaTooLargeError(size=size, limit=max_size)
+
+        # Processing runs the post-processors too, e.g. HLS downloads are remuxed from MPEG-TS
+        ydl.params['outtmpl']['default'] = f'{path}.%(ext)s'
+        ydl.process_info(info)
+        filename = info.get('filepath') or info.get('_filename')
+        if not filename or not os.path.exists(filename):
+            raise exceptions.BotError('Stream download failed')
+    except yt_dlp_utils.DownloadCancelled as e:
+        if progress.too_large is not None:
+            raise exceptions.MediaTooLargeError(size=progress.too_large, limit=max_size) from e
+        raise exceptions.BotError('Stream download cancelled') from e
+    except yt_dlp_utils.DownloadError as e:
+        # Holds a traceback, which can't be sent back from the worker
+        raise exceptions.IntegrationClientError(f'yt-dlp failed: {e}') from e
+    finally:
+        _progress = None
+
+    return ydl.sanitize_info(info), filename
+
+
+async def download_with_info(
+    url: str,
+    params: typing.Dict[str, typing.Any],
+    tmp_dir: str = '/tmp',
+) -> typing.Tuple[typing.Dict[str, typing.Any], typing.BinaryIO]:
+    """
+    Extracts the metadata (yt-dlp info dict) and downloads the media selected by params (yt-dlp options, e.g. format)
+    in a single pass in a stream worker process. Cancelling kills the download.
+    """
+    path = os.path.join(tmp_dir, str(uuid.uuid4()))
+    try:
+        info, filename = await _get_pool().run(
+            _download,
+            url=url,
+            params=params,
+            path=path,
+            max_size=media.max_download_size(),
+        )
+    except BaseException:
+        # Partial (.part) downloads are left behind
+        for partial in glob.glob(f'{path}.*'):
+            os.remove(partial)
+        raise
+
+    # Read straight from the downloaded file, it is removed once the buffer is closed
+    return info, media.FileBuffer(filename, delete=True)
 
 
 async def download(
     stream_url: str,
     tmp_dir: str = '/tmp',
     max_bitrate: int = sys.maxsize,
-) -> io.BytesIO:
-    with yt_dlp.YoutubeDL(
-        {
+) -> typing.BinaryIO:
+    _, buffer = await download_with_info(
+        url=stream_url,
+        params={
             'format': f'best[height<=1080][tbr<={max_bitrate // 1000}]/best[height<=1080]',
-            'outtmpl': os.path.join(tmp_dir, f'{uuid.uuid4()}.%(ext)s'),
-            'quiet': True,
-            'no_warnings': True,
-            'noprogress': True,
             'http_headers': {
-                'User-Agent': fake_useragent.UserAgent().random,
+                'User-Agent': _user_agent(),
             },
-        }
-    ) as ydl:
-        info = ydl.extract_info(stream_url, download=True)
-        filename = ydl.prepare_filename(info)
+        },
+        tmp_dir=tmp_dir,
+    )
+    return buffer
 
-    with open(filename, 'rb') as file:
-        stream_data = file.read()
-    os.remove(filename)
 
-    return io.BytesIO(stream_data)
+def close() -> None:
+    if _pool is not None:
+        _pool.close()
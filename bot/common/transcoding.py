@@ -0,0 +1,171 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+import typing
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from bot import constants
+from bot import exceptions
+from bot import logger
+
+_T = typing.TypeVar('_T')
+
+_DEFAULT_MAX_JOBS = 2
+_DEFAULT_TIMEOUT = 5 * 60
+
+# Tier of the server the media is transcoded for, higher tiers are scheduled first
+priority: contextvars.ContextVar[int] = contextvars.ContextVar(
+    'transcoding_priority',
+    default=constants.ServerTier.FREE.value,
+)
+
+
+@dataclass
+class Stats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    cancelled: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def started(self) -> int:
+        return self.completed + self.failed + self.timed_out
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.started if self.started else 0.0
+
+
+class Scheduler:
+    """
+    Runs at most max_jobs transcoding jobs at a time, waiting jobs are started by priority, then in order of submission.
+    """
+
+    def __init__(self, max_jobs: int = _DEFAULT_MAX_JOBS, timeout: float = _DEFAULT_TIMEOUT) -> None:
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.stats = Stats()
+        self._running = 0
+        self._queue: typing.List[typing.Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    def queued(self) -> int:
+        return sum(1 for _, _, waiter in self._queue if not waiter.done())
+
+    def running(self) -> int:
+        return self._running
+
+    async def _acquire(self, job_priority: int) -> None:
+        if self._running < self.max_jobs and not self.queued():
+            self._running += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (-job_priority, next(self._sequence), waiter)
+        heapq.heappush(self._queue, entry)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over right before the cancellation, pass it on
+                self._release()
+            elif entry in self._queue:
+                # A release may have popped and skipped the cancelled waiter already
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+            raise
+
+    def _release(self) -> None:
+        while self._queue:
+            _, _, waiter = heapq.heappop(self._queue)
+            if not waiter.done():
+                # Hand the slot over, the number of running jobs stays the same
+                waiter.set_result(None)
+                return
+        self._running -= 1
+
+    async def run(
+        self,
+        func: typing.Callable[[], typing.Awaitable[_T]],
+        job_priority: typing.Optional[int] = None,
+    ) -> _T:
+        """
+        Waits for a free slot and runs func in it. Cancelling the caller removes the job from the queue
+        or cancels it while running, jobs running longer than the timeout are cancelled and raise BotError.
+        """
+        job_priority = priority.get() if job_priority is None else job_priority
+        self.stats.submitted += 1
+        queued_at = time.monotonic()
+
+        try:
+            await self._acquire(job_priority)
+        except asyncio.CancelledError:
+            self.stats.cancelled += 1
+            raise
+
+        wait = time.monotonic() - queued_at
+        self.stats.total_wait += wait
+        self.stats.max_wait = max(self.stats.max_wait, wait)
+        logger.info(
+            'Transcoding job started',
+            priority=job_priority,
+            wait=round(wait, 3),
+            queued=self.queued(),
+            running=self._running,
+        )
+
+        try:
+            async with asyncio.timeout(self.timeout):
+                result = await func()
+        except TimeoutError as e:
+            self.stats.timed_out += 1
+            raise exceptions.BotError(f'Transcoding timed out after {self.timeout}s') from e
+        except asyncio.CancelledError:
+            self.stats.cancelled += 1
+            raise
+        except Exception:
+            self.stats.failed += 1
+            raise
+        finally:
+            self._release()
+
+        self.stats.completed += 1
+        return result
+
+
+_scheduler: typing.Optional[Scheduler] = None
+
+
+def get_scheduler() -> Scheduler:
+    global _scheduler  # pylint: disable=global-statement
+    if _scheduler is None:
+        config = getattr(settings, 'TRANSCODING', {})
+        _scheduler = Scheduler(
+            max_jobs=config.get('max_jobs', _DEFAULT_MAX_JOBS),
+            timeout=config.get('timeout', _DEFAULT_TIMEOUT),
+        )
+    return _scheduler
+
+
+def log_stats() -> None:
+    scheduler = get_scheduler()
+    stats = scheduler.stats
+    logger.info(
+        'Transcoding stats',
+        queued=scheduler.queued(),
+        running=scheduler.running(),
+        submitted=stats.submitted,
+        completed=stats.completed,
+        failed=stats.failed,
+        timed_out=stats.timed_out,
+        cancelled=stats.cancelled,
+        avg_wait=round(stats.avg_wait, 3),
+        max_wait=round(stats.max_wait, 3),
+    )
@@ -1,13 +1,15 @@
 import asyncio
 import datetime
 import io
+import math
 import mimetypes
+import multiprocessing
 import os
 import random
 import re
 import ssl
-import tempfile
 import typing
+from concurrent import futures
 from contextlib import contextmanager
 
 try:
@@ -20,8 +22,15 @@ import magic
 import markdownify
 from PIL import Image as pil_image
 from django import db as django_db
+from django.conf import settings
 from requests import exceptions as requests_exceptions
 
+from bot.common import media
+from bot.common import video
+
+IMAGE_EXTENSIONS = ('.jpeg', '.png', '.jpg', '.gif', '.webp')
+MAX_COMBINED_IMAGES = 3
+
 emoji = ['😼', '😺', '😸', '😹', '😻', '🙀', '😿', '😾', '😩', '🙈', '🙉', '🙊', '😳', '😢']
 
 SSL_ERRORS = (
@@ -34,6 +43,18 @@ SSL_ERRORS = (
 )
 
 
+_DEFAULT_IMAGE_PROCESS_POOL_SIZE = 2
+
+# Image encoding
+_LOSSY_QUALITIES = (90, 85, 80, 75, 70, 60, 50, 40, 30)
+_PROBE_PIXELS = 256 * 256
+_PROBE_TILE_SIZE = 64
+_LINE_ART_MAX_COLORS = 256
+_WEBP_MAX_DIMENSION = 16383
+_BUDGET_HEADROOM = 0.95  # Room for the message itself and estimation errors
+_image_executor: typing.Optional[futures.ProcessPoolExecutor] = None
+
+
 def find_first_url(string: str) -> typing.Optional[str]:
     urls = re.findall(r'(https?://[^\s]+)', string)
     return urls[0] if urls else None
@@ -45,36 +66,28 @@ def guess_extension_from_buffer(buffer: io.BytesIO) -> str:
     return extension or '.mp4'
 
 
-async def resize(buffer: io.BytesIO, extension: str = 'mp4') -> io.BytesIO:
-    if extension in ['.jpeg', '.png', '.jpg', '.gif']:
-        return resize_image(buffer)
-
-    with (
-        tempfile.NamedTemporaryFile(suffix=extension) as input_tmp,
-        tempfile.NamedTemporaryFile(suffix=extension) as output_tmp,
-    ):
-        # with open('/tmp/temp', 'w+b') as tmp:
-        input_tmp.write(buffer.read())
-
-        command = [
-            'ffmpeg',
-            '-y',
-            f'-i {input_tmp.name}',
-            '-vf "scale=trunc(iw/4)*2:trunc(ih/4)*2"',
-            '-c:v',
-            '-c:a',
-            '-vcodec libx264',
-            '-crf 28',
-            f'{output_tmp.name}',
-        ]
-        ffmpeg_proc = await asyncio.create_subprocess_shell(
-            ' '.join(command),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        await ffmpeg_proc.communicate()
+async def resize(buffer: typing.BinaryIO, extension: str = 'mp4') -> typing.BinaryIO:
+    """
+    Shrinks media that was rejected as too large by a quarter.
+    """
+    max_size = int(media.buffer_size(buffer) * 0.75)
+    if extension in IMAGE_EXTENSIONS:
+        return await resize_image(buffer, max_size=max_size)
+
+    return await video.transcode_to_size(buffer=buffer, max_size=max_size, extension=extension)
+
+
+async def fit_to_size(buffer: typing.BinaryIO, max_size: int, extension: str = 'mp4') -> typing.BinaryIO:
+    """
+    Re-encodes media above max_size so it fits, before it gets uploaded.
+    """
+    if media.buffer_size(buffer) <= max_size:
+        return buffer
 
-        return io.BytesIO(output_tmp.read())
+    if extension in IMAGE_EXTENSIONS:
+        return await resize_image(buffer, factor=1.0, max_size=max_size)
+
+    return await video.transcode_to_size(buffer=buffer, max_size=max_size, extension=extension)
 
 
 def random_emoji() -> str:
@@ -87,42 +100,246 @@ def recover_from_db_error(exc: Exception):
         django_db.close_old_connections()
 
 
-def combine_images(
-    image_fps: typing.List[str | io.BytesIO],
+def _get_image_executor() -> typing.Optional[futures.ProcessPoolExecutor]:
+    global _image_executor  # pylint: disable=global-statement
+    if _image_executor is None:
+        size = getattr(settings, 'IMAGE_PROCESS_POOL_SIZE', _DEFAULT_IMAGE_PROCESS_POOL_SIZE)
+        if size <= 0:
+            return None
+
+        # Workers are spawned instead of forked, the bot process runs an event loop and DB threads
+        _image_executor = futures.ProcessPoolExecutor(
+            max_workers=size,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _image_executor
+
+
+async def _run_image_task(func: typing.Callable[..., bytes], *args: typing.Any) -> io.BytesIO:
+    """
+    Runs CPU heavy image processing in the image process pool, or inline if the pool is disabled.
+    """
+    global _image_executor  # pylint: disable=global-statement
+    executor = _get_image_executor()
+    if executor is None:
+        return io.BytesIO(func(*args))
+
+    try:
+        return io.BytesIO(await asyncio.get_running_loop().run_in_executor(executor, func, *args))
+    except futures.process.BrokenProcessPool:
+        # A worker died (e.g. OOM), start a new pool for the next task
+        _image_executor = None
+        raise
+
+
+def _image_source(image: str | typing.BinaryIO) -> str | bytes:
+    # File objects can't be sent to another process, paths and bytes can
+    if isinstance(image, str):
+        return image
+    if path := media.file_path(image):
+        return path
+
+    image.seek(0)
+    data = image.read()
+    image.seek(0)
+    return data
+
+
+def _open_image(source: str | bytes) -> pil_image.Image:
+    return pil_image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def _has_alpha(image: pil_image.Image) -> bool:
+    if image.mode not in ('RGBA', 'LA', 'PA') and 'transparency' not in image.info:
+        return False
+    return image.convert('RGBA').getchannel('A').getextrema()[0] < 255
+
+
+def _is_lossless_content(image: pil_image.Image) -> bool:
+    """
+    Transparent images and line art (few distinct colors) need PNG, everything else is treated as a photo.
+    """
+    if _has_alpha(image):
+        return True
+
+    # Nearest neighbour keeps the original colors, so line art stays below the limit
+    scale = min(1.0, math.sqrt(_PROBE_PIXELS / (image.width * image.height)))
+    sample = image.convert('RGB').resize(
+        (max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+        pil_image.Resampling.NEAREST,
+    )
+    return sample.getcolors(maxcolors=_LINE_ART_MAX_COLORS) is not None
+
+
+def _save_image(image: pil_image.Image, image_format: str, quality: int = 0) -> bytes:
+    image_bytes = io.BytesIO()
+    match image_format:
+        case 'PNG':
+            image.save(image_bytes, format='PNG', compress_level=6)
+        case 'WEBP':
+            # Higher methods are a lot slower for a few percent smaller output
+            image.save(image_bytes, format='WEBP', quality=quality, method=2)
+        case _:
+            if image.mode != 'RGB':
+                # JPEG has no alpha, transparent parts become black
+                background = pil_image.new('RGB', image.size)
+                background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+                image = background
+            image.save(image_bytes, format='JPEG', quality=quality)
+
+    return image_bytes.getvalue()
+
+
+def _probe(image: pil_image.Image) -> pil_image.Image:
+    """
+    Mosaic of full resolution tiles spread over the image, compresses about as well per pixel as the whole image.
+    """
+    tiles = int(math.sqrt(_PROBE_PIXELS)) // _PROBE_TILE_SIZE
+    if image.width < tiles * _PROBE_TILE_SIZE * 2 or image.height < tiles * _PROBE_TILE_SIZE * 2:
+        return image
+
+    probe = pil_image.new(image.mode, (tiles * _PROBE_TILE_SIZE, tiles * _PROBE_TILE_SIZE))
+    step_x = (image.width - _PROBE_TILE_SIZE) // (tiles - 1)
+    step_y = (image.height - _PROBE_TILE_SIZE) // (tiles - 1)
+    for row in range(tiles):
+        for col in range(tiles):
+            x, y = col * step_x, row * step_y
+            probe.paste(
+                image.crop((x, y, x + _PROBE_TILE_SIZE, y + _PROBE_TILE_SIZE)),
+                (col * _PROBE_TILE_SIZE, row * _PROBE_TILE_SIZE),
+            )
+    return probe
+
+
+def _estimate_lossy_params(
+    image: pil_image.Image,
+    image_format: str,
+    max_size: int,
+    max_quality: int,
+) -> typing.Tuple[int, float]:
+    """
+    Picks the highest quality (and scale, if even the lowest quality is too big) that fits max_size,
+    by encoding a probe and extrapolating by pixel count.
+    """
+    probe = _probe(image)
+    ratio = (image.width * image.height) / (probe.width * probe.height)
+
+    qualities = [quality for quality in _LOSSY_QUALITIES if quality <= max_quality] or [max_quality]
+    # Binary search for the highest quality that fits, qualities are in descending order
+    low, high = 0, len(qualities) - 1
+    best = None
+    estimate = float(max_size)
+    while low <= high:
+        mid = (low + high) // 2
+        estimate = len(_save_image(probe, image_format, qualities[mid])) * ratio
+        if estimate <= max_size:
+            best = mid
+            high = mid - 1
+        else:
+            low = mid + 1
+
+    if best is not None:
+        return qualities[best], 1.0
+
+    # Nothing fits, the last estimate is for the lowest quality
+    return qualities[-1], min(1.0, math.sqrt(max_size / estimate) * _BUDGET_HEADROOM)
+
+
+def _encode_image(image: pil_image.Image, max_size: int, lossless: bool, max_quality: int = 85) -> bytes:
+    """
+    Encodes the image to fit max_size: PNG for transparency and line art (if it fits), otherwise JPEG,
+    which is by far the fastest to encode, or WebP if JPEG would need to drop below max_quality to fit.
+    Quality and scale are estimated up front, so the full image is usually encoded only once.
+    """
+    max_size = int(max_size * _BUDGET_HEADROOM)
+    if lossless:
+        data = _save_image(image, 'PNG')
+        if len(data) <= max_size:
+            return data
+
+    image_format = 'JPEG'
+    quality, scale = _estimate_lossy_params(image, image_format, max_size, max_quality)
+    if (quality < max_quality or scale < 1.0) and max(image.size) <= _WEBP_MAX_DIMENSION:
+        # Tight budget, WebP keeps more quality for the same size
+        image_format = 'WEBP'
+        quality, scale = _estimate_lossy_params(image, image_format, max_size, max_quality)
+    if scale < 1.0:
+        image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+
+    data = _save_image(image, image_format, quality)
+    if len(data) > max_size:
+        # Estimate was off, shrink by the overshoot
+        scale = math.sqrt(max_size / len(data)) * _BUDGET_HEADROOM
+        image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+        data = _save_image(image, image_format, quality)
+
+    return data
+
+
+async def combine_images(
+    image_fps: typing.List[str | typing.BinaryIO],
     gap: int = 10,
     quality: int = 85,
-    max_images: int = 3,
+    max_images: int = MAX_COMBINED_IMAGES,
 ) -> io.BytesIO:
-    images = [pil_image.open(path) for path in image_fps[:max_images]]
+    return await _run_image_task(
+        _combine_images,
+        [_image_source(image) for image in image_fps[:max_images]],
+        gap,
+        quality,
+        media.upload_limit.get(),
+    )
+
+
+def _combine_images(sources: typing.List[str | bytes], gap: int, quality: int, max_size: int) -> bytes:
+    images = [_open_image(source) for source in sources]
     widths, heights = zip(*(im.size for im in images))
 
-    new_image = pil_image.new('RGBA', (sum(widths), max(heights)))
+    new_image = pil_image.new('RGBA', (sum(widths) + gap * (len(images) - 1), max(heights)))
     offset = 0
     for image in images:
         new_image.paste(image, (offset, 0))
         offset += image.size[0] + gap
 
-    image_bytes = io.BytesIO()
-    new_image.save(image_bytes, format='PNG', quality=quality, optimize=True)
-    image_bytes.seek(0)
+    return _encode_image(
+        image=new_image,
+        max_size=max_size,
+        lossless=all(_is_lossless_content(image) for image in images),
+        max_quality=quality,
+    )
+
+
+async def resize_image(
+    buffer: typing.BinaryIO,
+    factor: float = 0.75,
+    max_size: typing.Optional[int] = None,
+) -> typing.BinaryIO:
+    """
+    Scales the image by factor and re-encodes it to fit max_size (the upload limit by default).
+    Returns the original buffer if the new encoding is not smaller.
+    """
+    if factor == 1.0 and max_size is None:
+        return buffer
 
-    return image_bytes
+    resized = await _run_image_task(_resize_image, _image_source(buffer), factor, max_size or media.upload_limit.get())
+    if media.buffer_size(resized) >= media.buffer_size(buffer):
+        # A generous budget re-encodes already compressed images to larger files
+        resized.close()
+        buffer.seek(0)
+        return buffer
 
+    return resized
 
-def resize_image(buffer: io.BytesIO, factor: float = 0.75) -> io.BytesIO:
-    if factor == 1.0:
-        return buffer
 
-    image = pil_image.open(buffer)
+def _resize_image(source: bytes, factor: float, max_size: int) -> bytes:
+    image = _open_image(source)
     width, height = image.size
 
-    new_image = image.resize((int(width * factor), int(height * factor)), pil_image.Resampling.NEAREST)
-
-    image_bytes = io.BytesIO()
-    new_image.save(image_bytes, format='PNG', optimize=True)
-    image_bytes.seek(0)
+    new_image = image
+    if factor != 1.0:
+        new_image = image.resize((int(width * factor), int(height * factor)), pil_image.Resampling.NEAREST)
 
-    return image_bytes
+    return _encode_image(image=new_image, max_size=max_size, lossless=_is_lossless_content(image))
 
 
 @contextmanager
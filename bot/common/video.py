@@ -0,0 +1,232 @@
+import asyncio
+import functools
+import json
+import os
+import shutil
+import tempfile
+import typing
+from dataclasses import dataclass
+
+from bot import exceptions
+from bot import logger
+from bot.common import media
+from bot.common import transcoding
+
+_SIZE_HEADROOM = 0.96  # Container overhead and rate control error
+_MIN_VIDEO_BITRATE = 100_000
+# Highest output height for a video bitrate, lower bitrates look better at lower resolutions
+_HEIGHT_LADDER = (
+    (2_500_000, 1080),
+    (1_200_000, 720),
+    (600_000, 480),
+    (0, 360),
+)
+_AUDIO_LADDER = (
+    (1_000_000, 128_000),
+    (400_000, 96_000),
+    (0, 64_000),
+)
+
+
+@dataclass
+class Probe:
+    duration: float
+    bitrate: int
+    width: int
+    height: int
+    has_audio: bool
+
+
+@dataclass
+class Bitrates:
+    video: int
+    audio: int
+    height: int
+
+
+async def _run(*args: str) -> bytes:
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+
+    if proc.returncode != 0:
+        raise exceptions.BotError(f'{args[0]} failed: {stderr.decode(errors="ignore")[-500:]}')
+    return stdout
+
+
+async def probe(path: str) -> Probe:
+    output = json.loads(
+        await _run('ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path)
+    )
+    return parse_probe(output)
+
+
+def parse_probe(output: typing.Dict[str, typing.Any]) -> Probe:
+    streams = output.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+    fmt = output.get('format', {})
+
+    duration = float(fmt.get('duration') or video.get('duration') or 0)
+    bitrate = int(fmt.get('bit_rate') or 0)
+    if not bitrate and duration:
+        bitrate = int(int(fmt.get('size') or 0) * 8 / duration)
+
+    return Probe(
+        duration=duration,
+        bitrate=bitrate,
+        width=int(video.get('width') or 0),
+        height=int(video.get('height') or 0),
+        has_audio=any(stream.get('codec_type') == 'audio' for stream in streams),
+    )
+
+
+def compute_bitrates(max_size: int, info: Probe) -> Bitrates:
+    """
+    Splits the bit budget of max_size over the duration between audio and video.
+    """
+    if info.duration <= 0:
+        raise exceptions.BotError('Unknown video duration')
+
+    total = int(max_size * 8 * _SIZE_HEADROOM / info.duration)
+    audio = next(bitrate for threshold, bitrate in _AUDIO_LADDER if total >= threshold) if info.has_audio else 0
+    video = max(_MIN_VIDEO_BITRATE, total - audio)
+    height = next(height for threshold, height in _HEIGHT_LADDER if video >= threshold)
+
+    return Bitrates(video=video, audio=audio, height=height)
+
+
+def _encode_args(
+    input_path: str,
+    bitrates: Bitrates,
+    passlog: str,
+    output_pass: typing.Optional[int] = None,
+) -> typing.List[str]:
+    args = [
+        'ffmpeg',
+        '-y',
+        '-i',
+        input_path,
+        '-vf',
+        # Never upscale, keep dimensions even for x264
+        f"scale=-2:'min(ih,{bitrates.height})'",
+        '-c:v',
+        'libx264',
+        '-preset',
+        'veryfast',
+        '-b:v',
+        str(bitrates.video),
+        '-maxrate',
+        str(bitrates.video),
+        '-bufsize',
+        str(bitrates.video * 2),
+    ]
+    if output_pass is not None:
+        args += ['-pass', str(output_pass), '-passlogfile', passlog]
+    return args
+
+
+async def transcode_to_size(buffer: typing.BinaryIO, max_size: int, extension: str = '.mp4') -> typing.BinaryIO:
+    """
+    Transcodes the video to fit max_size. The bitrate is computed from the probed duration, so a single encode
+    usually fits, a two-pass encode at a corrected bitrate is done if it does not.
+    Jobs are queued on the transcoding scheduler, so only a bounded number of encoders run at a time.
+    """
+    return await transcoding.get_scheduler().run(
+        functools.partial(_transcode_to_size, buffer=buffer, max_size=max_size, extension=extension)
+    )
+
+
+async def _transcode_to_size(buffer: typing.BinaryIO, max_size: int, extension: str) -> typing.BinaryIO:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        passlog = os.path.join(tmp_dir, 'passlog')
+
+        # ffmpeg reads file backed buffers in place, only in-memory ones are written out
+        input_path = media.file_path(buffer)
+        if input_path is None:
+            input_path = os.path.join(tmp_dir, f'input{extension}')
+            buffer.seek(0)
+            with open(input_path, 'wb') as f:
+                shutil.copyfileobj(buffer, f, media.CHUNK_SIZE)
+            buffer.seek(0)
+
+        info = await probe(input_path)
+        bitrates = compute_bitrates(max_size=max_size, info=info)
+        logger.info(
+            'Transcoding video to fit',
+            max_size=max_size,
+            duration=info.duration,
+            source_bitrate=info.bitrate,
+            video_bitrate=bitrates.video,
+            audio_bitrate=bitrates.audio,
+            height=bitrates.height,
+        )
+
+        # Outlives the temp dir, the returned buffer removes it once closed
+        fd, output_path = tempfile.mkstemp(suffix='.mp4')
+        os.close(fd)
+        try:
+            audio_args = ['-c:a', 'aac', '-b:a', str(bitrates.audio)] if bitrates.audio else ['-an']
+            output_args = audio_args + ['-movflags', '+faststart', output_path]
+
+            await _run(*_encode_args(input_path, bitrates, passlog), *output_args)
+            size = os.path.getsize(output_path)
+
+            if size > max_size:
+                # Single pass rate control overshot, two-pass hits the target bitrate much more accurately
+                bitrates.video = max(_MIN_VIDEO_BITRATE, int(bitrates.video * max_size / size * _SIZE_HEADROOM))
+                logger.info(
+                    'Transcoded video too large, retrying with two passes', size=size, video_bitrate=bitrates.video
+                )
+                await _run(*_encode_args(input_path, bitrates, passlog, output_pass=1), '-an', '-f', 'null', os.devnull)
+                await _run(*_encode_args(input_path, bitrates, passlog, output_pass=2), *output_args)
+                size = os.path.getsize(output_path)
+
+            if size > max_size:
+                raise exceptions.MediaTooLargeError(size=size, limit=max_size)
+        except BaseException:
+            os.remove(output_path)
+            raise
+
+        return media.FileBuffer(output_path, delete=True)
+
+
+async def mux(video_path: str, audio_path: str) -> typing.BinaryIO:
+    """
+    Combines separate video and audio tracks into an mp4 without re-encoding.
+    """
+    # The returned buffer removes it once closed
+    fd, output_path = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    try:
+        await _run(
+            'ffmpeg',
+            '-y',
+            '-v',
+            'error',
+            '-i',
+            video_path,
+            '-i',
+            audio_path,
+            '-map',
+            '0:v:0',
+            '-map',
+            '1:a:0',
+            '-c',
+            'copy',
+            '-movflags',
+            '+faststart',
+            output_path,
+        )
+    except BaseException:
+        os.remove(output_path)
+        raise
+
+    return media.FileBuffer(output_path, delete=True)
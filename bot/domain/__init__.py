@@ -1,10 +1,11 @@
 # TODO: Refactor
+import dataclasses
 import datetime
-import io
 import typing
 from dataclasses import dataclass
 
 from bot import constants
+from bot.common import media
 from bot.common import utils
 from bot.domain import post_format
 
@@ -91,7 +92,7 @@ class Post:
     views: typing.Optional[int] = None
     likes: typing.Optional[int] = None
     dislikes: typing.Optional[int] = None
-    buffer: typing.Optional[io.BytesIO] = None
+    buffer: typing.Optional[typing.BinaryIO] = None
     spoiler: bool = False
     created: typing.Optional[datetime.datetime] = None
     _internal_id: typing.Optional[int] = None
@@ -122,6 +123,14 @@ class Post:
         self.buffer.seek(0)
         return res
 
+    def clone(self, **changes: typing.Any) -> 'Post':
+        """
+        Returns a copy with its own buffer, so it can be formatted and resized independently.
+        The media itself is shared, resizing replaces the buffer instead of writing to it.
+        """
+        buffer = media.share(self.buffer) if self.buffer else None
+        return dataclasses.replace(self, buffer=buffer, **changes)
+
 
 @dataclass
 class Comment:
@@ -1,5 +1,14 @@
+def _restore(cls: type, message: str, state: dict) -> 'BaseError':
+    error = cls.__new__(cls)
+    Exception.__init__(error, message)
+    error.__dict__.update(state)
+    return error
+
+
 class BaseError(Exception):
-    pass
+    def __reduce__(self):
+        # Subclasses format the message in __init__, unpickling (e.g. from worker processes) must not call it again
+        return _restore, (self.__class__, str(self), self.__dict__)
 
 
 class RepositoryError(BaseError):
@@ -28,6 +37,13 @@ class IntegrationError(BaseError):
         self.error = error
 
 
+class MediaTooLargeError(BaseError):
+    def __init__(self, size: int, limit: int) -> None:
+        super().__init__(f'Media too large: {size} bytes exceeds limit of {limit} bytes')
+        self.size = size
+        self.limit = limit
+
+
 class ConfigurationError(BaseError):
     pass
 
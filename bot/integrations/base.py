@@ -1,4 +1,5 @@
-import io
+import asyncio
+import os
 import typing
 
 import aiohttp
@@ -6,10 +7,16 @@ import pydantic
 
 from bot import constants
 from bot import domain
+from bot import exceptions
 from bot import logger
+from bot.common import http as common_http
+from bot.common import media
+from bot.common import utils
 
 MISSING = -1
 DEFAULT_TIMEOUT = (3.0, 3.0)
+GALLERY_CONCURRENCY = 4
+GALLERY_ITEM_TIMEOUT = 20.0
 
 
 class BaseClient:
@@ -17,6 +24,7 @@ class BaseClient:
 
     def __init__(self, post_format: typing.Optional[str] = None) -> None:
         self.post_format = post_format
+        self.http = common_http.SessionPool(name=self.INTEGRATION.value)
 
     async def get_integration_data(self, url: str) -> typing.Tuple[constants.Integration, str, typing.Optional[int]]:
         raise NotImplementedError()
@@ -27,22 +35,148 @@ class BaseClient:
     async def get_comments(self, url: str, n: int = 5) -> typing.List[domain.Comment]:
         raise NotImplementedError()
 
-    async def _download(self, url: str, cookies: typing.Optional[typing.Dict[str, str]] = None, **kwargs) -> io.BytesIO:
+    async def _download(
+        self,
+        url: str,
+        cookies: typing.Optional[typing.Dict[str, str]] = None,
+        max_size: typing.Optional[int] = None,
+        path: typing.Optional[str] = None,
+        **kwargs,
+    ) -> typing.BinaryIO:
+        """
+        Streams the response into a buffer that spools to disk once it grows large, or into the file at path,
+        which is removed once the returned buffer is closed.
+        Raises MediaTooLargeError as soon as the response is known to exceed max_size.
+        """
+        max_size = max_size or media.max_download_size()
+
         logger.debug('Downloading data', integration=self.INTEGRATION.value, url=url)
-        async with aiohttp.ClientSession(cookies=cookies) as session:
-            async with session.get(url=url, **kwargs) as resp:
-                return io.BytesIO(await resp.read())
+        async with self.http.session.get(url=url, cookies=cookies, **kwargs) as resp:
+            if resp.content_length is not None and resp.content_length > max_size:
+                raise exceptions.MediaTooLargeError(size=resp.content_length, limit=max_size)
+
+            buffer = media.spooled_buffer() if path is None else open(path, 'wb')  # pylint: disable=consider-using-with
+            try:
+                size = 0
+                async for chunk in resp.content.iter_chunked(media.CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise exceptions.MediaTooLargeError(size=size, limit=max_size)
+                    buffer.write(chunk)
+            except BaseException:
+                buffer.close()
+                if path is not None:
+                    os.remove(path)
+                raise
+
+        if path is not None:
+            buffer.close()
+            return media.FileBuffer(path, delete=True)
+
+        buffer.seek(0)
+        return buffer
+
+    async def _download_variants(
+        self,
+        urls: typing.List[str],
+        cookies: typing.Optional[typing.Dict[str, str]] = None,
+        **kwargs,
+    ) -> typing.BinaryIO:
+        """
+        Downloads the first variant that fits the upload limit, urls should be ordered from best to worst quality.
+        Falls back to the last variant, which can still be resized before sending.
+        """
+        if not urls:
+            raise exceptions.IntegrationClientError('No downloadable variants')
+
+        for url in urls[:-1]:
+            try:
+                return await self._download(url=url, cookies=cookies, max_size=media.upload_limit.get(), **kwargs)
+            except exceptions.MediaTooLargeError as e:
+                logger.debug(
+                    'Variant too large, trying lower quality', integration=self.INTEGRATION.value, error=str(e)
+                )
+
+        return await self._download(url=urls[-1], cookies=cookies, **kwargs)
+
+    async def _download_gallery(
+        self,
+        urls: typing.List[str],
+        max_images: int = utils.MAX_COMBINED_IMAGES,
+        concurrency: int = GALLERY_CONCURRENCY,
+        item_timeout: float = GALLERY_ITEM_TIMEOUT,
+        cookies: typing.Optional[typing.Dict[str, str]] = None,
+        **kwargs,
+    ) -> typing.List[typing.BinaryIO]:
+        """
+        Downloads the first max_images images of a gallery that succeed, in gallery order. At most concurrency
+        downloads run at a time and never more than are still needed, so the rest of the gallery isn't fetched.
+        Images that fail or take longer than item_timeout are skipped, raises IntegrationClientError if none succeed.
+        """
+        pending: typing.Dict[asyncio.Task, int] = {}
+        images: typing.Dict[int, typing.BinaryIO] = {}
+        remaining = iter(enumerate(urls))
+        try:
+            while True:
+                while len(pending) < concurrency and len(images) + len(pending) < max_images:
+                    index, url = next(remaining, (None, None))
+                    if url is None:
+                        break
+                    task = asyncio.create_task(self._download_gallery_item(url, item_timeout, cookies, **kwargs))
+                    pending[task] = index
+
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = pending.pop(task)
+                    try:
+                        images[index] = task.result()
+                    except (exceptions.BaseError, aiohttp.ClientError, TimeoutError) as e:
+                        logger.warning(
+                            'Skipping gallery image',
+                            integration=self.INTEGRATION.value,
+                            url=urls[index],
+                            error=str(e) or type(e).__name__,
+                        )
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            for image in images.values():
+                image.close()
+            raise
+
+        if urls and not images:
+            raise exceptions.IntegrationClientError('Failed to download any gallery image')
+
+        return [images[index] for index in sorted(images)]
+
+    async def _download_gallery_item(
+        self,
+        url: str,
+        timeout: float,
+        cookies: typing.Optional[typing.Dict[str, str]],
+        **kwargs,
+    ) -> typing.BinaryIO:
+        # Error pages would otherwise be taken for images
+        kwargs.setdefault('raise_for_status', True)
+        async with asyncio.timeout(timeout):
+            return await self._download(url=url, cookies=cookies, **kwargs)
 
     async def _fetch_content(self, url: str, cookies: typing.Optional[typing.Dict[str, str]] = None, **kwargs) -> str:
         logger.debug('Fetching content', integration=self.INTEGRATION.value, url=url)
-        async with aiohttp.ClientSession(cookies=cookies) as session:
-            async with session.get(url=url, **kwargs) as resp:
-                return await resp.text()
+        async with self.http.session.get(url=url, cookies=cookies, **kwargs) as resp:
+            return await resp.text()
+
+    async def close(self) -> None:
+        await self.http.close()
 
 
 class BaseClientConfig(pydantic.BaseModel):
     enabled: bool = False
     post_format: typing.Optional[str] = None
+    http: common_http.HttpConfig = common_http.HttpConfig()
 
 
 class BaseClientSingleton:
@@ -50,20 +184,39 @@ class BaseClientSingleton:
     BLACKLIST_DOMAINS: typing.Set[str] = []
     _INSTANCE: typing.Optional[typing.Union[BaseClient, int]] = None
     _CONFIG_CLASS = BaseClientConfig
+    _HTTP_CONFIG: typing.Optional[common_http.HttpConfig] = None
+
+    @classmethod
+    def domains(cls) -> typing.Set[str]:
+        """
+        Handled domains, override to derive them from the configuration.
+        """
+        return cls.DOMAINS
 
     @classmethod
     def should_handle(cls, url: str) -> bool:
-        return any(domain in url for domain in cls.DOMAINS) and not any(
-            domain in url for domain in cls.BLACKLIST_DOMAINS
+        return (
+            any(domain in url for domain in cls.domains())
+            and not any(domain in url for domain in cls.BLACKLIST_DOMAINS)
+            and cls.accepts_url(url)
         )
 
+    @classmethod
+    def accepts_url(cls, url: str) -> bool:
+        """
+        Extra check on top of domain matching, override to filter out unsupported urls of a handled domain.
+        """
+        return True
+
     @classmethod
     def _create_instance(cls) -> None:
         raise NotImplementedError()
 
     @classmethod
     def _load_config(cls, conf: object) -> _CONFIG_CLASS:
-        return cls._CONFIG_CLASS.model_validate(conf)
+        config = cls._CONFIG_CLASS.model_validate(conf)
+        cls._HTTP_CONFIG = config.http
+        return config
 
     @classmethod
     def get_instance(cls) -> typing.Optional[BaseClient]:
@@ -75,4 +228,15 @@ class BaseClientSingleton:
 
         cls._create_instance()
 
-        return cls._INSTANCE if cls._INSTANCE != MISSING else None
+        if cls._INSTANCE == MISSING:
+            return None
+
+        if cls._HTTP_CONFIG is not None:
+            cls._INSTANCE.http.config = cls._HTTP_CONFIG
+
+        return cls._INSTANCE
+
+    @classmethod
+    async def close(cls) -> None:
+        if isinstance(cls._INSTANCE, BaseClient):
+            await cls._INSTANCE.close()
@@ -21,8 +21,14 @@ class BlueskyClientSingleton(base.BaseClientSingleton):
     _CONFIG_CLASS = config.BlueskyConfig
 
     @classmethod
-    def should_handle(cls, url: str) -> bool:
-        return super().should_handle(url) and '/post/' in url
+    def domains(cls) -> typing.Set[str]:
+        # Another instance replaces bsky.app
+        base_url = settings.INTEGRATION_CONFIGURATION.get('bluesky', {}).get('base_url')
+        return {base_url} if base_url else cls.DOMAINS
+
+    @classmethod
+    def accepts_url(cls, url: str) -> bool:
+        return '/post/' in url
 
     @classmethod
     def _create_instance(cls) -> None:
@@ -38,9 +44,6 @@ class BlueskyClientSingleton(base.BaseClientSingleton):
             cls._INSTANCE = base.MISSING
             return
 
-        if conf.base_url:
-            cls.DOMAINS = {conf.base_url}
-
         cls._INSTANCE = BlueskyClient(
             post_format=conf.post_format,
             username=conf.username,
@@ -115,8 +118,8 @@ class BlueskyClient(base.BaseClient):
         if thread.post.embed:
             logger.debug('Got bluesky media post', py_type=thread.post.embed.py_type)
             if atproto_models.ids.AppBskyEmbedImages in thread.post.embed.py_type:
-                post.buffer = utils.combine_images(
-                    [await self._download(img.fullsize or img.thumb) for img in thread.post.embed.images[:3]]
+                post.buffer = await utils.combine_images(
+                    await self._download_gallery(urls=[img.fullsize or img.thumb for img in thread.post.embed.images])
                 )
             elif atproto_models.ids.AppBskyEmbedVideo in thread.post.embed.py_type:
                 stream_url = thread.post.embed.playlist or thread.post.embed.alt
@@ -2,7 +2,6 @@ import datetime
 import typing
 from urllib.parse import urlparse
 
-import aiohttp
 from django.conf import settings
 
 from bot import constants
@@ -42,14 +41,13 @@ class FourChanClient(base.BaseClient):
         return self.INTEGRATION, f'{path[0]}_{path[-1]}', None
 
     async def _get_posts(self, board: str, thread_id: str) -> types.Posts:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                url=API_URL_TEMPLATE.format(
-                    board=board,
-                    thread_id=thread_id,
-                )
-            ) as resp:
-                return types.Posts.model_validate(await resp.json())
+        async with self.http.session.get(
+            url=API_URL_TEMPLATE.format(
+                board=board,
+                thread_id=thread_id,
+            )
+        ) as resp:
+            return types.Posts.model_validate(await resp.json())
 
     async def get_post(self, url: str) -> domain.Post:
         _, data, _ = await self.get_integration_data(url.strip())
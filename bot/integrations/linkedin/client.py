@@ -3,11 +3,11 @@ import typing
 
 import fake_useragent
 from django.conf import settings
-from playwright.async_api import async_playwright
 
 from bot import constants
 from bot import domain
 from bot import logger
+from bot.common import browser
 from bot.common import utils
 from bot.integrations import base
 from bot.integrations.linkedin import config
@@ -26,12 +26,20 @@ class LinkedinClientSingleton(base.BaseClientSingleton):
             cls._INSTANCE = base.MISSING
             return
 
-        cls._INSTANCE = LinkedinClient(conf.post_format)
+        cls._INSTANCE = LinkedinClient(post_format=conf.post_format, browser_config=conf.browser)
 
 
 class LinkedinClient(base.BaseClient):
     INTEGRATION = constants.Integration.LINKEDIN
 
+    def __init__(
+        self,
+        post_format: typing.Optional[str] = None,
+        browser_config: typing.Optional[browser.BrowserConfig] = None,
+    ) -> None:
+        super().__init__(post_format)
+        self.browsers = browser.BrowserPool(name=self.INTEGRATION.value, config=browser_config)
+
     async def get_integration_data(self, url: str) -> typing.Tuple[constants.Integration, str, typing.Optional[int]]:
         id_part = url.strip('/').split('?')[0].split('/')[-1]
         if ':' in id_part:
@@ -39,23 +47,8 @@ class LinkedinClient(base.BaseClient):
         return self.INTEGRATION, id_part.split('-')[-2], None
 
     async def get_post(self, url: str) -> domain.Post:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-setuid-sandbox',
-                ],
-            )
-            context = await browser.new_context()
-
+        async with self.browsers.context(user_agent=fake_useragent.UserAgent().random) as context:
             page = await context.new_page()
-            await page.set_extra_http_headers(
-                {
-                    'User-Agent': fake_useragent.UserAgent().random,
-                }
-            )
             await page.goto(url)
 
             author = await page.locator('[data-tracking-control-name="public_post_feed-actor-name"]').first.inner_text()
@@ -83,10 +76,14 @@ class LinkedinClient(base.BaseClient):
                 image_count = await image_locator.count()
                 media_url = await image_locator.get_attribute('content') if image_count > 0 else None
 
-            if media_url and 'static' not in media_url:
-                post.buffer = await self._download(media_url)
-            elif author_pfp:
-                post.buffer = await self._download(author_pfp)
+        # The context is released before downloading, media is fetched without the browser
+        if media_url and 'static' not in media_url:
+            post.buffer = await self._download(media_url)
+        elif author_pfp:
+            post.buffer = await self._download(author_pfp)
+
+        return post
 
-            await browser.close()
-            return post
+    async def close(self) -> None:
+        await super().close()
+        await self.browsers.close()
@@ -1,7 +1,6 @@
+from bot.common import browser as common_browser
 from bot.integrations import base
 
 
 class LinkedinConfig(base.BaseClientConfig):
-    """
-    No additional settings for Linkedin integration
-    """
+    browser: common_browser.BrowserConfig = common_browser.BrowserConfig()
@@ -1,16 +1,18 @@
 import asyncio
+import contextlib
 import datetime
 import glob
 import io
 import os
 import re
 import shutil
+import tempfile
 import typing
 import uuid
 
+import aiohttp
 import asyncpraw
 import asyncpraw.models
-import redvid
 import requests
 from RedDownloader import RedDownloader as reddit_downloader
 from asyncpraw import exceptions as praw_exceptions
@@ -20,9 +22,12 @@ from bot import constants
 from bot import domain
 from bot import exceptions
 from bot import logger
+from bot.common import media
 from bot.common import utils
+from bot.common import video
 from bot.integrations import base
 from bot.integrations.reddit import config
+from bot.integrations.reddit import dash
 
 NEW_REDDIT_URL_PATTERN = '^https://www.reddit.com/r/[^/]+/s/[^/]+$'
 
@@ -57,8 +62,8 @@ class RedditClientSingleton(base.BaseClientSingleton):
         )
 
     @classmethod
-    def should_handle(cls, url: str) -> bool:
-        return super().should_handle(url) and ('/comments/' in url or re.match(NEW_REDDIT_URL_PATTERN, url))
+    def accepts_url(cls, url: str) -> bool:
+        return '/comments/' in url or bool(re.match(NEW_REDDIT_URL_PATTERN, url))
 
 
 class RedditClient(base.BaseClient):
@@ -126,7 +131,7 @@ class RedditClient(base.BaseClient):
 
     async def _hydrate_post(self, post: domain.Post) -> bool:
         if not self.client:
-            return self._hydrate_post_no_login(post)
+            return await self._hydrate_post_no_login(post)
 
         submission: asyncpraw.models.Submission = await self.client.submission(url=post.url)
 
@@ -143,48 +148,114 @@ class RedditClient(base.BaseClient):
         if submission.url.startswith('https://i.redd.it/'):
             post.buffer = await self._download(url=submission.url)
         elif submission.url.startswith('https://v.redd.it/'):
-            redvid.Downloader(
-                url=submission.url, path='/tmp', filename=f'{submission.id}.mp4', max_q=True, log=False
-            ).download()
-            with open(f'/tmp/{submission.id}.mp4', 'rb') as f:
-                post.buffer = io.BytesIO(f.read())
-            os.remove(f'/tmp/{submission.id}.mp4')
+            reddit_video = (submission.media or {}).get('reddit_video') or {}
+            post.buffer = await self._download_reddit_video(
+                url=submission.url,
+                dash_url=reddit_video.get('dash_url') or f'{submission.url}/DASHPlaylist.mpd',
+            )
         elif submission.url.startswith('https://www.reddit.com/gallery/'):
             image_urls = []
             for media_id in [item['media_id'] for item in submission.gallery_data['items']]:
                 image_urls.append(
                     submission.media_metadata[media_id]['p'][0]['u'].split('?')[0].replace('preview', 'i')
                 )
-            post.buffer = utils.combine_images(
-                await asyncio.gather(*[self._download(url=image_url) for image_url in image_urls[:3]])
-            )
+            post.buffer = await utils.combine_images(await self._download_gallery(urls=image_urls))
 
         return True
 
-    def _hydrate_post_no_login(self, post: domain.Post) -> bool:
+    async def _download_reddit_video(self, url: str, dash_url: str) -> typing.BinaryIO:
+        """
+        Downloads the best video and audio tracks of a v.redd.it DASH playlist that fit the upload limit
+        concurrently and muxes them.
+        """
+        manifest = dash.parse_manifest(await self._fetch_content(dash_url, raise_for_status=True), base_url=url)
+        video_track, audio_track = dash.select_tracks(manifest, max_size=media.upload_limit.get())
+        logger.debug(
+            'Downloading reddit video',
+            url=url,
+            duration=manifest.duration,
+            video_bandwidth=video_track.bandwidth,
+            height=video_track.height,
+            audio_bandwidth=audio_track.bandwidth if audio_track else None,
+        )
+        if audio_track is None:
+            return await self._download(url=video_track.url, raise_for_status=True)
+
+        paths = [self._temp_path(), self._temp_path()]
+        result = None
+        try:
+            tasks = [
+                asyncio.create_task(self._download(url=video_track.url, path=paths[0], raise_for_status=True)),
+                asyncio.create_task(self._download_audio_track(url=audio_track.url, path=paths[1])),
+            ]
+            try:
+                video_buffer, audio_buffer = await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                for buffer in await asyncio.gather(*tasks, return_exceptions=True):
+                    if buffer is not None and not isinstance(buffer, BaseException):
+                        buffer.close()
+                raise
+
+            if audio_buffer is None:
+                result = video_buffer
+                return result
+
+            try:
+                result = await video.mux(video_buffer.path, audio_buffer.path)
+            finally:
+                video_buffer.close()
+                audio_buffer.close()
+            return result
+        finally:
+            # Downloads that never started or failed early leave their files behind
+            for path in paths:
+                if result is None or path != media.file_path(result):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+
+    @staticmethod
+    def _temp_path() -> str:
+        fd, path = tempfile.mkstemp(suffix='.mp4')
+        os.close(fd)
+        return path
+
+    async def _download_audio_track(self, url: str, path: str) -> typing.Optional[typing.BinaryIO]:
+        try:
+            return await self._download(url=url, path=path, raise_for_status=True)
+        except aiohttp.ClientResponseError as e:
+            # Playlists sometimes list audio of videos without sound
+            logger.warning('Reddit video audio track missing', url=url, status=e.status)
+            return None
+
+    async def _hydrate_post_no_login(self, post: domain.Post) -> bool:
         if self._is_mobile_url(url=post.url):
             post.url = requests.get(post.url, timeout=base.DEFAULT_TIMEOUT).url.split('?')[0]
 
         try:
-            media = self.downloader.Download(url=post.url, quality=720, destination='/tmp/', output=str(uuid.uuid4()))
+            download = self.downloader.Download(
+                url=post.url, quality=720, destination='/tmp/', output=str(uuid.uuid4())
+            )
         except Exception as e:
             logger.error('Failed to fetch reddit post', error=str(e))
             return False
 
-        post.description = media.GetPostTitle().Get()
-        post.author = media.GetPostAuthor().Get()
+        post.description = download.GetPostTitle().Get()
+        post.author = download.GetPostAuthor().Get()
         post.spoiler = self._is_nsfw(post.url)
 
-        files = glob.glob(os.path.join(media.destination, f'{media.output}*'))
+        files = glob.glob(os.path.join(download.destination, f'{download.output}*'))
         if not files:
             return True
 
         if os.path.isfile(files[0]):
-            with open(files[0], 'rb') as f:
-                post.buffer = io.BytesIO(f.read())
+            # Removed once the buffer is closed
+            post.buffer = media.FileBuffer(files[0], delete=True)
+            files = files[1:]
         else:
             photos = [os.path.join(files[0], photo) for photo in os.listdir(files[0])]
-            post.buffer = utils.combine_images(photos)
+            post.buffer = await utils.combine_images(photos)
             for photo in photos:
                 os.remove(photo)
 
@@ -196,7 +267,7 @@ class RedditClient(base.BaseClient):
 
         return True
 
-    def _download_and_merge_gallery(self, url: str) -> typing.Optional[io.BytesIO]:
+    async def _download_and_merge_gallery(self, url: str) -> typing.Optional[io.BytesIO]:
         path = f'/tmp/{uuid.uuid4()}'
         os.mkdir(path)
 
@@ -213,7 +284,7 @@ class RedditClient(base.BaseClient):
         downloaded_path = f'{path}/downloaded'
         files = sorted(os.listdir(downloaded_path))
 
-        image_buffer = utils.combine_images([f'{downloaded_path}/{f}' for f in files])
+        image_buffer = await utils.combine_images([f'{downloaded_path}/{f}' for f in files])
 
         shutil.rmtree(path)
         return image_buffer
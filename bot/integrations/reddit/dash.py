@@ -0,0 +1,99 @@
+import re
+import typing
+import urllib.parse
+from dataclasses import dataclass
+from xml.etree import ElementTree
+
+_DURATION_PATTERN = re.compile(r'^PT(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?$')
+_SIZE_HEADROOM = 0.95  # Container overhead and bandwidth estimation errors
+
+
+@dataclass
+class Representation:
+    url: str
+    bandwidth: int
+    height: int = 0
+
+    def estimated_size(self, duration: float) -> int:
+        return int(self.bandwidth * duration / 8)
+
+
+@dataclass
+class Manifest:
+    duration: float
+    videos: typing.List[Representation]
+    audios: typing.List[Representation]
+
+
+def _parse_duration(value: typing.Optional[str]) -> float:
+    match = _DURATION_PATTERN.match(value or '')
+    if not match:
+        return 0.0
+    hours, minutes, seconds = (float(group or 0) for group in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _content_type(adaptation_set: ElementTree.Element, representation: ElementTree.Element) -> str:
+    # Older playlists only set the mime type, on either element
+    content_type = adaptation_set.get('contentType')
+    if content_type:
+        return content_type
+    mime_type = representation.get('mimeType') or adaptation_set.get('mimeType') or ''
+    return mime_type.split('/')[0]
+
+
+def parse_manifest(document: str, base_url: str) -> Manifest:
+    """
+    Parses a v.redd.it DASHPlaylist.mpd, representations are sorted from highest to lowest bandwidth.
+    """
+    root = ElementTree.fromstring(document)
+    base_url = base_url.rstrip('/') + '/'
+
+    videos, audios = [], []
+    for adaptation_set in root.iterfind('.//{*}AdaptationSet'):
+        for representation in adaptation_set.iterfind('{*}Representation'):
+            location = representation.findtext('{*}BaseURL')
+            if not location:
+                continue
+
+            track = Representation(
+                url=urllib.parse.urljoin(base_url, location.strip()),
+                bandwidth=int(representation.get('bandwidth') or 0),
+                height=int(representation.get('height') or 0),
+            )
+            content_type = _content_type(adaptation_set, representation)
+            if content_type == 'video':
+                videos.append(track)
+            elif content_type == 'audio':
+                audios.append(track)
+
+    return Manifest(
+        duration=_parse_duration(root.get('mediaPresentationDuration')),
+        videos=sorted(videos, key=lambda track: (track.bandwidth, track.height), reverse=True),
+        audios=sorted(audios, key=lambda track: track.bandwidth, reverse=True),
+    )
+
+
+def select_tracks(
+    manifest: Manifest,
+    max_size: int,
+) -> typing.Tuple[Representation, typing.Optional[Representation]]:
+    """
+    Picks the best video and audio that fit max_size together, by the bandwidth the playlist advertises.
+    Falls back to the lowest quality, which can still be transcoded before sending.
+    """
+    if not manifest.videos:
+        raise ValueError('No video tracks in playlist')
+
+    budget = max_size * _SIZE_HEADROOM
+    audio = next(
+        (track for track in manifest.audios if track.estimated_size(manifest.duration) <= budget / 4),
+        manifest.audios[-1] if manifest.audios else None,
+    )
+    audio_size = audio.estimated_size(manifest.duration) if audio else 0
+
+    video = next(
+        (track for track in manifest.videos if track.estimated_size(manifest.duration) + audio_size <= budget),
+        manifest.videos[-1],
+    )
+    return video, audio
@@ -1,6 +1,8 @@
+import asyncio
 import typing
 
 from bot.integrations import base
+from bot.integrations import router
 from bot.integrations.bluesky import client as bluesky_client
 from bot.integrations.facebook import client as facebook_client
 from bot.integrations.four_chan import client as four_chan_client
@@ -34,17 +36,25 @@ CLASSES: typing.Set[typing.Type[base.BaseClientSingleton]] = {
 }
 
 
-def should_handle(url: str) -> bool:
-    for klass in CLASSES:
-        if klass.should_handle(url):
-            return klass.get_instance() is not None
+ROUTER = router.Router(CLASSES)
+
 
-    return False
+def should_handle(url: str) -> bool:
+    klass = ROUTER.match(url)
+    return klass is not None and klass.get_instance() is not None
 
 
 def get_instance(url: str) -> typing.Optional[base.BaseClient]:
-    for klass in CLASSES:
-        if any(domain in url for domain in klass.DOMAINS):
-            return klass.get_instance()
+    klass = ROUTER.match(url)
+    if klass is None:
+        raise ValueError(f'Unsupported url {url}')
+
+    return klass.get_instance()
+
+
+async def resolve(url: str) -> typing.Optional[router.Route]:
+    return await ROUTER.resolve(url)
+
 
-    raise ValueError(f'Unsupported url {url}')
+async def close() -> None:
+    await asyncio.gather(*[klass.close() for klass in CLASSES])
@@ -0,0 +1,119 @@
+import re
+import typing
+from urllib.parse import urlsplit
+
+from bot import constants
+from bot.integrations import base
+
+# scheme://[userinfo@]host[:port]path
+_URL_PATTERN = re.compile(r'^\s*[a-z][a-z0-9+.-]*://(?:[^@/?#]*@)?([^:/?#]+)(?::\d*)?([^?#]*)', re.IGNORECASE)
+
+
+class Route(typing.NamedTuple):
+    client: base.BaseClient
+    integration: constants.Integration
+    integration_uid: str
+    integration_index: typing.Optional[int]
+
+
+class _Entry(typing.NamedTuple):
+    path_prefix: str
+    klass: typing.Type[base.BaseClientSingleton]
+
+
+def _split_domain(domain: str) -> typing.Tuple[str, str]:
+    """
+    Splits a configured domain (e.g. 'linkedin.com/posts' or 'https://bsky.app') into host and path prefix.
+    """
+    if '://' in domain:
+        parts = urlsplit(domain)
+        return (parts.hostname or '').lower(), parts.path.rstrip('/')
+
+    host, _, path = domain.partition('/')
+    return host.lower(), f'/{path}'.rstrip('/') if path else ''
+
+
+def _host_suffixes(host: str) -> typing.Iterator[str]:
+    """
+    Yields host and all of its parent domains, most specific first (a.b.com, b.com, com).
+    """
+    while host:
+        yield host
+        _, _, host = host.partition('.')
+
+
+class Router:
+    """
+    Maps urls to integrations with a single host lookup instead of walking every integration's domains.
+    """
+
+    def __init__(self, classes: typing.Iterable[typing.Type[base.BaseClientSingleton]]) -> None:
+        self._classes = list(classes)
+        self._hosts: typing.Optional[typing.Dict[str, typing.List[_Entry]]] = None
+        self._blacklist: typing.Dict[str, typing.Set[typing.Type[base.BaseClientSingleton]]] = {}
+
+    def _build(self) -> typing.Dict[str, typing.List[_Entry]]:
+        # Domains can depend on the configuration, so they are read once the first url is routed
+        hosts: typing.Dict[str, typing.List[_Entry]] = {}
+        self._blacklist = {}
+        for klass in self._classes:
+            for domain in klass.domains():
+                host, path_prefix = _split_domain(domain)
+                hosts.setdefault(host, []).append(_Entry(path_prefix=path_prefix, klass=klass))
+            for domain in klass.BLACKLIST_DOMAINS:
+                host, _ = _split_domain(domain)
+                self._blacklist.setdefault(host, set()).add(klass)
+
+        # Longer path prefixes are more specific
+        for entries in hosts.values():
+            entries.sort(key=lambda entry: len(entry.path_prefix), reverse=True)
+        return hosts
+
+    def reset(self) -> None:
+        """
+        Rebuilds the domain index on the next match, e.g. after the configuration changed.
+        """
+        self._hosts = None
+
+    def match(self, url: str) -> typing.Optional[typing.Type[base.BaseClientSingleton]]:
+        if self._hosts is None:
+            self._hosts = self._build()
+
+        url_match = _URL_PATTERN.match(url)
+        if not url_match:
+            return None
+
+        host, path = url_match.group(1).lower(), url_match.group(2)
+
+        blacklisted: typing.Set[typing.Type[base.BaseClientSingleton]] = set()
+        for suffix in _host_suffixes(host):
+            blacklisted |= self._blacklist.get(suffix, set())
+
+            for entry in self._hosts.get(suffix, []):
+                if entry.klass in blacklisted or not path.startswith(entry.path_prefix):
+                    continue
+                if entry.klass.accepts_url(url):
+                    return entry.klass
+
+        return None
+
+    async def resolve(self, url: str) -> typing.Optional[Route]:
+        """
+        Returns the client and integration data for url in one pass.
+        Raises ValueError if no integration handles url and returns None if the integration is not enabled.
+        """
+        klass = self.match(url)
+        if klass is None:
+            raise ValueError(f'Unsupported url {url}')
+
+        client = klass.get_instance()
+        if client is None:
+            return None
+
+        integration, integration_uid, integration_index = await client.get_integration_data(url=url)
+        return Route(
+            client=client,
+            integration=integration,
+            integration_uid=integration_uid,
+            integration_index=integration_index,
+        )
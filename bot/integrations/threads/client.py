@@ -1,16 +1,17 @@
 import datetime
-import io
 import json
 import re
+import time
 import typing
 
-import requests
+import aiohttp
 from django.conf import settings
 
 from bot import constants
 from bot import domain
 from bot import exceptions
 from bot import logger
+from bot.common import singleflight
 from bot.common import utils
 from bot.integrations import base
 from bot.integrations.threads import config
@@ -29,6 +30,8 @@ HEADERS = {
     'X-IG-App-ID': '238260118697367',
     'X-FB-Friendly-Name': 'BarcelonaPostPageQuery',
 }
+# The LSD token is not tied to a session, so it is reused until it expires or a request with it fails
+API_TOKEN_TTL = 60 * 60
 
 
 class ThreadsClientSingleton(base.BaseClientSingleton):
@@ -50,14 +53,18 @@ class ThreadsClientSingleton(base.BaseClientSingleton):
 class ThreadsClient(base.BaseClient):
     INTEGRATION = constants.Integration.THREADS
 
+    def __init__(self, post_format: typing.Optional[str] = None) -> None:
+        super().__init__(post_format)
+        self._api_token: typing.Optional[str] = None
+        self._api_token_expires_at = 0.0
+        self._api_token_fetch: singleflight.SingleFlight[str] = singleflight.SingleFlight()
+
     async def get_integration_data(self, url: str) -> typing.Tuple[constants.Integration, str, typing.Optional[int]]:
         return self.INTEGRATION, url.strip('/').split('?')[0].split('/')[-1], None
 
     async def get_post(self, url: str) -> domain.Post:
         _, url_id, _ = await self.get_integration_data(url)
-        api_token = self._get_threads_api_token()
-
-        thread = self._get_thread(url_id=url_id, api_token=api_token)
+        thread, api_token = await self._get_thread(url_id=url_id)
 
         if len(thread.data.data.edges) == 0 or len(thread.data.data.edges[0].node.thread_items) == 0:
             raise exceptions.IntegrationClientError('No threads found')
@@ -81,18 +88,17 @@ class ThreadsClient(base.BaseClient):
             case types.MediaType.VIDEO:
                 media_url = thread.video_versions[0].url
             case types.MediaType.CAROUSEL:
-                post.buffer = utils.combine_images(
-                    [
-                        await self._download(img.image_versions2.candidates[0].url, headers=headers)
-                        for img in thread.carousel_media
-                    ]
+                post.buffer = await utils.combine_images(
+                    await self._download_gallery(
+                        urls=[img.image_versions2.candidates[0].url for img in thread.carousel_media],
+                        headers=headers,
+                    )
                 )
 
         logger.debug('Fetched thread', media_type=thread.media_type, url=url, media_url=media_url)
 
         if media_url:
-            with requests.get(url=media_url, timeout=base.DEFAULT_TIMEOUT) as resp:
-                post.buffer = io.BytesIO(resp.content)
+            post.buffer = await self._download(media_url)
 
         return post
 
@@ -109,10 +115,9 @@ class ThreadsClient(base.BaseClient):
 
         return thread_id
 
-    def _get_thread_raw(self, url_id: str, api_token: str) -> dict:
-        return requests.post(
+    async def _get_thread_raw(self, url_id: str, api_token: str) -> dict:
+        async with self.http.session.post(
             url='https://www.threads.net/api/graphql',
-            timeout=base.DEFAULT_TIMEOUT,
             headers=HEADERS | {'X-FB-LSD': api_token},
             data={
                 'lsd': api_token,
@@ -123,23 +128,51 @@ class ThreadsClient(base.BaseClient):
                 ),
                 'doc_id': '25460088156920903',
             },
-        ).json()
-
-    def _get_thread(self, url_id: str, api_token: str) -> types.Thread:
-        return types.Thread.model_validate(self._get_thread_raw(url_id=url_id, api_token=api_token))
-
-    def _get_threads_api_token(self) -> str:
-        response = requests.get(
-            url='https://www.instagram.com/instagram',
-            timeout=base.DEFAULT_TIMEOUT,
-            headers=HEADERS,
-        )
-
-        token_key_value = re.search('LSD",\\[\\],{"token":"(.*?)"},\\d+\\]', response.text).group()
-        token_key_value = token_key_value.replace('LSD",[],{"token":"', '')
-        token = token_key_value.split('"')[0]
+            raise_for_status=True,
+        ) as resp:
+            return await resp.json(content_type=None)
 
-        return token
+    async def _get_thread(self, url_id: str) -> typing.Tuple[types.Thread, str]:
+        """
+        Returns the thread and the LSD token it was fetched with, the token is refreshed once if the request fails.
+        """
+        api_token = await self._get_threads_api_token()
+        try:
+            return await self._fetch_thread(url_id=url_id, api_token=api_token), api_token
+        except (aiohttp.ClientResponseError, ValueError) as e:
+            logger.warning('Threads request failed, refreshing LSD token', url_id=url_id, error=str(e))
+
+        api_token = await self._get_threads_api_token(refresh=True)
+        try:
+            return await self._fetch_thread(url_id=url_id, api_token=api_token), api_token
+        except (aiohttp.ClientResponseError, ValueError) as e:
+            raise exceptions.IntegrationClientError(f'Failed fetching thread: {e}') from e
+
+    async def _fetch_thread(self, url_id: str, api_token: str) -> types.Thread:
+        return types.Thread.model_validate(await self._get_thread_raw(url_id=url_id, api_token=api_token))
+
+    async def _get_threads_api_token(self, refresh: bool = False) -> str:
+        if refresh or self._api_token is None or self._api_token_expires_at <= time.monotonic():
+            # Concurrent requests share a single refresh
+            token, _ = await self._api_token_fetch.do('lsd', self._fetch_threads_api_token)
+            return token
+
+        return self._api_token
+
+    async def _fetch_threads_api_token(self) -> str:
+        content = await self._fetch_content(url='https://www.instagram.com/instagram', headers=HEADERS)
+
+        match = re.search('LSD",\\[\\],{"token":"(.*?)"},\\d+\\]', content)
+        if not match:
+            self._api_token = None
+            raise exceptions.IntegrationClientError('LSD token not found')
+
+        token_key_value = match.group().replace('LSD",[],{"token":"', '')
+        self._api_token = token_key_value.split('"')[0]
+        self._api_token_expires_at = time.monotonic() + API_TOKEN_TTL
+        logger.debug('Refreshed Threads LSD token')
+
+        return self._api_token
 
     @staticmethod
     def _find_suitable_image_url(candidates: typing.List[types.Candidate], max_quality: int = 1440) -> str:
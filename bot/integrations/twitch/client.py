@@ -33,8 +33,8 @@ class TwitchClientSingleton(base.BaseClientSingleton):
         cls._INSTANCE = TwitchClient(conf.post_format)
 
     @classmethod
-    def should_handle(cls, url: str) -> bool:
-        return super().should_handle(url) and '/clip/' in url
+    def accepts_url(cls, url: str) -> bool:
+        return '/clip/' in url
 
 
 class TwitchClient(base.BaseClient):
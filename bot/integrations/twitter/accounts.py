@@ -0,0 +1,243 @@
+import asyncio
+import contextlib
+import datetime
+import time
+import typing
+from dataclasses import dataclass
+
+import twscrape
+
+from bot import exceptions
+from bot import logger
+
+_T = typing.TypeVar('_T')
+
+QUEUE = 'TweetDetail'
+DB_FILE = 'accounts.db'
+# TweetDetail requests per 15 minutes, assumed until a response tells the actual limit
+_DEFAULT_BUDGET = 150
+_ACQUIRE_TIMEOUT = 10.0
+# Doubled with every consecutive failure
+_FAILURE_COOLDOWN = 30.0
+_MAX_COOLDOWN = 15 * 60.0
+_REQUEST_LOCK = datetime.timedelta(minutes=15)
+# Stats are logged with the first request after the interval passes, and on close
+_STATS_INTERVAL = 15 * 60.0
+
+
+@dataclass
+class AccountStats:
+    username: str
+    requests: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    rate_limited: int = 0
+    total_latency: float = 0.0
+
+    @property
+    def success_rate(self) -> float:
+        return self.succeeded / self.requests if self.requests else 1.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.requests if self.requests else 0.0
+
+
+class _AccountsPool(twscrape.AccountsPool):
+    """
+    Hands out a single account only, so the scheduler decides which account serves a request.
+    Returns no account instead of waiting when the account is locked or inactive, which raises NoAccountError.
+    """
+
+    def __init__(self, username: str, db_file: str) -> None:
+        super().__init__(db_file=db_file, raise_when_no_account=True)
+        self.username = username
+
+    async def get_for_queue(self, queue: str) -> typing.Optional[twscrape.Account]:
+        # Check and lock aren't atomic, but the scheduler never runs two requests on an account at a time
+        account = await self.get_account(self.username)
+        if account is None or not account.active:
+            return None
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if queue in account.locks and account.locks[queue] > now:
+            return None
+
+        # Same lock twscrape takes, released or extended once the request finishes
+        unlock_at = now + _REQUEST_LOCK
+        await self.lock_until(self.username, queue, int(unlock_at.timestamp()))
+        account.locks[queue] = unlock_at
+        return account
+
+
+class _Account:
+    def __init__(self, username: str, db_file: str) -> None:
+        self.api = twscrape.API(pool=_AccountsPool(username=username, db_file=db_file))
+        self.stats = AccountStats(username=username)
+        self.busy = False
+        self.limit: typing.Optional[int] = None
+        self.remaining: typing.Optional[int] = None
+        self.reset_at = 0.0
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+
+    @property
+    def username(self) -> str:
+        return self.stats.username
+
+    def budget(self) -> int:
+        if self.remaining is None or time.time() >= self.reset_at:
+            return self.limit or _DEFAULT_BUDGET
+        return self.remaining
+
+    def cool_down(self, seconds: float) -> None:
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+
+class Scheduler:
+    """
+    Spreads TweetDetail requests over the configured twscrape accounts. Every request is served by the idle account
+    with the most rate limit budget left, one request per account at a time. Accounts that fail are cooled down,
+    longer with every consecutive failure, rate limited and deactivated ones until twscrape unlocks them.
+    """
+
+    def __init__(self, usernames: typing.List[str], db_file: str = DB_FILE) -> None:
+        self.pool = twscrape.AccountsPool(db_file=db_file)
+        self._accounts = [_Account(username=username, db_file=db_file) for username in usernames]
+        self._condition: typing.Optional[asyncio.Condition] = None
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._stats_logged_at = time.monotonic()
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            # Bound to the loop it is first used in
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    async def _acquire(self) -> _Account:
+        condition = self._get_condition()
+        deadline = time.monotonic() + _ACQUIRE_TIMEOUT
+        async with condition:
+            while True:
+                now = time.monotonic()
+                idle = [account for account in self._accounts if not account.busy]
+                ready = [account for account in idle if account.cooldown_until <= now]
+                if ready:
+                    account = max(ready, key=lambda account: (account.budget(), account.stats.success_rate))
+                    account.busy = True
+                    return account
+
+                wake_at = min([account.cooldown_until for account in idle] + [deadline])
+                # Nothing frees up in time when no account is busy and none cools down before the deadline
+                if (wake_at >= deadline and len(idle) == len(self._accounts)) or now >= deadline:
+                    raise exceptions.IntegrationClientError('No twitter account available')
+
+                with contextlib.suppress(TimeoutError):
+                    async with asyncio.timeout(wake_at - now):
+                        await condition.wait()
+
+    async def _release(self, account: _Account) -> None:
+        condition = self._get_condition()
+        async with condition:
+            account.busy = False
+            condition.notify_all()
+
+    def _succeeded(self, account: _Account, response: typing.Optional[twscrape.Response] = None) -> None:
+        account.stats.succeeded += 1
+        account.consecutive_failures = 0
+        if response is None:
+            return
+
+        limit = int(response.headers.get('x-rate-limit-limit', -1))
+        remaining = int(response.headers.get('x-rate-limit-remaining', -1))
+        reset_at = int(response.headers.get('x-rate-limit-reset', -1))
+        if limit >= 0:
+            account.limit = limit
+        if remaining >= 0 and reset_at > 0:
+            account.remaining = remaining
+            account.reset_at = reset_at
+
+    async def _failed(self, account: _Account, error: Exception) -> None:
+        account.stats.failed += 1
+        account.consecutive_failures += 1
+        cooldown = min(_FAILURE_COOLDOWN * 2 ** (account.consecutive_failures - 1), _MAX_COOLDOWN)
+
+        if isinstance(error, twscrape.NoAccountError):
+            # twscrape locked (rate limit) or deactivated (ban, expired session) the account
+            state = await self.pool.get_account(account.username)
+            if state is None or not state.active:
+                cooldown = _MAX_COOLDOWN
+            elif QUEUE in state.locks:
+                account.stats.rate_limited += 1
+                unlock_in = (state.locks[QUEUE] - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+                cooldown = max(cooldown, unlock_in)
+
+        account.cool_down(cooldown)
+        logger.warning(
+            'Twitter account failed, cooling down',
+            username=account.username,
+            cooldown=cooldown,
+            error=str(error) or type(error).__name__,
+        )
+
+    async def _run(
+        self,
+        func: typing.Callable[[twscrape.API], typing.Awaitable[_T]],
+    ) -> typing.Tuple[_T, str]:
+        account = await self._acquire()
+        account.stats.requests += 1
+        start = time.monotonic()
+        try:
+            result = await func(account.api)
+            if result is None:
+                # twscrape gives up on blocked or unparsable responses without raising
+                raise exceptions.IntegrationClientError('No response')
+        except Exception as e:
+            await self._failed(account, e)
+            raise
+        else:
+            self._succeeded(account, result if isinstance(result, twscrape.Response) else None)
+            return result, account.username
+        finally:
+            account.stats.total_latency += time.monotonic() - start
+            await self._release(account)
+            if time.monotonic() - self._stats_logged_at >= _STATS_INTERVAL:
+                self.log_stats()
+
+    async def tweet_details(self, twid: int) -> typing.Tuple[typing.Dict[str, typing.Any], str]:
+        """
+        Returns the TweetDetail response document, which holds the tweet and its first replies, and the username
+        of the account that fetched it.
+        """
+        response, username = await self._run(lambda api: api.tweet_details_raw(twid))
+        return response.json(), username
+
+    async def tweet_replies(self, twid: int, limit: int) -> typing.List[twscrape.Tweet]:
+        replies, _ = await self._run(lambda api: twscrape.gather(api.tweet_replies(twid, limit=limit)))
+        return replies
+
+    async def account(self, username: str) -> typing.Optional[twscrape.Account]:
+        return await self.pool.get_account(username)
+
+    def reset(self) -> None:
+        # Relogged in accounts can be used right away
+        for account in self._accounts:
+            account.cooldown_until = 0.0
+            account.consecutive_failures = 0
+
+    def stats(self) -> typing.List[AccountStats]:
+        return [AccountStats(**vars(account.stats)) for account in self._accounts]
+
+    def log_stats(self) -> None:
+        self._stats_logged_at = time.monotonic()
+        for stats in self.stats():
+            logger.info(
+                'Twitter account stats',
+                username=stats.username,
+                requests=stats.requests,
+                success_rate=round(stats.success_rate, 3),
+                avg_latency=round(stats.avg_latency, 3),
+                rate_limited=stats.rate_limited,
+            )
@@ -1,5 +1,9 @@
+import asyncio
+import collections
 import datetime
+import functools
 import json
+import time
 import typing
 
 import fake_useragent
@@ -13,8 +17,11 @@ from bot import constants
 from bot import domain
 from bot import exceptions
 from bot import logger
+from bot.common import singleflight
+from bot.common import stream
 from bot.common import utils
 from bot.integrations import base
+from bot.integrations.twitter import accounts as twitter_accounts
 from bot.integrations.twitter import config
 
 SCRAPE_URL = 'https://cdn.syndication.twimg.com/tweet-result'
@@ -33,6 +40,19 @@ HEADERS = {
     'Cache-Control': 'no-cache',
     'TE': 'trailers',
 }
+# Transaction id material (home page key and animation frames) changes rarely, ids are generated from it locally
+TRANSACTION_TTL = 6 * 3600
+TRANSACTION_REFRESH_BEFORE = 1800
+# Links to different photos of a tweet and its comments come in together, they share one upstream fetch
+TWEET_CACHE_TTL = 120
+TWEET_CACHE_MAX_ENTRIES = 1024
+
+_T = typing.TypeVar('_T')
+
+
+@functools.cache
+def _user_agent() -> str:
+    return fake_useragent.UserAgent().random
 
 
 class TwitterClientSingleton(base.BaseClientSingleton):
@@ -40,8 +60,8 @@ class TwitterClientSingleton(base.BaseClientSingleton):
     _CONFIG_CLASS = config.TwitterConfig
 
     @classmethod
-    def should_handle(cls, url: str) -> bool:
-        return super().should_handle(url) and '/status/' in url
+    def accepts_url(cls, url: str) -> bool:
+        return '/status/' in url
 
     @classmethod
     def _create_instance(cls) -> None:
@@ -52,11 +72,16 @@ class TwitterClientSingleton(base.BaseClientSingleton):
             cls._INSTANCE = base.MISSING
             return
 
+        account_configs = list(conf.accounts)
+        if conf.username and conf.email and conf.password:
+            account_configs.append(
+                config.TwitterAccount(username=conf.username, email=conf.email, password=conf.password)
+            )
+
         cls._INSTANCE = TwitterClient(
-            username=conf.username,
-            email=conf.email,
-            password=conf.password,
+            accounts=account_configs,
             post_format=conf.post_format,
+            hedge_delay=conf.hedge_delay,
         )
 
 
@@ -65,21 +90,33 @@ class TwitterClient(base.BaseClient):
 
     def __init__(
         self,
-        username: typing.Optional[str],
-        email: typing.Optional[str],
-        password: typing.Optional[str],
+        accounts: typing.List[config.TwitterAccount],
         post_format: typing.Optional[str] = None,
+        hedge_delay: typing.Optional[float] = None,
     ):
         super().__init__(post_format)
+        self.hedge_delay = hedge_delay
 
-        self.client: typing.Optional[twscrape.API] = None
-        if all([username, email, password]):
-            self.client = twscrape.API()
+        self.client: typing.Optional[twitter_accounts.Scheduler] = None
+        if accounts:
+            self.client = twitter_accounts.Scheduler(usernames=[account.username for account in accounts])
 
         self.logged_in = False
-        self.username = username
-        self.email = email
-        self.password = password
+        self.accounts = accounts
+        self._login_flight: singleflight.SingleFlight[None] = singleflight.SingleFlight()
+
+        # (source, tweet id) -> (expires at, raw tweet), shared between callers and must not be mutated
+        self._tweets: collections.OrderedDict[typing.Tuple[str, str], typing.Tuple[float, typing.Any]] = (
+            collections.OrderedDict()
+        )
+        self._tweet_fetch: singleflight.SingleFlight[typing.Any] = singleflight.SingleFlight()
+
+        self._transaction: typing.Optional[x_client_transaction.ClientTransaction] = None
+        self._transaction_expires_at = 0.0
+        self._transaction_fetch: singleflight.SingleFlight[x_client_transaction.ClientTransaction] = (
+            singleflight.SingleFlight()
+        )
+        self._transaction_refresh: typing.Optional[asyncio.Task] = None
 
     @staticmethod
     def _parse_url(url: str) -> typing.Tuple[str, typing.Optional[int]]:
@@ -91,45 +128,122 @@ class TwitterClient(base.BaseClient):
         return self.INTEGRATION, uid, index
 
     async def relogin(self) -> None:
+        # Rate limited accounts are only cooled down, twscrape deactivates banned and logged out ones
         if self.client:
-            await self.client.pool.relogin(usernames=[self.username])
+            await self.client.pool.relogin_failed()
+            self.client.reset()
+
+    async def _gen_transaction_id(self, method: str = 'POST', path: str = '/1.1/onboarding/task.json') -> str:
+        transaction = await self._get_client_transaction()
+        return transaction.generate_transaction_id(method=method, path=path)
 
-    def _gen_transaction_id(self) -> str:
+    async def _get_client_transaction(self) -> x_client_transaction.ClientTransaction:
+        """
+        Returns the cached transaction id generator. It is refreshed in the background shortly before it expires,
+        callers only wait for the fetch when there is none or it already expired.
+        """
+        now = time.monotonic()
+        if self._transaction is None or now >= self._transaction_expires_at:
+            transaction, _ = await self._transaction_fetch.do('transaction', self._fetch_client_transaction)
+            return transaction
+
+        if now >= self._transaction_expires_at - TRANSACTION_REFRESH_BEFORE and self._transaction_refresh is None:
+            self._transaction_refresh = asyncio.create_task(self._refresh_client_transaction())
+
+        return self._transaction
+
+    async def _refresh_client_transaction(self) -> None:
+        try:
+            await self._transaction_fetch.do('transaction', self._fetch_client_transaction)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # The cached one is used until it expires
+            logger.warning('Failed refreshing twitter transaction id material', error=str(e))
+        finally:
+            self._transaction_refresh = None
+
+    async def _fetch_client_transaction(self) -> x_client_transaction.ClientTransaction:
+        # Fetches the home page and the ondemand script with requests, keep it off the event loop
+        transaction = await asyncio.get_running_loop().run_in_executor(None, self._build_client_transaction)
+        self._transaction = transaction
+        self._transaction_expires_at = time.monotonic() + TRANSACTION_TTL
+        logger.debug('Fetched twitter transaction id material')
+        return transaction
+
+    @staticmethod
+    def _build_client_transaction() -> x_client_transaction.ClientTransaction:
         headers = {
             'Authority': 'x.com',
             'Accept-Language': 'en-US,en;q=0.9',
             'Cache-Control': 'no-cache',
             'Referer': 'https://x.com',
-            'User-Agent': fake_useragent.UserAgent().random,
+            'User-Agent': _user_agent(),
             'X-Twitter-Active-User': 'yes',
             'X-Twitter-Client-Language': 'en',
         }
-        session = requests.Session()
-        session.headers = headers
-        response = x_utils.handle_x_migration(session)
-        return x_client_transaction.ClientTransaction(response).generate_transaction_id(
-            method='POST', path='/1.1/onboarding/task.json'
-        )
+        with requests.Session() as session:
+            session.headers = headers
+            response = x_utils.handle_x_migration(session)
+        return x_client_transaction.ClientTransaction(response)
 
     async def login(self) -> None:
         if self.logged_in:
             return
 
-        await self.client.pool.add_account(
-            username=self.username,
-            email=self.email,
-            password=self.password,
-            email_password=self.password,
-        )
-        account = await self.client.pool.get_account(self.username)
-        account.headers.update(
-            {
-                'x-client-transaction-id': self._gen_transaction_id(),
-            }
-        )
-        await self.client.pool.save(account)
+        await self._login_flight.do('login', self._login)
+
+    async def _login(self) -> None:
+        for conf in self.accounts:
+            await self.client.pool.add_account(
+                username=conf.username,
+                email=conf.email,
+                password=conf.password,
+                email_password=conf.email_password or conf.password,
+            )
+            account = await self.client.pool.get_account(conf.username)
+            account.headers.update(
+                {
+                    'x-client-transaction-id': await self._gen_transaction_id(),
+                }
+            )
+            await self.client.pool.save(account)
 
         await self.client.pool.login_all()
+        self.logged_in = True
+
+    async def _get_cached_tweet(self, source: str, uid: str, fetch: typing.Callable[[], typing.Awaitable[_T]]) -> _T:
+        """
+        Returns the raw tweet of source fetched in the last TWEET_CACHE_TTL seconds, concurrent misses share a fetch.
+        """
+        key = (source, uid)
+        entry = self._tweets.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._tweets.move_to_end(key)
+            return entry[1]
+
+        async def fetch_and_store() -> _T:
+            tweet = await fetch()
+            self._tweets[key] = (time.monotonic() + TWEET_CACHE_TTL, tweet)
+            self._tweets.move_to_end(key)
+            while len(self._tweets) > TWEET_CACHE_MAX_ENTRIES:
+                self._tweets.popitem(last=False)
+            return tweet
+
+        tweet, _ = await self._tweet_fetch.do(key, fetch_and_store)
+        return tweet
+
+    async def _get_tweet_details(self, uid: str) -> typing.Tuple[typing.Dict[str, typing.Any], str]:
+        return await self._get_cached_tweet('details', uid, lambda: self.client.tweet_details(int(uid)))
+
+    async def _get_syndication_tweet(self, uid: str) -> typing.Dict[str, typing.Any]:
+        async def fetch() -> typing.Dict[str, typing.Any]:
+            tweet = json.loads(
+                await self._fetch_content(url=SCRAPE_URL, data='', headers=HEADERS, params={'id': uid, 'lang': 'en'})
+            )
+            if not tweet:
+                raise ValueError(f'Failed retreiving tweet {uid}')
+            return tweet
+
+        return await self._get_cached_tweet('syndication', uid, fetch)
 
     async def get_post(self, url: str) -> domain.Post:
         uid, index = self._parse_url(url)
@@ -137,9 +251,74 @@ class TwitterClient(base.BaseClient):
         if self.client is None:
             return await self._get_post_no_login(url=url, uid=uid, index=index or 0)
 
-        await self.login()
+        if self.hedge_delay is None:
+            await self.login()
+            return await self._get_post_login(url=url, uid=uid, index=index)
+
+        return await self._get_post_hedged(url=url, uid=uid, index=index)
 
-        return await self._get_post_login(url=url, uid=uid, index=index)
+    async def _get_post_authenticated(self, url: str, uid: str, index: typing.Optional[int]) -> domain.Post:
+        await self.login()
+        return await self._get_post_login(url=url, uid=uid, index=index, fallback=False)
+
+    async def _get_post_hedged(self, url: str, uid: str, index: typing.Optional[int]) -> domain.Post:
+        """
+        Races the authenticated fetch against the syndication one, which starts once the authenticated fetch
+        takes longer than hedge_delay or fails. The first post wins and the other fetch is cancelled.
+        Galleries are only complete when authenticated, the syndication post of a gallery is used if it fails.
+        """
+        authenticated = asyncio.create_task(self._get_post_authenticated(url=url, uid=uid, index=index))
+        pending = {authenticated}
+        syndication = None
+        errors: typing.List[BaseException] = []
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay)
+            while True:
+                pending -= done
+                posts = [task for task in done if task.exception() is None]
+                if posts:
+                    # Both can finish at once, the authenticated post has the full gallery
+                    winner = authenticated if authenticated in posts else posts[0]
+                    for task in posts:
+                        if task is not winner and task.result().buffer:
+                            task.result().buffer.close()
+                    logger.debug('Fetched tweet', url=url, syndication=winner is syndication)
+                    return winner.result()
+                errors.extend(task.exception() for task in done)
+
+                if syndication is None:
+                    syndication = asyncio.create_task(
+                        self._get_post_syndication(url=url, uid=uid, index=index, authenticated=authenticated)
+                    )
+                    pending.add(syndication)
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        # A too large media is the same either way, report it over a generic failure
+        error = next((e for e in errors if isinstance(e, exceptions.MediaTooLargeError)), errors[-1])
+        if isinstance(error, exceptions.BaseError):
+            raise error
+        raise exceptions.IntegrationClientError('Failed fetching from twitter') from error
+
+    async def _get_post_syndication(
+        self,
+        url: str,
+        uid: str,
+        index: typing.Optional[int],
+        authenticated: asyncio.Task,
+    ) -> domain.Post:
+        if index is None:
+            tweet = await self._get_syndication_tweet(uid)
+            photos = [media for media in tweet.get('mediaDetails') or [] if media.get('type') == 'photo']
+            if len(photos) > 1:
+                # Only the first photo of a gallery can be fetched without login, so it is a fallback only
+                await asyncio.wait({authenticated})
+        return await self._get_post_no_login(url=url, uid=uid, index=index or 0)
 
     async def get_comments(
         self,
@@ -153,8 +332,15 @@ class TwitterClient(base.BaseClient):
         await self.login()
 
         uid, _ = self._parse_url(url)
+        twid = int(uid)
         try:
-            replies = self.client.tweet_replies(twid=int(uid), limit=n)
+            # The tweet details hold the first replies, which are usually enough
+            document, _ = await self._get_tweet_details(uid)
+            tweets = list(twscrape.parse_tweets(document))
+            replies = [tweet for tweet in tweets if tweet.inReplyToTweetId == twid]
+            focal = next((tweet for tweet in tweets if tweet.id == twid), None)
+            if len(replies) < n and focal is not None and focal.replyCount > len(replies):
+                replies = await self.client.tweet_replies(twid=twid, limit=n)
         except Exception as e:
             logger.error('Failed fetching from twitter, retrying', error=str(e))
             if retry_count == 0:
@@ -170,7 +356,7 @@ class TwitterClient(base.BaseClient):
                 likes=reply.likeCount,
                 comment=reply.rawContent,
             )
-            async for reply in replies
+            for reply in replies
         ][:n]
 
     async def _get_post_login(
@@ -179,9 +365,15 @@ class TwitterClient(base.BaseClient):
         uid: str,
         index: typing.Optional[int] = None,
         retry_count: int = 0,
+        fallback: bool = True,
     ) -> domain.Post:
         try:
-            details = await self.client.tweet_details(int(uid))
+            document, username = await self._get_tweet_details(uid)
+            details = twscrape.parse_tweet(document, int(uid))
+            if details is None:
+                raise exceptions.IntegrationClientError(f'Tweet {uid} not found')
+
+            cookies = (await self.client.account(username)).cookies
             p = domain.Post(
                 url=url,
                 author=f'{details.user.displayname} ({details.user.username})',
@@ -195,13 +387,20 @@ class TwitterClient(base.BaseClient):
                 return p
 
             if details.media.videos:
-                media_url = max(details.media.videos[index or 0].variants, key=lambda x: x.bitrate).url
+                variants = sorted(details.media.videos[index or 0].variants, key=lambda x: x.bitrate, reverse=True)
+                p.buffer = await self._download_variants(
+                    urls=[variant.url for variant in variants],
+                    cookies=cookies,
+                )
+                return p
             elif details.media.photos:
                 # Download all photos if index not specified
                 if index is None:
-                    cookies = (await self.client.pool.get_all())[0].cookies
-                    p.buffer = utils.combine_images(
-                        [await self._download(url=photo.url, cookies=cookies) for photo in details.media.photos]
+                    p.buffer = await utils.combine_images(
+                        await self._download_gallery(
+                            urls=[photo.url for photo in details.media.photos],
+                            cookies=cookies,
+                        )
                     )
                     return p
 
@@ -211,24 +410,24 @@ class TwitterClient(base.BaseClient):
             else:
                 return p
 
-            p.buffer = await self._download(url=media_url, cookies=(await self.client.pool.get_all())[0].cookies)
+            p.buffer = await self._download(url=media_url, cookies=cookies)
             return p
+        except exceptions.MediaTooLargeError:
+            raise
         except Exception as e:
             logger.error('Failed fetching from twitter, retrying', error=str(e))
             if retry_count == 0:
                 await self.relogin()
-                return await self._get_post_login(url=url, uid=uid, index=index, retry_count=retry_count + 1)
-            if retry_count == 1:
-                return await self._get_post_no_login(url=url, uid=uid, index=index)
+                return await self._get_post_login(
+                    url=url, uid=uid, index=index, retry_count=retry_count + 1, fallback=fallback
+                )
+            if retry_count == 1 and fallback:
+                return await self._get_post_no_login(url=url, uid=uid, index=index or 0)
 
             raise exceptions.IntegrationClientError('Failed fetching from twitter') from e
 
     async def _get_post_no_login(self, url: str, uid: str, index: int = 0) -> domain.Post:
-        tweet = json.loads(
-            await self._fetch_content(url=SCRAPE_URL, data='', headers=HEADERS, params={'id': uid, 'lang': 'en'})
-        )
-        if not tweet:
-            raise ValueError(f'Failed retreiving tweet {url}')
+        tweet = await self._get_syndication_tweet(uid)
 
         post = domain.Post(
             url=url,
@@ -245,9 +444,28 @@ class TwitterClient(base.BaseClient):
             if media.get('type') == 'photo':
                 post.buffer = await self._download(url=media.get('media_url_https'))
             elif media.get('type') == 'video':
-                video = max(media.get('video_info').get('variants'), key=lambda v: v.get('bitrate', 0))
-                post.buffer = await self._download(url=video.get('url'))
+                # Streaming playlists have no bitrate and can't be downloaded directly
+                all_variants = media.get('video_info').get('variants')
+                variants = sorted(
+                    [v for v in all_variants if v.get('bitrate') is not None],
+                    key=lambda v: v.get('bitrate'),
+                    reverse=True,
+                )
+                if variants:
+                    post.buffer = await self._download_variants(urls=[variant.get('url') for variant in variants])
+                elif all_variants:
+                    # Only the playlist, yt-dlp fetches its segments
+                    post.buffer = await stream.download(stream_url=all_variants[0].get('url'))
+                else:
+                    raise exceptions.IntegrationClientError(f'No video variants in tweet {uid}')
         elif 'user' in tweet and 'profile_image_url_https' in tweet.get('user'):
             post.buffer = await self._download(url=tweet.get('user').get('profile_image_url_https'))
 
         return post
+
+    async def close(self) -> None:
+        if self._transaction_refresh is not None:
+            self._transaction_refresh.cancel()
+        if self.client is not None:
+            self.client.log_stats()
+        await super().close()
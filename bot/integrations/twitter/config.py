@@ -1,9 +1,22 @@
 import typing
 
+import pydantic
+
 from bot.integrations import base
 
 
+class TwitterAccount(pydantic.BaseModel):
+    username: str
+    email: str
+    password: str
+    email_password: typing.Optional[str] = None
+
+
 class TwitterConfig(base.BaseClientConfig):
     email: typing.Optional[str] = None
     username: typing.Optional[str] = None
     password: typing.Optional[str] = None
+    # Requests are spread over all accounts, username, email and password above are added as one more
+    accounts: typing.List[TwitterAccount] = []
+    # Seconds to wait for the authenticated fetch before racing it against the syndication one, None to disable
+    hedge_delay: typing.Optional[float] = 2.0
@@ -1,7 +1,6 @@
 import io
 import typing
 
-import aiohttp
 import pytubefix as pytube
 from django.conf import settings
 from pytubefix import exceptions as pytube_exceptions
@@ -81,6 +80,5 @@ class YoutubeClient(base.BaseClient):
         raise exceptions.NotSupportedError('get_comments')
 
     async def _get_likes(self, video_id: str) -> types.Likes:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url=LIKES_API_URL_TEMPLATE.format(video_id=video_id)) as resp:
-                return types.Likes.model_validate(await resp.json())
+        async with self.http.session.get(url=LIKES_API_URL_TEMPLATE.format(video_id=video_id)) as resp:
+            return types.Likes.model_validate(await resp.json())
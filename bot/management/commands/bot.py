@@ -2,13 +2,21 @@ import asyncio
 import typing
 
 from django import db
+from django.conf import settings
 from django.core.management import base
 
+from bot import cache
 from bot import constants
 from bot import logger
+from bot import service
 from bot.adapters.discord import bot as discord_bot
 from bot.adapters.terminal import bot as terminal_bot
+from bot.common import stream
+from bot.common import transcoding
 from bot.common import utils
+from bot.integrations import registry
+
+_DEFAULT_STATS_LOG_INTERVAL = 15 * 60
 
 BOT_ADAPTERS = {
     constants.ServerVendor.DISCORD: discord_bot.DiscordBot,
@@ -40,7 +48,32 @@ class Command(base.BaseCommand):
 
         while True:
             try:
-                asyncio.run(bot_instance.run())
+                asyncio.run(self._run(bot_instance))
             except db.OperationalError as e:
                 logger.warning('DB Connection expired, reconnecting', error=str(e))
                 utils.recover_from_db_error(e)
+
+    @classmethod
+    async def _run(cls, bot_instance: typing.Any) -> typing.NoReturn:
+        stats_logger = asyncio.create_task(cls._log_stats_periodically())
+        try:
+            await bot_instance.run()
+        finally:
+            stats_logger.cancel()
+            # Pooled http sessions are bound to this event loop
+            await registry.close()
+            stream.close()
+            cls._log_stats()
+
+    @classmethod
+    async def _log_stats_periodically(cls) -> typing.NoReturn:
+        interval = getattr(settings, 'STATS_LOG_INTERVAL', _DEFAULT_STATS_LOG_INTERVAL)
+        while True:
+            await asyncio.sleep(interval)
+            cls._log_stats()
+
+    @staticmethod
+    def _log_stats() -> None:
+        cache.log_stats()
+        transcoding.log_stats()
+        service.log_stats()
@@ -7,6 +7,7 @@ from django.core.management import base
 
 from bot import logger
 from bot import models
+from bot import repository
 from bot.common import utils
 
 
@@ -45,13 +46,13 @@ class Command(base.BaseCommand):
 
         while True:
             try:
-                num_deleted, _ = models.Post.objects.filter(
+                num_deleted = repository.delete_posts(
                     pk__in=list(
                         models.Post.objects.filter(created__lt=datetime.datetime.now() - older_than).values_list(
                             'pk', flat=True
                         )[:batch_size]
                     )
-                ).delete()
+                )
             except db.OperationalError as e:
                 logger.warning('DB Connection expired, reconnecting', str(e))
                 utils.recover_from_db_error(e)
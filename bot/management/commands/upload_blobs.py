@@ -0,0 +1,41 @@
+import os
+import typing
+
+from django.conf import settings
+from django.core.management import base
+
+from bot import logger
+from bot.common import blob_store
+from bot.common import media
+
+
+class Command(base.BaseCommand):
+    help = 'Uploads blobs from a local blob store directory to the configured blob store'
+
+    def add_arguments(self, parser: base.CommandParser) -> None:
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'blobs'),
+            action='store',
+            type=str,
+            help='Directory of the local blob store',
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:
+        path = options['path']
+        store = blob_store.get_store()
+        logger.info('Running upload blobs command', path=path)
+
+        uploaded = 0
+        for directory, dirnames, filenames in os.walk(path):
+            # Unfinished writes of the local store
+            dirnames[:] = [dirname for dirname in dirnames if dirname != 'tmp']
+            for filename in filenames:
+                with media.FileBuffer(os.path.join(directory, filename)) as buffer:
+                    key = store.put(buffer)
+                if key != filename:
+                    logger.warning('Blob content does not match its key', key=filename, content_hash=key)
+                    continue
+                uploaded += 1
+
+        logger.info('Uploaded blobs', count=uploaded)
@@ -0,0 +1,87 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core import exceptions
+from django.db import migrations
+from django.db import models
+
+# Frozen copy of the local blob store layout at the time of this migration, so replaying it never depends on
+# the current blob store code. Only the local store is supported, other backends fail before anything is dropped.
+
+
+def _blobs_dir():
+    config = getattr(settings, 'BLOB_STORE', {})
+    if config.get('backend', 'local') != 'local':
+        raise exceptions.ImproperlyConfigured(
+            f'Post blobs can only be migrated to the local blob store, not to {config.get("backend")}. '
+            'Migrate with BLOB_STORE_BACKEND=local, then run the upload_blobs command with the configured store.'
+        )
+    return str(config.get('path') or os.path.join(settings.BASE_DIR, 'blobs'))
+
+
+def _path(blobs_dir, key):
+    return os.path.join(blobs_dir, key[:2], key[2:4], key)
+
+
+def check_blob_store(apps, schema_editor):
+    # Fails before the schema changes, not every database rolls them back
+    if apps.get_model('bot', 'Post').objects.exclude(blob=None).exists():
+        _blobs_dir()
+
+
+def move_blobs_to_store(apps, schema_editor):
+    Post = apps.get_model('bot', 'Post')
+    posts = Post.objects.exclude(blob=None)
+    if not posts.exists():
+        return
+
+    blobs_dir = _blobs_dir()
+    for post in posts.only('pk', 'blob').iterator():
+        blob = bytes(post.blob)
+        key = hashlib.sha256(blob).hexdigest()
+        path = _path(blobs_dir, key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f'{path}.tmp', 'wb') as f:
+                f.write(blob)
+            os.replace(f'{path}.tmp', path)
+
+        post.blob_hash = key
+        post.save(update_fields=['blob_hash'])
+
+
+def move_blobs_from_store(apps, schema_editor):
+    Post = apps.get_model('bot', 'Post')
+    posts = Post.objects.exclude(blob_hash=None)
+    if not posts.exists():
+        return
+
+    blobs_dir = _blobs_dir()
+    for post in posts.only('pk', 'blob_hash').iterator():
+        try:
+            with open(_path(blobs_dir, post.blob_hash), 'rb') as f:
+                post.blob = f.read()
+        except FileNotFoundError:
+            continue
+        post.save(update_fields=['blob'])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('bot', '0002_post_dislikes'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_blob_store, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='post',
+            name='blob_hash',
+            field=models.CharField(default=None, max_length=64, null=True),
+        ),
+        migrations.RunPython(move_blobs_to_store, move_blobs_from_store),
+        migrations.RemoveField(
+            model_name='post',
+            name='blob',
+        ),
+    ]
@@ -166,8 +166,9 @@ class Post(models.Model):
         null=True,
         default=None,
     )
-    blob = models.BinaryField(
-        max_length=1048576,
+    # Key of the media in the blob store
+    blob_hash = models.CharField(
+        max_length=64,
         null=True,
         default=None,
     )
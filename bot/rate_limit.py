@@ -0,0 +1,199 @@
+import abc
+import datetime
+import functools
+import threading
+import time
+import typing
+
+from django.conf import settings
+
+from bot import cache
+from bot import exceptions
+
+_DEFAULT_WINDOW = 60 * 60 * 24  # 1 day
+_DEFAULT_BUCKETS = 24
+
+
+class Backend(abc.ABC):
+    """
+    Stores hit counts per key and bucket, must increment atomically.
+    """
+
+    @abc.abstractmethod
+    def increment(self, key: str, bucket: int, ttl: int) -> None:
+        pass
+
+    @abc.abstractmethod
+    def count(self, key: str, buckets: range) -> typing.Optional[int]:
+        """
+        Returns the sum of hits in buckets or None if the key was not loaded yet (cold start).
+        """
+
+    @abc.abstractmethod
+    def load(self, key: str, counts: typing.Dict[int, int], ttl: int) -> None:
+        """
+        Replaces the buckets of the key and marks it as loaded.
+        """
+
+    def cache_keys(self, key: str, buckets: range) -> typing.List[typing.Tuple[cache.Store, str]]:
+        """
+        Cache entries needed to count hits, so they can be fetched together with other entries.
+        """
+        return []
+
+    def count_from(
+        self,
+        key: str,
+        buckets: range,
+        values: typing.Dict[typing.Tuple[cache.Store, str], typing.Any],
+    ) -> typing.Optional[int]:
+        """
+        Same as count, but from entries already fetched from the cache.
+        """
+        return self.count(key=key, buckets=buckets)
+
+
+class MemoryBackend(Backend):
+    """
+    In-process backend, state is lost on restart.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: typing.Dict[str, typing.Dict[int, int]] = {}
+
+    def increment(self, key: str, bucket: int, ttl: int) -> None:
+        with self._lock:
+            buckets = self._buckets.get(key)
+            if buckets is None:
+                # Not loaded yet, the hit will be picked up from the DB on first count
+                return
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+
+    def count(self, key: str, buckets: range) -> typing.Optional[int]:
+        with self._lock:
+            counts = self._buckets.get(key)
+            if counts is None:
+                return None
+
+            # Drop buckets that slid out of the window
+            for bucket in [bucket for bucket in counts if bucket < buckets.start]:
+                del counts[bucket]
+            return sum(counts.get(bucket, 0) for bucket in buckets)
+
+    def load(self, key: str, counts: typing.Dict[int, int], ttl: int) -> None:
+        with self._lock:
+            self._buckets[key] = dict(counts)
+
+
+class CacheBackend(Backend):
+    """
+    Shared backend on top of the django cache (memcached, redis), which increment atomically.
+    """
+
+    _STORE = cache.Store.SERVER_POST_RATE
+    _KEY_FORMAT = '{key}_{bucket}'
+    _LOADED_KEY_FORMAT = '{key}_loaded'
+
+    def increment(self, key: str, bucket: int, ttl: int) -> None:
+        cache.increment(store=self._STORE, key=self._KEY_FORMAT.format(key=key, bucket=bucket), override_timeout=ttl)
+
+    def count(self, key: str, buckets: range) -> typing.Optional[int]:
+        return self.count_from(
+            key=key,
+            buckets=buckets,
+            values=cache.get_many(keys=self.cache_keys(key=key, buckets=buckets)),
+        )
+
+    def load(self, key: str, counts: typing.Dict[int, int], ttl: int) -> None:
+        values: typing.Dict[typing.Tuple[cache.Store, str], typing.Any] = {
+            (self._STORE, self._KEY_FORMAT.format(key=key, bucket=bucket)): count for bucket, count in counts.items()
+        }
+        # Buckets without hits are not stored, the marker tells them apart from a cold start
+        values[(self._STORE, self._LOADED_KEY_FORMAT.format(key=key))] = True
+        cache.set_many(values=values, override_timeout=ttl)
+
+    def cache_keys(self, key: str, buckets: range) -> typing.List[typing.Tuple[cache.Store, str]]:
+        return [(self._STORE, self._LOADED_KEY_FORMAT.format(key=key))] + [
+            (self._STORE, self._KEY_FORMAT.format(key=key, bucket=bucket)) for bucket in buckets
+        ]
+
+    def count_from(
+        self,
+        key: str,
+        buckets: range,
+        values: typing.Dict[typing.Tuple[cache.Store, str], typing.Any],
+    ) -> typing.Optional[int]:
+        if (self._STORE, self._LOADED_KEY_FORMAT.format(key=key)) not in values:
+            return None
+        return sum(values.get((self._STORE, self._KEY_FORMAT.format(key=key, bucket=bucket)), 0) for bucket in buckets)
+
+
+class SlidingWindowLimiter:
+    """
+    Counts hits per key over a sliding window, split into fixed size buckets.
+    The window slides one bucket at a time: it covers the previous buckets - 1 full buckets and the elapsed part of
+    the current one, so counts include between window - bucket_size and window seconds of hits
+    (23 to 24 hours with 24 buckets of an hour).
+    """
+
+    def __init__(self, backend: Backend, window: int = _DEFAULT_WINDOW, buckets: int = _DEFAULT_BUCKETS) -> None:
+        self.backend = backend
+        self.window = window
+        self.buckets = buckets
+        self.bucket_size = window // buckets
+
+    def _bucket(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_size)
+
+    def _window_buckets(self) -> range:
+        current = self._bucket(time.time())
+        return range(current - self.buckets + 1, current + 1)
+
+    def window_start(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self._window_buckets().start * self.bucket_size)
+
+    def hit(self, key: str) -> None:
+        self.backend.increment(key=key, bucket=self._bucket(time.time()), ttl=self.window + self.bucket_size)
+
+    def count(self, key: str) -> typing.Optional[int]:
+        """
+        Returns the number of hits in the window or None on cold start, in which case it needs to be loaded.
+        """
+        return self.backend.count(key=key, buckets=self._window_buckets())
+
+    def cache_keys(self, key: str) -> typing.List[typing.Tuple[cache.Store, str]]:
+        return self.backend.cache_keys(key=key, buckets=self._window_buckets())
+
+    def count_from(
+        self, key: str, values: typing.Dict[typing.Tuple[cache.Store, str], typing.Any]
+    ) -> typing.Optional[int]:
+        return self.backend.count_from(key=key, buckets=self._window_buckets(), values=values)
+
+    def load(self, key: str, hits: typing.Iterable[datetime.datetime]) -> int:
+        """
+        Loads the key from hit times (local time), returns the number of hits in the window.
+        """
+        counts: typing.Dict[int, int] = {}
+        for hit in hits:
+            bucket = self._bucket(hit.timestamp())
+            counts[bucket] = counts.get(bucket, 0) + 1
+
+        buckets = self._window_buckets()
+        counts = {bucket: count for bucket, count in counts.items() if bucket in buckets}
+        self.backend.load(key=key, counts=counts, ttl=self.window + self.bucket_size)
+
+        return sum(counts.values())
+
+
+@functools.cache
+def get_server_post_limiter() -> SlidingWindowLimiter:
+    config = dict(getattr(settings, 'RATE_LIMIT', {}))
+    backend = config.pop('backend', 'cache')
+
+    if backend == 'cache':
+        return SlidingWindowLimiter(backend=CacheBackend(), **config)
+    if backend == 'memory':
+        return SlidingWindowLimiter(backend=MemoryBackend(), **config)
+
+    raise exceptions.ConfigurationError(f'Unknown rate limit backend: {backend}')
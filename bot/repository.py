@@ -1,14 +1,21 @@
-import datetime
-import io
+import asyncio
+import functools
 import typing
+from concurrent import futures
 
+from django import db as django_db
+from django.conf import settings
 from django.db import transaction
+from django.db.models import expressions
 
 from bot import cache
 from bot import constants
 from bot import domain
 from bot import exceptions
+from bot import logger
 from bot import models
+from bot import rate_limit
+from bot.common import blob_store
 
 
 def create_server(
@@ -68,21 +75,29 @@ def create_server(
     return server
 
 
-def get_number_of_posts_in_server_from_datetime(
-    server_id: int,
-    from_datetime: datetime.datetime,
-) -> int:
-    post_cnt = cache.get(store=cache.Store.SERVER_POST_COUNT, key=str(server_id))
-    if post_cnt != cache.NO_HIT:
+def get_number_of_posts_in_server(vendor: constants.ServerVendor, vendor_uid: str) -> int:
+    """
+    Returns the number of posts in the server over the rate limit window (last day).
+    """
+    limiter = rate_limit.get_server_post_limiter()
+    post_cnt = limiter.count(key=f'{vendor.value}_{vendor_uid}')
+    if post_cnt is not None:
         return post_cnt
 
-    post_cnt = models.ServerPost.objects.filter(
-        server_id=server_id,
-        created__gt=from_datetime,
-    ).count()
-    cache.set(store=cache.Store.SERVER_POST_COUNT, key=str(server_id), value=post_cnt)
+    return _load_number_of_posts_in_server(vendor=vendor, vendor_uid=vendor_uid)
 
-    return post_cnt
+
+def _load_number_of_posts_in_server(vendor: constants.ServerVendor, vendor_uid: str) -> int:
+    # Cold start
+    limiter = rate_limit.get_server_post_limiter()
+    return limiter.load(
+        key=f'{vendor.value}_{vendor_uid}',
+        hits=models.ServerPost.objects.filter(
+            server__vendor=vendor,
+            server__vendor_uid=vendor_uid,
+            created__gte=limiter.window_start(),
+        ).values_list('created', flat=True),
+    )
 
 
 def update_post_format(
@@ -98,6 +113,10 @@ def update_post_format(
     ).update(post_format=post_format)
 
     cache.delete(store=cache.Store.SERVER, key=f'{vendor.value}_{vendor_uid}')
+    cache.delete(
+        store=cache.Store.SERVER_INTEGRATION_POST_FORMAT,
+        key=f'{vendor.value}_{vendor_uid}_{integration.value}',
+    )
 
 
 def get_post_format(
@@ -193,6 +212,13 @@ def get_post(
     if post is None:
         return None
 
+    buffer = None
+    if post.blob_hash:
+        buffer = blob_store.get_store().open(post.blob_hash)
+        if buffer is None:
+            logger.warning('Post blob missing from store', post_id=post.pk, blob_hash=post.blob_hash)
+            return None
+
     return domain.Post(
         url=url,
         author=post.author,
@@ -200,7 +226,7 @@ def get_post(
         views=post.views,
         likes=post.likes,
         dislikes=post.dislikes,
-        buffer=io.BytesIO(post.blob) if post.blob else None,
+        buffer=buffer,
         spoiler=post.spoiler,
         created=post.posted_at,
         _internal_id=post.pk,
@@ -216,19 +242,55 @@ def save_post(
     if not integration_uid:
         raise exceptions.RepositoryError('Error occured, contact support.')
 
-    return models.Post.objects.create(
+    blob_hash = blob_store.get_store().put(post.buffer) if post.buffer else None
+
+    # Concurrent requests for the same post may both try to save it
+    post_model, created = models.Post.objects.get_or_create(
         integration=integration,
         integration_uid=integration_uid,
         integration_index=integration_index,
-        author=post.author,
-        description=post.description,
-        views=post.views,
-        likes=post.likes,
-        dislikes=post.dislikes,
-        spoiler=post.spoiler,
-        posted_at=post.created,
-        blob=post.read_buffer(),
+        defaults={
+            'author': post.author,
+            'description': post.description,
+            'views': post.views,
+            'likes': post.likes,
+            'dislikes': post.dislikes,
+            'spoiler': post.spoiler,
+            'posted_at': post.created,
+            'blob_hash': blob_hash,
+        },
     )
+    if not created and post_model.blob_hash != blob_hash:
+        # Blob went missing from the store and got fetched again
+        replaced_hash = post_model.blob_hash
+        post_model.blob_hash = blob_hash
+        post_model.save(update_fields=['blob_hash'])
+        if replaced_hash:
+            _delete_unreferenced_blobs(blob_hashes={replaced_hash})
+
+    return post_model
+
+
+def delete_posts(**filters: typing.Any) -> int:
+    """
+    Deletes the matching posts along with the blobs no other post references.
+    """
+    posts = models.Post.objects.filter(**filters)
+    blob_hashes = set(posts.exclude(blob_hash=None).values_list('blob_hash', flat=True))
+    num_deleted, _ = posts.delete()
+    _delete_unreferenced_blobs(blob_hashes=blob_hashes)
+    return num_deleted
+
+
+def _delete_unreferenced_blobs(blob_hashes: typing.Set[str]) -> None:
+    # A post saved concurrently may still end up referencing a deleted blob, it is fetched again when requested
+    referenced = set(models.Post.objects.filter(blob_hash__in=blob_hashes).values_list('blob_hash', flat=True))
+    store = blob_store.get_store()
+    for blob_hash in blob_hashes - referenced:
+        try:
+            store.delete(blob_hash)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.warning('Failed to delete blob', blob_hash=blob_hash, error=str(e))
 
 
 def save_server_post(
@@ -254,23 +316,24 @@ def save_server_post(
             server=server,
             post_id=post._internal_id,
         )
-        cache.increment(store=cache.Store.SERVER_POST_COUNT, key=str(server.pk))
+        rate_limit.get_server_post_limiter().hit(key=f'{server_vendor.value}_{server_uid}')
         return
 
+    # Uploading the blob is kept out of the transaction
+    post_model = save_post(
+        post=post,
+        integration=integration,
+        integration_uid=integration_uid,
+        integration_index=integration_index,
+    )
     with transaction.atomic():
-        post_model = save_post(
-            post=post,
-            integration=integration,
-            integration_uid=integration_uid,
-            integration_index=integration_index,
-        )
         models.ServerPost.objects.create(
             author_uid=author_uid,
             url=post.url,
             server=server,
             post=post_model,
         )
-        cache.increment(store=cache.Store.SERVER_POST_COUNT, key=str(server.pk))
+        rate_limit.get_server_post_limiter().hit(key=f'{server_vendor.value}_{server_uid}')
 
 
 def is_member_banned_from_server(
@@ -295,6 +358,123 @@ def is_member_banned_from_server(
     return banned
 
 
+class AuthorizationState(typing.NamedTuple):
+    server: typing.Optional[domain.Server]
+    member_banned: bool
+    num_posts_in_server: int
+
+
+def get_authorization_state(
+    server_vendor: constants.ServerVendor,
+    server_uid: str,
+    member_uid: str,
+) -> AuthorizationState:
+    """
+    Everything needed to check whether a member can post in a server, read from the cache in a single round trip.
+    Misses of the server and member are loaded with a single query.
+    """
+    server_key = (cache.Store.SERVER, f'{server_vendor.value}_{server_uid}')
+    banned_key = (cache.Store.SERVER_USER_BANNED, f'{server_vendor.value}_{server_uid}_{member_uid}')
+    limiter = rate_limit.get_server_post_limiter()
+    rate_key = f'{server_vendor.value}_{server_uid}'
+
+    values = cache.get_many(keys=[server_key, banned_key] + limiter.cache_keys(key=rate_key))
+    server = values.get(server_key, cache.NO_HIT)
+    banned = values.get(banned_key, cache.NO_HIT)
+
+    misses: typing.Dict[typing.Tuple[cache.Store, str], typing.Any] = {}
+    if server == cache.NO_HIT:
+        server, member_banned = _get_server_with_member_banned(
+            vendor=server_vendor,
+            vendor_uid=server_uid,
+            member_uid=member_uid,
+        )
+        if server:
+            misses[server_key] = server
+        if banned == cache.NO_HIT:
+            banned = misses[banned_key] = member_banned
+    elif banned == cache.NO_HIT:
+        banned = misses[banned_key] = models.ServerMember.objects.filter(
+            server__vendor=server_vendor,
+            server__vendor_uid=server_uid,
+            vendor_uid=member_uid,
+            banned=True,
+        ).exists()
+
+    if misses:
+        cache.set_many(values=misses)
+
+    num_posts = limiter.count_from(key=rate_key, values=values)
+    if num_posts is None:
+        num_posts = _load_number_of_posts_in_server(vendor=server_vendor, vendor_uid=server_uid) if server else 0
+
+    return AuthorizationState(server=server, member_banned=banned is True, num_posts_in_server=num_posts)
+
+
+def _get_server_with_member_banned(
+    vendor: constants.ServerVendor,
+    vendor_uid: str,
+    member_uid: str,
+) -> typing.Tuple[typing.Optional[domain.Server], bool]:
+    # Integrations are joined in, so there is a row per integration (or a single one without integrations)
+    rows = list(
+        models.Server.objects.filter(
+            vendor=vendor,
+            vendor_uid=vendor_uid,
+            status=constants.ServerStatus.ACTIVE,
+        )
+        .annotate(
+            member_banned=expressions.Subquery(
+                models.ServerMember.objects.filter(
+                    server=expressions.OuterRef('pk'),
+                    vendor_uid=member_uid,
+                ).values('banned')[:1]
+            ),
+        )
+        .values(
+            'pk',
+            'uid',
+            'vendor_uid',
+            'vendor',
+            'tier',
+            'tier_valid_until',
+            'status',
+            'prefix',
+            'member_banned',
+            'integrations__uid',
+            'integrations__integration',
+            'integrations__enabled',
+            'integrations__post_format',
+        )
+    )
+    if not rows:
+        return None, False
+
+    row = rows[0]
+    server = domain.Server(
+        uid=row['uid'],
+        vendor_uid=row['vendor_uid'],
+        vendor=row['vendor'],
+        tier=row['tier'],
+        tier_valid_until=row['tier_valid_until'],
+        status=row['status'],
+        prefix=row['prefix'],
+        integrations={
+            row['integrations__integration']: domain.Integration(
+                uid=row['integrations__uid'],
+                integration=row['integrations__integration'],
+                enabled=row['integrations__enabled'],
+                post_format=row['integrations__post_format'],
+            )
+            for row in rows
+            if row['integrations__integration'] is not None
+        },
+        _internal_id=row['pk'],
+    )
+
+    return server, row['member_banned'] is True
+
+
 def change_server_member_banned_status(
     server_vendor: constants.ServerVendor,
     server_uid: str,
@@ -317,8 +497,56 @@ def change_server_member_banned_status(
             banned=banned,
         )
 
-    cache.set(
+    # Delete instead of set, so the in-process caches of other processes are invalidated too
+    cache.delete(
         store=cache.Store.SERVER_USER_BANNED,
         key=f'{server_vendor.value}_{server_uid}_{member_uid}',
-        value=banned,
     )
+
+
+# Async API
+# Django connections are per thread, so a small dedicated pool bounds the number of concurrent connections
+# and keeps blocking DB round trips off the event loop.
+_DEFAULT_DB_THREAD_POOL_SIZE = 4
+_executor: typing.Optional[futures.ThreadPoolExecutor] = None
+
+_T = typing.TypeVar('_T')
+
+
+def _get_executor() -> futures.ThreadPoolExecutor:
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        _executor = futures.ThreadPoolExecutor(
+            max_workers=getattr(settings, 'DB_THREAD_POOL_SIZE', _DEFAULT_DB_THREAD_POOL_SIZE),
+            thread_name_prefix='db',
+        )
+    return _executor
+
+
+def _in_db_thread(func: typing.Callable[..., _T]) -> typing.Callable[..., typing.Awaitable[_T]]:
+    def run(*args: typing.Any, **kwargs: typing.Any) -> _T:
+        # Pool threads outlive requests, drop connections that expired in the meantime
+        django_db.close_old_connections()
+        return func(*args, **kwargs)
+
+    @functools.wraps(func)
+    async def wrapper(*args: typing.Any, **kwargs: typing.Any) -> _T:
+        return await asyncio.get_running_loop().run_in_executor(
+            _get_executor(),
+            functools.partial(run, *args, **kwargs),
+        )
+
+    return wrapper
+
+
+acreate_server = _in_db_thread(create_server)
+aget_number_of_posts_in_server = _in_db_thread(get_number_of_posts_in_server)
+aget_authorization_state = _in_db_thread(get_authorization_state)
+aupdate_post_format = _in_db_thread(update_post_format)
+aget_post_format = _in_db_thread(get_post_format)
+aget_server = _in_db_thread(get_server)
+aget_post = _in_db_thread(get_post)
+asave_post = _in_db_thread(save_post)
+asave_server_post = _in_db_thread(save_server_post)
+ais_member_banned_from_server = _in_db_thread(is_member_banned_from_server)
+achange_server_member_banned_status = _in_db_thread(change_server_member_banned_status)
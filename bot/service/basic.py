@@ -1,15 +1,22 @@
 # pylint: disable=unused-argument
+import functools
 import typing
 
 from bot import constants
 from bot import domain
 from bot import exceptions
 from bot import logger
+from bot.common import media
+from bot.common import singleflight
 from bot.domain import post_format
+from bot.integrations import base
 from bot.integrations import registry
 
 
 class Service:
+    def __init__(self) -> None:
+        self._in_flight: singleflight.SingleFlight[domain.Post] = singleflight.SingleFlight()
+
     def should_handle_url(self, url: str) -> bool:
         return registry.should_handle(url)
 
@@ -43,19 +50,29 @@ class Service:
         server_vendor: constants.ServerVendor,
         server_uid: str,
         author_uid: str,
+        upload_limit: typing.Optional[int] = None,
     ) -> typing.Optional[domain.Post]:
         try:
-            client = registry.get_instance(url)
+            route = await registry.resolve(url)
         except ValueError as e:
             logger.warning('No strategy for url', url=url, error=str(e))
             return None
 
-        if not client:
+        if not route:
             logger.warning('Integration for url not enabled or client init failure', url=url)
             return None
 
+        client, integration, integration_uid, integration_index = route
+
         try:
-            post = await client.get_post(url)
+            with media.upload_limit_scope(upload_limit):
+                post = await self._fetch_post(
+                    client=client,
+                    url=url,
+                    integration=integration,
+                    integration_uid=integration_uid,
+                    integration_index=integration_index,
+                )
         except Exception:
             logger.exception('Error getting post', url=url)
             return None
@@ -69,6 +86,43 @@ class Service:
 
         return post
 
+    async def _fetch_post(
+        self,
+        client: base.BaseClient,
+        url: str,
+        integration: constants.Integration,
+        integration_uid: str,
+        integration_index: typing.Optional[int],
+    ) -> domain.Post:
+        """
+        Fetches post from 3rd party, concurrent requests for the same post share a single fetch.
+        The media variant is picked by the upload limit, so only requests with the same limit share it.
+        """
+        post, shared = await self._in_flight.do(
+            key=(integration, integration_uid, integration_index, media.upload_limit.get()),
+            func=functools.partial(client.get_post, url),
+        )
+        if not shared:
+            return post
+
+        logger.info(
+            'Coalesced post fetch',
+            url=url,
+            integration=integration.value,
+            integration_uid=integration_uid,
+            executed_total=self._in_flight.stats.executed,
+            coalesced_total=self._in_flight.stats.coalesced,
+        )
+        return post.clone(url=url)
+
+    def log_stats(self) -> None:
+        logger.info(
+            'Post fetch stats',
+            in_flight=self._in_flight.in_flight(),
+            executed_total=self._in_flight.stats.executed,
+            coalesced_total=self._in_flight.stats.coalesced,
+        )
+
     async def get_comments(
         self,
         url: str,
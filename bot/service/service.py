@@ -1,4 +1,3 @@
-import datetime
 import typing
 
 from bot import cache
@@ -8,6 +7,8 @@ from bot import exceptions
 from bot import logger
 from bot import models
 from bot import repository
+from bot.common import media
+from bot.common import transcoding
 from bot.domain import post_format
 from bot.integrations import registry
 from bot.service import basic
@@ -57,66 +58,31 @@ class Service(basic.Service):
         server_vendor: constants.ServerVendor,
         server_uid: str,
         author_uid: str,
+        upload_limit: typing.Optional[int] = None,
     ) -> typing.Optional[domain.Post]:
         try:
-            client = registry.get_instance(url)
+            route = await registry.resolve(url)
         except ValueError as e:
             logger.warning('No strategy for url', url=url, error=str(e))
             return None
 
-        if not client:
+        if not route:
             logger.warning('Integration for url not enabled or client init failure', url=url)
             return None
 
-        integration, integration_uid, integration_index = await client.get_integration_data(url=url)
-
-        # Check if server is throttled and allowed to post
-        server = repository.get_server(
-            vendor=server_vendor,
-            vendor_uid=server_uid,
-        )
-        if not server:
-            logger.info(
-                'Server not configured, creating a default config',
-                server_vendor_uid=server_uid,
-                server_vendor=server_vendor.value,
-            )
-            server = repository.create_server(vendor=server_vendor, vendor_uid=server_uid)
-
-        if not server._internal_id:
-            logger.error('Internal id for server not set')
-            raise exceptions.BotError('Internal server error')
-
-        num_posts_in_server = repository.get_number_of_posts_in_server_from_datetime(
-            server_id=server._internal_id,
-            from_datetime=datetime.datetime.now() - datetime.timedelta(days=1),
-        )
+        client, integration, integration_uid, integration_index = route
 
-        if not server.can_post(num_posts_in_one_day=num_posts_in_server, integration=integration):
-            logger.warning(
-                'Server is not allowed to post',
-                server_vendor=server_vendor.value,
-                server_vendor_uid=server_uid,
-                server_tier=server.tier.name,
-            )
-            raise exceptions.NotAllowedError('Upgrade your tier')
-
-        # Check if user is banned
-        if repository.is_member_banned_from_server(
+        server = await self._authorize(
             server_vendor=server_vendor,
             server_uid=server_uid,
-            member_uid=author_uid,
-        ):
-            logger.warning(
-                'User banned from server',
-                user=author_uid,
-                server_vendor=server_vendor.value,
-                server_vendor_uid=server_uid,
-            )
-            raise exceptions.NotAllowedError('User banned')
+            author_uid=author_uid,
+            integration=integration,
+        )
+        # Applies to the rest of the request, including media fitted by the adapter after the post is returned
+        transcoding.priority.set(server.tier.value)
 
         # Check if post stored in DB already
-        post = repository.get_post(
+        post = await repository.aget_post(
             url=url,
             integration=integration,
             integration_uid=integration_uid,
@@ -125,7 +91,14 @@ class Service(basic.Service):
         # Else fetch it from 3rd party
         if not post:
             try:
-                post = await client.get_post(url)
+                with media.upload_limit_scope(upload_limit):
+                    post = await self._fetch_post(
+                        client=client,
+                        url=url,
+                        integration=integration,
+                        integration_uid=integration_uid,
+                        integration_index=integration_index,
+                    )
             except Exception as e:
                 logger.error('Failed downloading', url=url, error=str(e))
                 raise e
@@ -140,7 +113,7 @@ class Service(basic.Service):
             )
         )
 
-        repository.save_server_post(
+        await repository.asave_server_post(
             server_vendor=server_vendor,
             server_uid=server_uid,
             author_uid=author_uid,
@@ -174,29 +147,50 @@ class Service(basic.Service):
             logger.warning('Integration for url not enabled or client init failure', url=url)
             return None
 
-        # Check if server is throttled and allowed to post
-        server = repository.get_server(
-            vendor=server_vendor,
-            vendor_uid=server_uid,
+        await self._authorize(
+            server_vendor=server_vendor,
+            server_uid=server_uid,
+            author_uid=author_uid,
+            integration=client.INTEGRATION,
+        )
+
+        try:
+            return await client.get_comments(url=url, n=n)
+        except Exception as e:
+            logger.error('Failed downloading', url=url, num_comments=n, error=str(e))
+            raise e
+
+    async def _authorize(
+        self,
+        server_vendor: constants.ServerVendor,
+        server_uid: str,
+        author_uid: str,
+        integration: constants.Integration,
+    ) -> domain.Server:
+        """
+        Returns the server, raises NotAllowedError if the member is not allowed to post the integration in it.
+        """
+        state = await repository.aget_authorization_state(
+            server_vendor=server_vendor,
+            server_uid=server_uid,
+            member_uid=author_uid,
         )
+
+        server = state.server
         if not server:
             logger.info(
                 'Server not configured, creating a default config',
                 server_vendor_uid=server_uid,
                 server_vendor=server_vendor.value,
             )
-            server = repository.create_server(vendor=server_vendor, vendor_uid=server_uid)
+            server = await repository.acreate_server(vendor=server_vendor, vendor_uid=server_uid)
 
         if not server._internal_id:
             logger.error('Internal id for server not set')
             raise exceptions.BotError('Internal server error')
 
-        num_posts_in_server = repository.get_number_of_posts_in_server_from_datetime(
-            server_id=server._internal_id,
-            from_datetime=datetime.datetime.now() - datetime.timedelta(days=1),
-        )
-
-        if not server.can_post(num_posts_in_one_day=num_posts_in_server, integration=client.INTEGRATION):
+        # Check if server is throttled and allowed to post
+        if not server.can_post(num_posts_in_one_day=state.num_posts_in_server, integration=integration):
             logger.warning(
                 'Server is not allowed to post',
                 server_vendor=server_vendor.value,
@@ -206,11 +200,7 @@ class Service(basic.Service):
             raise exceptions.NotAllowedError('Upgrade your tier')
 
         # Check if user is banned
-        if repository.is_member_banned_from_server(
-            server_vendor=server_vendor,
-            server_uid=server_uid,
-            member_uid=author_uid,
-        ):
+        if state.member_banned:
             logger.warning(
                 'User banned from server',
                 user=author_uid,
@@ -219,11 +209,7 @@ class Service(basic.Service):
             )
             raise exceptions.NotAllowedError('User banned')
 
-        try:
-            return await client.get_comments(url=url, n=n)
-        except Exception as e:
-            logger.error('Failed downloading', url=url, num_comments=n, error=str(e))
-            raise e
+        return server
 
     def provision_server(
         self,
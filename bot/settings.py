@@ -83,6 +83,43 @@ DATABASES = {
     }
 }
 
+# Number of threads (and DB connections) used to run queries off the bot's event loop
+DB_THREAD_POOL_SIZE = int(os.environ.get('DB_THREAD_POOL_SIZE', '4'))
+
+# Number of processes for CPU heavy image processing (combining, resizing), 0 runs it on the event loop
+IMAGE_PROCESS_POOL_SIZE = int(os.environ.get('IMAGE_PROCESS_POOL_SIZE', '2'))
+
+# Number of yt-dlp worker processes, bounds concurrent stream downloads. Workers are replaced after
+# a number of downloads or once their peak memory reaches the limit (bytes)
+STREAM_DOWNLOAD_POOL_SIZE = int(os.environ.get('STREAM_DOWNLOAD_POOL_SIZE', '2'))
+STREAM_WORKER_MAX_JOBS = int(os.environ.get('STREAM_WORKER_MAX_JOBS', '100'))
+STREAM_WORKER_MAX_RSS = int(os.environ.get('STREAM_WORKER_MAX_RSS', 512 * 1024 * 1024))
+
+# How often (in seconds) the bot logs cache, transcoding and post fetch stats while running
+STATS_LOG_INTERVAL = int(os.environ.get('STATS_LOG_INTERVAL', '900'))
+
+# Maximum number of concurrent ffmpeg jobs and the time (in seconds) a single job may run
+TRANSCODING = {
+    'max_jobs': int(os.environ.get('TRANSCODING_MAX_JOBS', '2')),
+    'timeout': int(os.environ.get('TRANSCODING_TIMEOUT', 5 * 60)),
+}
+
+# Content addressed storage for cached post media, post rows only reference the blob hash
+BLOB_STORE = {
+    'backend': os.environ.get('BLOB_STORE_BACKEND', 'local'),
+    'path': os.environ.get('BLOB_STORE_PATH', str(BASE_DIR / 'blobs')),
+}
+if BLOB_STORE['backend'] == 's3':
+    BLOB_STORE = {
+        'backend': 's3',
+        'endpoint_url': os.environ['BLOB_STORE_ENDPOINT_URL'],
+        'bucket': os.environ['BLOB_STORE_BUCKET'],
+        'access_key': os.environ['BLOB_STORE_ACCESS_KEY'],
+        'secret_key': os.environ['BLOB_STORE_SECRET_KEY'],
+        'region': os.environ.get('BLOB_STORE_REGION', 'us-east-1'),
+        'prefix': os.environ.get('BLOB_STORE_PREFIX', ''),
+    }
+
 
 # Caches
 # https://docs.djangoproject.com/en/5.0/ref/settings/#caches
@@ -94,6 +131,23 @@ CACHES = {
     }
 }
 
+# Bounded in-process cache in front of the cache above for hot, rarely changing data (servers, post formats),
+# disabled with the dummy and local memory backends
+L1_CACHE = {
+    'max_entries': int(os.environ.get('L1_CACHE_MAX_ENTRIES', '4096')),
+    'ttl': int(os.environ.get('L1_CACHE_TTL', '60')),
+}
+
+# Sliding window of posts per server, 'cache' shares counters through the cache above, 'memory' keeps them in process
+RATE_LIMIT = {
+    'backend': os.environ.get(
+        'RATE_LIMIT_BACKEND',
+        'memory' if CACHES['default']['BACKEND'].endswith('DummyCache') else 'cache',
+    ),
+    'window': int(os.environ.get('RATE_LIMIT_WINDOW', 60 * 60 * 24)),
+    'buckets': int(os.environ.get('RATE_LIMIT_BUCKETS', '24')),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -10,6 +10,8 @@ Each integration has its own configuration.
 All of them are disabled by default and need to be enabled.
 You can enable them by setting the 'enabled' key to True.
 You can also set a custom post_format for each integration.
+Each integration keeps a pooled http session, which can be tuned with the 'http' key, e.g.:
+    'http': {'limit_per_host': 10, 'dns_cache_ttl': 300, 'connect_timeout': 10.0, 'read_timeout': 60.0}
 """
 INTEGRATION_CONFIGURATION = {
     'tiktok': {
@@ -47,6 +49,8 @@ INTEGRATION_CONFIGURATION = {
         'username': None,
         'email': None,
         'password': None,
+        'accounts': [],  # More accounts to spread requests over: [{'username', 'email', 'password'}]
+        'hedge_delay': 2.0,  # Race the syndication endpoint after this many seconds, None to disable
     },
     'twitch': {
         'enabled': False,
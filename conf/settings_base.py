@@ -83,6 +83,35 @@ DATABASES = {
     }
 }
 
+# Number of threads (and DB connections) used to run queries off the bot's event loop
+DB_THREAD_POOL_SIZE = 4
+
+# Number of processes for CPU heavy image processing (combining, resizing), 0 runs it on the event loop
+IMAGE_PROCESS_POOL_SIZE = 2
+
+# Number of yt-dlp worker processes, bounds concurrent stream downloads. Workers are replaced after
+# a number of downloads or once their peak memory reaches the limit (bytes)
+STREAM_DOWNLOAD_POOL_SIZE = 2
+STREAM_WORKER_MAX_JOBS = 100
+STREAM_WORKER_MAX_RSS = 512 * 1024 * 1024
+
+# How often (in seconds) the bot logs cache, transcoding and post fetch stats while running
+STATS_LOG_INTERVAL = 15 * 60
+
+# Maximum number of concurrent ffmpeg jobs and the time (in seconds) a single job may run
+TRANSCODING = {
+    'max_jobs': 2,
+    'timeout': 5 * 60,
+}
+
+# Content addressed storage for cached post media, post rows only reference the blob hash
+# 'local' keeps blobs under 'path', 's3' works with any S3 compatible storage, e.g.:
+#   {'backend': 's3', 'endpoint_url': 'http://127.0.0.1:9000', 'bucket': 'blobs', 'access_key': ..., 'secret_key': ...}
+BLOB_STORE = {
+    'backend': 'local',
+    'path': BASE_DIR / 'blobs',
+}
+
 
 # Caches
 # https://docs.djangoproject.com/en/5.0/ref/settings/#caches
@@ -96,6 +125,20 @@ CACHES = {
     }
 }
 
+# Bounded in-process cache in front of the cache above for hot, rarely changing data (servers, post formats),
+# disabled with the dummy and local memory backends
+L1_CACHE = {
+    'max_entries': 4096,
+    'ttl': 60,
+}
+
+# Sliding window of posts per server, 'cache' shares counters through the cache above, 'memory' keeps them in process
+RATE_LIMIT = {
+    'backend': 'cache',
+    'window': 60 * 60 * 24,
+    'buckets': 24,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
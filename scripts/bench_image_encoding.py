@@ -0,0 +1,131 @@
+"""
+Encode time and output size of a combined gallery per format: the previous PNG (optimize=True) output,
+plain PNG, JPEG, WebP and the size-aware encoder (auto) at a few upload limits.
+
+Usage: PYTHONPATH=. python scripts/bench_image_encoding.py [--size 1200x1600] [--repeat 3]
+"""
+
+import argparse
+import io
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings_test')
+django.setup()
+
+from PIL import Image as pil_image  # noqa: E402
+from PIL import ImageDraw as pil_image_draw  # noqa: E402
+from PIL import ImageFilter as pil_image_filter  # noqa: E402
+
+from bot.common import utils  # noqa: E402
+
+MIB = 1024 * 1024
+
+
+def photo(width: int, height: int, seed: int) -> pil_image.Image:
+    # Smooth gradients with blurred noise and grain, compresses about like a phone photo
+    base = pil_image.merge(
+        'RGB',
+        [
+            pil_image.linear_gradient('L').resize((width, height)),
+            pil_image.radial_gradient('L').resize((width, height)),
+            pil_image.linear_gradient('L').rotate(90 * seed).resize((width, height)),
+        ],
+    )
+    detail = pil_image.frombytes('RGB', (width // 8, height // 8), os.urandom(width * height * 3 // 64))
+    detail = detail.resize((width, height), pil_image.Resampling.BICUBIC).filter(pil_image_filter.GaussianBlur(2))
+    grain = pil_image.frombytes('RGB', (width, height), os.urandom(width * height * 3))
+    return pil_image.blend(pil_image.blend(base, detail, 0.5), grain, 0.08)
+
+
+def line_art(width: int, height: int, seed: int) -> pil_image.Image:
+    image = pil_image.new('RGB', (width, height), 'white')
+    draw = pil_image_draw.Draw(image)
+    for i in range(60):
+        x, y = (i * 97 + seed * 31) % width, (i * 53 + seed * 17) % height
+        draw.rectangle((x, y, x + 120, y + 80), outline='black', width=3)
+        draw.text((x + 10, y + 10), f'panel {i}', fill='black')
+    return image
+
+
+def transparent(width: int, height: int, seed: int) -> pil_image.Image:
+    image = pil_image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = pil_image_draw.Draw(image)
+    for i in range(30):
+        x, y = (i * 71 + seed * 13) % width, (i * 43 + seed * 7) % height
+        draw.ellipse((x, y, x + 150, y + 150), fill=(200, 40 + i * 5, 90, 255))
+    return image
+
+
+def to_bytes(image: pil_image.Image) -> bytes:
+    buffer = io.BytesIO()
+    if image.mode == 'RGBA':
+        image.save(buffer, format='PNG')
+    else:
+        image.save(buffer, format='JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def canvas(sources: list[bytes]) -> pil_image.Image:
+    images = [pil_image.open(io.BytesIO(source)) for source in sources]
+    widths, heights = zip(*(im.size for im in images))
+    new_image = pil_image.new('RGBA', (sum(widths) + 10 * (len(images) - 1), max(heights)))
+    offset = 0
+    for image in images:
+        new_image.paste(image, (offset, 0))
+        offset += image.size[0] + 10
+    return new_image
+
+
+def measure(func, repeat: int) -> tuple[float, int]:
+    best = float('inf')
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(func())
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def png_optimize(image: pil_image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=str, default='1200x1600')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    width, height = (int(x) for x in args.size.split('x'))
+
+    galleries = {
+        'photos': [to_bytes(photo(width, height, seed)) for seed in range(3)],
+        'line art': [to_bytes(line_art(width, height, seed)) for seed in range(3)],
+        'transparent': [to_bytes(transparent(width, height, seed)) for seed in range(3)],
+    }
+
+    print(f'{"gallery":<12} {"format":<18} {"time":>10} {"size":>12}')
+    for name, sources in galleries.items():
+        image = canvas(sources)
+        variants = {
+            'png optimize': lambda image=image: png_optimize(image),
+            'png': lambda image=image: utils._save_image(image, 'PNG'),
+            'jpeg q85': lambda image=image: utils._save_image(image, 'JPEG', 85),
+            'webp q85': lambda image=image: utils._save_image(image, 'WEBP', 85),
+        }
+        for limit in (10 * MIB, 2 * MIB, 512 * 1024):
+            variants[f'auto {limit // 1024} KiB'] = lambda sources=sources, limit=limit: utils._combine_images(
+                sources, 10, 85, limit
+            )
+
+        for variant, func in variants.items():
+            elapsed, size = measure(func, args.repeat)
+            print(f'{name:<12} {variant:<18} {elapsed * 1000:>7.1f} ms {size / 1024:>8.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Load test of image processing: event loop lag and throughput while galleries are combined and images resized,
+inline on the event loop vs in the image process pool.
+
+Usage: PYTHONPATH=. python scripts/bench_images.py [--jobs 12] [--size 1200x1600] [--pool-size 2]
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings_test')
+django.setup()
+
+from PIL import Image as pil_image  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from bot.common import utils  # noqa: E402
+
+TICK = 0.005
+
+
+def make_image(width: int, height: int, seed: int) -> bytes:
+    # Noise on a gradient, compresses about as badly as a photo
+    image = pil_image.linear_gradient('L').resize((width, height)).convert('RGB')
+    noise = pil_image.frombytes('RGB', (width, height), os.urandom(width * height * 3))
+    image = pil_image.blend(image, noise, alpha=0.3 + (seed % 3) * 0.1)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+async def measure_lag(stop: asyncio.Event) -> list[float]:
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+    return lags
+
+
+async def job(images: list[bytes], index: int) -> None:
+    if index % 2:
+        await utils.resize_image(io.BytesIO(images[0]))
+    else:
+        await utils.combine_images([io.BytesIO(image) for image in images])
+
+
+async def run(name: str, jobs: int, images: list[bytes]) -> None:
+    # Warm up, so the pool start up is not measured
+    await job(images, 1)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+    await asyncio.sleep(TICK * 10)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[job(images, i) for i in range(jobs)])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    lags = sorted(await lag_task)
+    p99 = lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[0]
+    print(
+        f'{name:<10} {jobs / elapsed:>7.2f} jobs/s  '
+        f'loop lag median {statistics.median(lags) * 1000:>8.2f} ms  '
+        f'p99 {p99 * 1000:>8.2f} ms  max {lags[-1] * 1000:>8.2f} ms  ({len(lags)} ticks)'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=12)
+    parser.add_argument('--size', type=str, default='1200x1600')
+    parser.add_argument('--pool-size', type=int, default=2)
+    args = parser.parse_args()
+
+    width, height = (int(x) for x in args.size.split('x'))
+    images = [make_image(width, height, seed) for seed in range(3)]
+
+    settings.IMAGE_PROCESS_POOL_SIZE = 0
+    asyncio.run(run('inline', args.jobs, images))
+
+    settings.IMAGE_PROCESS_POOL_SIZE = args.pool_size
+    asyncio.run(run(f'pool({args.pool_size})', args.jobs, images))
+    utils._get_image_executor().shutdown()  # pylint: disable=protected-access
+
+
+if __name__ == '__main__':
+    main()
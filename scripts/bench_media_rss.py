@@ -0,0 +1,103 @@
+"""
+Peak RSS of handing one downloaded video from an integration to the upload: the previous copies (yt-dlp file read
+into BytesIO, Post.clone through read_buffer, the blob read into memory for the DB, the buffer read again to write
+the ffmpeg input) against file backed buffers, which are shared, stored and passed to ffmpeg by path.
+Each pipeline runs in a fresh process, so peaks don't carry over.
+
+Usage: PYTHONPATH=. python scripts/bench_media_rss.py [--size-mib 64] [--clones 2]
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings_test')
+django.setup()
+
+from bot import domain  # noqa: E402
+from bot.common import blob_store  # noqa: E402
+from bot.common import media  # noqa: E402
+
+MIB = 1024 * 1024
+
+
+def peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_download(tmp_dir: str, size: int) -> str:
+    # Stands in for the file yt-dlp leaves behind
+    path = os.path.join(tmp_dir, 'download.mp4')
+    with open(path, 'wb') as f:
+        for _ in range(size // MIB):
+            f.write(os.urandom(MIB))
+    return path
+
+
+def ffmpeg_input(buffer: io.BufferedIOBase, tmp_dir: str) -> str:
+    path = os.path.join(tmp_dir, 'input.mp4')
+    buffer.seek(0)
+    with open(path, 'wb') as f:
+        f.write(buffer.read())
+    buffer.seek(0)
+    return path
+
+
+def before(path: str, tmp_dir: str, clones: int) -> None:
+    with open(path, 'rb') as f:
+        post = domain.Post(url='https://example.com', buffer=io.BytesIO(f.read()))
+
+    shared = [domain.Post(url=post.url, buffer=io.BytesIO(post.read_buffer())) for _ in range(clones)]
+    blob = post.read_buffer()  # Stored in a BinaryField
+    for p in [post] + shared:
+        ffmpeg_input(p.buffer, tmp_dir)
+    del blob
+
+
+def after(path: str, tmp_dir: str, clones: int) -> None:
+    post = domain.Post(url='https://example.com', buffer=media.FileBuffer(path))
+
+    shared = [post.clone() for _ in range(clones)]
+    store = blob_store.LocalBlobStore(blob_store.LocalConfig(path=os.path.join(tmp_dir, 'blobs')))
+    store.put(post.buffer)
+    for p in [post] + shared:
+        media.file_path(p.buffer) or ffmpeg_input(p.buffer, tmp_dir)
+
+
+def run(name: str, size: int, clones: int, queue: multiprocessing.Queue) -> None:
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = write_download(tmp_dir, size)
+        start = peak_rss_mib()
+        {'before': before, 'after': after}[name](path, tmp_dir, clones)
+        queue.put((name, start, peak_rss_mib()))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mib', type=int, default=64)
+    parser.add_argument('--clones', type=int, default=2, help='Concurrent requests sharing the post')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    print(f'{args.size_mib} MiB video, {args.clones} shared copies')
+    print(f'{"pipeline":<10}{"rss before (MiB)":>18}{"peak rss (MiB)":>16}{"added (MiB)":>14}')
+    for name in ('before', 'after'):
+        process = ctx.Process(target=run, args=(name, args.size_mib * MIB, args.clones, queue))
+        process.start()
+        name, start, peak = queue.get()
+        process.join()
+        print(f'{name:<10}{start:>18.1f}{peak:>16.1f}{peak - start:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
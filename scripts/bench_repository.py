@@ -0,0 +1,129 @@
+"""
+Load test of the repository: event loop lag while many posts go through the DB path of Service.get_post,
+with blocking repository calls vs the async (thread pool) API.
+
+Usage: PYTHONPATH=. python scripts/bench_repository.py [--posts 200] [--blob-size 524288]
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings_test')
+# Same as manage.py, the blocking variant calls the ORM from the event loop
+os.environ.setdefault('DJANGO_ALLOW_ASYNC_UNSAFE', 'true')
+
+from django.conf import settings  # noqa: E402
+
+_DB_FILE = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+settings.DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _DB_FILE,
+        'OPTIONS': {'timeout': 60},
+    }
+}
+django.setup()
+
+from django.core import management  # noqa: E402
+
+from bot import constants  # noqa: E402
+from bot import domain  # noqa: E402
+from bot import repository  # noqa: E402
+
+TICK = 0.005
+SERVER_UID = 'bench'
+VENDOR = constants.ServerVendor.DISCORD
+
+
+async def measure_lag(stop: asyncio.Event) -> list[float]:
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+    return lags
+
+
+async def process_sync(post: domain.Post, uid: str) -> None:
+    repository.get_server(vendor=VENDOR, vendor_uid=SERVER_UID)
+    repository.get_number_of_posts_in_server(vendor=VENDOR, vendor_uid=SERVER_UID)
+    repository.is_member_banned_from_server(server_vendor=VENDOR, server_uid=SERVER_UID, member_uid='user')
+    repository.get_post(url=post.url, integration=constants.Integration.TIKTOK, integration_uid=uid)
+    await asyncio.sleep(0)  # Upstream fetch would happen here
+    repository.save_server_post(
+        server_vendor=VENDOR,
+        server_uid=SERVER_UID,
+        author_uid='user',
+        post=post,
+        integration=constants.Integration.TIKTOK,
+        integration_uid=uid,
+    )
+
+
+async def process_async(post: domain.Post, uid: str) -> None:
+    await repository.aget_authorization_state(server_vendor=VENDOR, server_uid=SERVER_UID, member_uid='user')
+    await repository.aget_post(url=post.url, integration=constants.Integration.TIKTOK, integration_uid=uid)
+    await asyncio.sleep(0)
+    await repository.asave_server_post(
+        server_vendor=VENDOR,
+        server_uid=SERVER_UID,
+        author_uid='user',
+        post=post,
+        integration=constants.Integration.TIKTOK,
+        integration_uid=uid,
+    )
+
+
+async def run(name: str, process, posts: int, blob: bytes) -> None:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+    await asyncio.sleep(TICK * 10)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[
+            process(
+                domain.Post(url=f'https://example.com/{i}', buffer=io.BytesIO(blob)),
+                uuid.uuid4().hex,
+            )
+            for i in range(posts)
+        ]
+    )
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    lags = sorted(await lag_task)
+    p99 = lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[0]
+    print(
+        f'{name:<10} {posts / elapsed:>8.1f} posts/s  '
+        f'loop lag median {statistics.median(lags) * 1000:>7.2f} ms  '
+        f'p99 {p99 * 1000:>7.2f} ms  max {lags[-1] * 1000:>7.2f} ms  ({len(lags)} ticks)'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=200)
+    parser.add_argument('--blob-size', type=int, default=512 * 1024)
+    args = parser.parse_args()
+
+    management.call_command('migrate', verbosity=0)
+    repository.create_server(vendor_uid=SERVER_UID, vendor=VENDOR)
+    blob = os.urandom(args.blob_size)
+
+    asyncio.run(run('blocking', process_sync, args.posts, blob))
+    asyncio.run(run('async', process_async, args.posts, blob))
+
+    os.remove(_DB_FILE)
+
+
+if __name__ == '__main__':
+    main()
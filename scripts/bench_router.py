@@ -0,0 +1,117 @@
+"""
+Micro-benchmark of url routing: legacy linear walk over registry.CLASSES vs the compiled router.
+
+Usage: PYTHONPATH=. python scripts/bench_router.py [--urls 5000] [--rounds 5]
+"""
+
+import argparse
+import os
+import random
+import string
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings_base_standalone')
+django.setup()
+
+from bot.integrations import registry  # noqa: E402
+
+MATCHING_TEMPLATES = [
+    'https://bsky.app/profile/{name}.bsky.social/post/{id}',
+    'https://www.facebook.com/watch?v={num}',
+    'https://fb.watch/{id}/',
+    'https://boards.4chan.org/g/thread/{num}',
+    'https://www.instagram.com/p/{id}/',
+    'https://www.instagram.com/reel/{id}/?igsh={id}',
+    'https://www.linkedin.com/posts/{name}_{id}-activity-{num}-{id}',
+    'https://9gag.com/gag/{id}',
+    'https://www.reddit.com/r/{name}/comments/{id}/{name}/',
+    'https://www.reddit.com/r/{name}/s/{id}',
+    'https://www.threads.net/@{name}/post/{id}',
+    'https://www.tiktok.com/@{name}/video/{num}',
+    'https://vm.tiktok.com/{id}/',
+    'https://truthsocial.com/@{name}/posts/{num}',
+    'https://www.24ur.com/novice/slovenija/{name}.html',
+    'https://www.twitch.tv/{name}/clip/{id}',
+    'https://x.com/{name}/status/{num}',
+    'https://twitter.com/{name}/status/{num}/photo/2',
+    'https://www.youtube.com/shorts/{id}',
+]
+
+NON_MATCHING_TEMPLATES = [
+    'https://i.redd.it/{id}.jpg',
+    'https://v.redd.it/{id}',
+    'https://www.reddit.com/r/{name}/',
+    'https://x.com/{name}',
+    'https://www.twitch.tv/{name}',
+    'https://www.youtube.com/watch?v={id}',
+    'https://github.com/{name}/{name}/pull/{num}',
+    'https://en.wikipedia.org/wiki/{name}',
+    'https://docs.python.org/3/library/{name}.html',
+    'https://www.google.com/search?q={name}',
+    'https://news.ycombinator.com/item?id={num}',
+    'https://tenor.com/view/{name}-{num}',
+]
+
+
+def _random_token(length: int) -> str:
+    return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+
+
+def build_corpus(size: int, matching_ratio: float) -> list[str]:
+    corpus = []
+    for _ in range(size):
+        templates = MATCHING_TEMPLATES if random.random() < matching_ratio else NON_MATCHING_TEMPLATES
+        corpus.append(
+            random.choice(templates).format(
+                name=_random_token(8).lower(),
+                id=_random_token(11),
+                num=random.randint(10**9, 10**19),
+            )
+        )
+    return corpus
+
+
+def legacy_match(url: str):
+    for klass in registry.CLASSES:
+        if klass.should_handle(url):
+            return klass
+    return None
+
+
+def bench(name: str, func, corpus: list[str], rounds: int) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for url in corpus:
+            func(url)
+        best = min(best, time.perf_counter() - start)
+
+    print(f'{name:<24} {len(corpus) / best:>14,.0f} urls/s  {best / len(corpus) * 1e6:>8.2f} us/url')
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--urls', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--matching-ratio', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    corpus = build_corpus(size=args.urls, matching_ratio=args.matching_ratio)
+
+    mismatches = [url for url in corpus if legacy_match(url) is not registry.ROUTER.match(url)]
+    print(f'corpus: {len(corpus)} urls, router disagrees with legacy walk on {len(mismatches)}')
+    for url in mismatches[:10]:
+        print(f'  {url}: legacy={legacy_match(url)} router={registry.ROUTER.match(url)}')
+
+    legacy = bench('legacy linear walk', legacy_match, corpus, args.rounds)
+    compiled = bench('router', registry.ROUTER.match, corpus, args.rounds)
+    print(f'speedup: {legacy / compiled:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Median and p95 latency per TikTok: the previous two yt-dlp processes (--dump-json, then the download) against
+a single extraction and download in a warm yt-dlp worker process.
+
+Without urls a local file is served over http and downloaded with the generic extractor, which measures
+the process start-up and extraction overhead only (no TikTok page fetches or signatures).
+
+Usage: PYTHONPATH=. python scripts/bench_tiktok.py [--repeat 10] [url ...]
+"""
+
+import argparse
+import asyncio
+import functools
+import http.server
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings_test')
+django.setup()
+
+from bot.common import stream  # noqa: E402
+from bot.integrations.tiktok import client  # noqa: E402
+
+USER_AGENT = client.YT_DLP_PARAMS['http_headers']['User-Agent']
+
+
+async def run(*args: str) -> None:
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(stderr.decode(errors='ignore'))
+
+
+async def two_processes(url: str, params: dict) -> None:
+    await run('yt-dlp', url, '--user-agent', USER_AGENT, '--dump-json', '--no-playlist', '--quiet')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        await run(
+            'yt-dlp',
+            url,
+            '--user-agent',
+            USER_AGENT,
+            '-f',
+            params['format'],
+            '-o',
+            os.path.join(tmp_dir, 'video.mp4'),
+            '--no-playlist',
+            '--quiet',
+        )
+
+
+async def single_pass(url: str, params: dict) -> None:
+    _, buffer = await stream.download_with_info(url=url, params=params)
+    buffer.close()
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+
+class _QuietServer(http.server.ThreadingHTTPServer):
+    def handle_error(self, request, client_address) -> None:
+        # --dump-json closes the connection without reading the body
+        pass
+
+
+def serve_file(size: int) -> str:
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, 'video.mp4'), 'wb') as f:
+        f.write(os.urandom(size))
+
+    server = _QuietServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}/video.mp4'
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('urls', nargs='*')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    params = client.YT_DLP_PARAMS
+    urls = args.urls
+    if not urls:
+        urls = [serve_file(4 * 1024 * 1024)]
+        # The generic extractor knows no resolution or bitrate, any single file format works the same
+        params = {**params, 'format': 'best'}
+
+    print(f'{"mode":<16}{"median (ms)":>12}{"p95 (ms)":>10}')
+    for name, func in (('two processes', two_processes), ('single pass', single_pass)):
+        latencies = []
+        for _ in range(args.repeat):
+            for url in urls:
+                start = time.perf_counter()
+                await func(url, params)
+                latencies.append((time.perf_counter() - start) * 1000)
+        print(f'{name:<16}{statistics.median(latencies):>12.0f}{percentile(latencies, 0.95):>10.0f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
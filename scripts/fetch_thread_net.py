@@ -1,3 +1,4 @@
+import asyncio
 import json
 import sys
 
@@ -15,6 +16,14 @@ else:
     url = sys.argv[1]
     out_file = sys.argv[2]
 
+
+async def fetch_raw(url_id: str) -> dict:
+    try:
+        return await c._get_thread_raw(url_id=url_id, api_token=await c._get_threads_api_token())
+    finally:
+        await c.close()
+
+
 with open(out_file, '+w') as f:
     url_id = url.strip('/').split('?')[0].split('/')[-1]
-    f.write(json.dumps(c._get_thread_raw(url_id=url_id, api_token=c._get_threads_api_token()), indent=2))
+    f.write(json.dumps(asyncio.run(fetch_raw(url_id)), indent=2))
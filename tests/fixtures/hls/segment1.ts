@@ -0,0 +1 @@
+GGGG
\ No newline at end of file
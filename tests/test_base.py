@@ -0,0 +1,32 @@
+from aiohttp import test_utils
+from aiohttp import web
+from django import test
+
+from bot import constants
+from bot.integrations import base
+
+
+class _Client(base.BaseClient):
+    INTEGRATION = constants.Integration.REDDIT
+
+
+async def _image(request):
+    name = request.match_info['name']
+    if name == 'missing':
+        return web.Response(status=404, text='<html>Not Found</html>')
+    return web.Response(body=name.encode())
+
+
+class DownloadGalleryTest(test.SimpleTestCase):
+    async def test_error_responses_are_skipped(self):
+        app = web.Application()
+        app.router.add_get('/{name}.jpg', _image)
+        client = _Client()
+        async with test_utils.TestServer(app) as server:
+            urls = [str(server.make_url(f'/{name}.jpg')) for name in ('first', 'missing', 'second', 'third')]
+            try:
+                images = await client._download_gallery(urls=urls, max_images=3)
+            finally:
+                await client.close()
+
+        self.assertEqual([image.read() for image in images], [b'first', b'second', b'third'])
@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django import test
+from django.core.cache.backends import locmem
+
+from bot import cache
+
+
+class L1Test(test.SimpleTestCase):
+    def setUp(self):
+        # A cache shared by both "processes", each with its own L1
+        self.shared = locmem.LocMemCache('l1-test', {})
+        self.shared.clear()
+        patcher = mock.patch.object(cache.cache, 'cache', self.shared)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(cache, '_EPOCH_CHECK_INTERVAL', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_delete_invalidates_other_processes(self):
+        first = cache._LRU(max_entries=16, ttl=60)
+        second = cache._LRU(max_entries=16, ttl=60)
+        for l1 in (first, second):
+            l1.set(key='server_1', value={'name': 'old'}, timeout=60)
+            self.assertEqual(l1.get(key='server_1'), {'name': 'old'})
+
+        first.delete(key='server_1')
+
+        self.assertEqual(first.get(key='server_1'), cache.NO_HIT)
+        self.assertEqual(second.get(key='server_1'), cache.NO_HIT)
+
+    def test_values_are_copied(self):
+        l1 = cache._LRU(max_entries=16, ttl=60)
+        value = {'name': 'old'}
+        l1.set(key='server_1', value=value, timeout=60)
+        value['name'] = 'changed'
+        l1.get(key='server_1')['name'] = 'changed'
+
+        self.assertEqual(l1.get(key='server_1'), {'name': 'old'})
+
+    def test_disabled_with_local_backends(self):
+        for backend in ('django.core.cache.backends.dummy.DummyCache', 'django.core.cache.backends.locmem.LocMemCache'):
+            with (
+                self.subTest(backend=backend),
+                test.override_settings(CACHES={'default': {'BACKEND': backend}}),
+                mock.patch.object(cache, '_l1', None),
+            ):
+                l1 = cache._get_l1()
+                l1.set(key='server_1', value={'name': 'old'}, timeout=60)
+                self.assertEqual(l1.get(key='server_1'), cache.NO_HIT)
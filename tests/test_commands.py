@@ -0,0 +1,28 @@
+import asyncio
+import functools
+import itertools
+import unittest
+from unittest import mock
+
+from django import test
+
+if hasattr(itertools, 'batched'):
+    from bot.management.commands import bot
+
+
+@unittest.skipUnless(hasattr(itertools, 'batched'), 'The discord adapter needs Python 3.12')
+class BotCommandTest(test.SimpleTestCase):
+    @test.override_settings(STATS_LOG_INTERVAL=0.01)
+    async def test_stats_logged_while_running(self):
+        bot_instance = mock.Mock()
+        bot_instance.run = mock.AsyncMock(side_effect=functools.partial(asyncio.sleep, 0.05))
+
+        with (
+            mock.patch.object(bot.Command, '_log_stats') as log_stats,
+            mock.patch.object(bot.registry, 'close', mock.AsyncMock()),
+            mock.patch.object(bot.stream, 'close'),
+        ):
+            await bot.Command._run(bot_instance)
+
+        # Periodically and once more on shutdown
+        self.assertGreater(log_stats.call_count, 2)
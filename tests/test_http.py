@@ -0,0 +1,33 @@
+from aiohttp import test_utils
+from aiohttp import web
+from django import test
+
+from bot.common import http
+
+
+async def _login(request):
+    response = web.HTTPFound('/account')
+    response.set_cookie('session', 'secret')
+    raise response
+
+
+async def _account(request):
+    return web.json_response(dict(request.cookies))
+
+
+class SessionPoolTest(test.SimpleTestCase):
+    async def test_cookies_are_not_shared_between_requests(self):
+        app = web.Application()
+        app.router.add_get('/login', _login)
+        app.router.add_get('/account', _account)
+        pool = http.SessionPool(name='test')
+        async with test_utils.TestServer(app) as server:
+            try:
+                async with pool.session.get(server.make_url('/login'), cookies={'consent': 'yes'}) as resp:
+                    # Request cookies are sent along the redirect
+                    self.assertEqual(await resp.json(), {'consent': 'yes'})
+
+                async with pool.session.get(server.make_url('/account')) as resp:
+                    self.assertEqual(await resp.json(), {})
+            finally:
+                await pool.close()
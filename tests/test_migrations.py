@@ -0,0 +1,36 @@
+import importlib
+import os
+import tempfile
+from unittest import mock
+
+from django import test
+from django.core import exceptions
+
+blob_hash_migration = importlib.import_module('bot.migrations.0003_post_blob_hash')
+
+
+def _apps(posts):
+    apps = mock.Mock()
+    queryset = apps.get_model.return_value.objects.exclude.return_value
+    queryset.exists.return_value = bool(posts)
+    queryset.only.return_value.iterator.return_value = posts
+    return apps
+
+
+class PostBlobHashMigrationTest(test.SimpleTestCase):
+    @test.override_settings(BLOB_STORE={'backend': 's3'})
+    def test_fails_with_other_backends(self):
+        with self.assertRaises(exceptions.ImproperlyConfigured):
+            blob_hash_migration.check_blob_store(_apps([mock.Mock()]), None)
+
+        # Nothing to move
+        blob_hash_migration.check_blob_store(_apps([]), None)
+
+    def test_moves_blobs_to_configured_path(self):
+        post = mock.Mock(blob=memoryview(b'video'))
+        with tempfile.TemporaryDirectory() as path, test.override_settings(BLOB_STORE={'path': path}):
+            blob_hash_migration.move_blobs_to_store(_apps([post]), None)
+
+            with open(os.path.join(path, post.blob_hash[:2], post.blob_hash[2:4], post.blob_hash), 'rb') as f:
+                self.assertEqual(f.read(), b'video')
+        post.save.assert_called_once_with(update_fields=['blob_hash'])
@@ -0,0 +1,30 @@
+from unittest import mock
+
+from django import test
+
+from bot import repository
+
+
+class DeleteUnreferencedBlobsTest(test.SimpleTestCase):
+    def test_deletes_only_unreferenced_blobs(self):
+        store = mock.Mock()
+        with (
+            mock.patch.object(repository.models.Post, 'objects') as objects,
+            mock.patch.object(repository.blob_store, 'get_store', return_value=store),
+        ):
+            objects.filter.return_value.values_list.return_value = ['shared']
+            repository._delete_unreferenced_blobs(blob_hashes={'shared', 'orphan'})
+
+        store.delete.assert_called_once_with('orphan')
+
+    def test_store_errors_are_not_raised(self):
+        store = mock.Mock()
+        store.delete.side_effect = ConnectionError
+        with (
+            mock.patch.object(repository.models.Post, 'objects') as objects,
+            mock.patch.object(repository.blob_store, 'get_store', return_value=store),
+        ):
+            objects.filter.return_value.values_list.return_value = []
+            repository._delete_unreferenced_blobs(blob_hashes={'orphan'})
+
+        store.delete.assert_called_once_with('orphan')
@@ -0,0 +1,43 @@
+import asyncio
+from unittest import mock
+
+from django import test
+
+from bot import constants
+from bot import domain
+from bot.common import media
+from bot.service import basic
+
+
+class FetchPostTest(test.SimpleTestCase):
+    def setUp(self):
+        self.service = basic.Service()
+        self.client = mock.Mock()
+        self.limits = []
+
+        async def get_post(url):
+            self.limits.append(media.upload_limit.get())
+            await asyncio.sleep(0.01)
+            return domain.Post(url=url)
+
+        self.client.get_post.side_effect = get_post
+
+    async def _fetch(self, upload_limit):
+        with media.upload_limit_scope(upload_limit):
+            return await self.service._fetch_post(
+                client=self.client,
+                url='https://example.com/1',
+                integration=constants.Integration.REDDIT,
+                integration_uid='1',
+                integration_index=None,
+            )
+
+    async def test_same_upload_limit_shares_fetch(self):
+        await asyncio.gather(self._fetch(10 * 1024 * 1024), self._fetch(10 * 1024 * 1024))
+
+        self.assertEqual(self.limits, [10 * 1024 * 1024])
+
+    async def test_different_upload_limits_fetch_separately(self):
+        await asyncio.gather(self._fetch(10 * 1024 * 1024), self._fetch(50 * 1024 * 1024))
+
+        self.assertEqual(sorted(self.limits), [10 * 1024 * 1024, 50 * 1024 * 1024])
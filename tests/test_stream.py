@@ -0,0 +1,47 @@
+import functools
+import os
+import tempfile
+import threading
+from http import server
+from unittest import mock
+
+from django import test
+from yt_dlp import postprocessor
+
+from bot.common import stream
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'hls')
+
+
+class _QuietHandler(server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class DownloadTest(test.SimpleTestCase):
+    def setUp(self):
+        httpd = server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=FIXTURES_DIR))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        self.url = f'http://127.0.0.1:{httpd.server_port}/playlist.m3u8'
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, 'video')
+
+    def test_hls_download_is_fixed_up(self):
+        def fixup(pp, info):
+            return [], info
+
+        with (
+            mock.patch.object(postprocessor.FFmpegFixupM3u8PP, 'available', True),
+            mock.patch.object(postprocessor.FFmpegFixupM3u8PP, 'run', side_effect=fixup, autospec=True) as run,
+        ):
+            info, filename = stream._download(url=self.url, params={}, path=self.path, max_size=1024 * 1024)
+
+        run.assert_called_once()
+        self.assertEqual(filename, f'{self.path}.mp4')
+        with open(filename, 'rb') as f, open(os.path.join(FIXTURES_DIR, 'segment0.ts'), 'rb') as segment:
+            self.assertEqual(f.read(), segment.read() * 2)
+        self.assertEqual(info['protocol'], 'm3u8_native')
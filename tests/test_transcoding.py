@@ -0,0 +1,29 @@
+import asyncio
+
+from django import test
+
+from bot.common import transcoding
+
+
+class SchedulerTest(test.SimpleTestCase):
+    async def test_waiter_cancelled_during_release(self):
+        scheduler = transcoding.Scheduler(max_jobs=1)
+        await scheduler._acquire(job_priority=0)
+
+        cancelled = asyncio.create_task(scheduler._acquire(job_priority=1))
+        waiting = asyncio.create_task(scheduler._acquire(job_priority=0))
+        while len(scheduler._queue) < 2:
+            await asyncio.sleep(0)
+
+        # The release pops the cancelled waiter before its task gets to clean up
+        cancelled.cancel()
+        scheduler._release()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await cancelled
+        await waiting
+        self.assertEqual(scheduler.running(), 1)
+        self.assertEqual(scheduler.queued(), 0)
+
+        scheduler._release()
+        self.assertEqual(scheduler.running(), 0)
@@ -0,0 +1,165 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+import twscrape
+from django import test
+
+from bot import domain
+from bot import exceptions
+from bot.integrations import base
+from bot.integrations.twitter import accounts
+from bot.integrations.twitter import client
+
+HLS_URL = 'https://video.twimg.com/ext_tw_video/1/pu/pl/playlist.m3u8'
+
+
+def _syndication_tweet(variants):
+    return json.dumps(
+        {
+            'user': {'name': 'user'},
+            'text': 'text',
+            'favorite_count': 1,
+            'created_at': '2024-01-01T00:00:00.000Z',
+            'mediaDetails': [{'type': 'video', 'video_info': {'variants': variants}}],
+        }
+    )
+
+
+class TwitterSyndicationTest(test.SimpleTestCase):
+    def setUp(self):
+        self.client = client.TwitterClient(accounts=[], hedge_delay=None)
+
+    async def test_hls_only_video_is_streamed(self):
+        buffer = io.BytesIO(b'video')
+        variants = [{'content_type': 'application/x-mpegURL', 'url': HLS_URL}]
+        with (
+            mock.patch.object(self.client, '_fetch_content', return_value=_syndication_tweet(variants)),
+            mock.patch.object(client.stream, 'download', return_value=buffer) as download,
+        ):
+            post = await self.client.get_post('https://x.com/user/status/1')
+
+        download.assert_awaited_once_with(stream_url=HLS_URL)
+        self.assertIs(post.buffer, buffer)
+
+    async def test_progressive_variants_are_preferred(self):
+        variants = [
+            {'content_type': 'application/x-mpegURL', 'url': HLS_URL},
+            {'bitrate': 832000, 'content_type': 'video/mp4', 'url': 'https://video.twimg.com/low.mp4'},
+            {'bitrate': 2176000, 'content_type': 'video/mp4', 'url': 'https://video.twimg.com/high.mp4'},
+        ]
+        with (
+            mock.patch.object(self.client, '_fetch_content', return_value=_syndication_tweet(variants)),
+            mock.patch.object(self.client, '_download_variants', return_value=io.BytesIO()) as download_variants,
+        ):
+            await self.client.get_post('https://x.com/user/status/2')
+
+        download_variants.assert_awaited_once_with(
+            urls=['https://video.twimg.com/high.mp4', 'https://video.twimg.com/low.mp4']
+        )
+
+    async def test_no_variants(self):
+        with mock.patch.object(self.client, '_fetch_content', return_value=_syndication_tweet([])):
+            with self.assertRaises(exceptions.IntegrationClientError):
+                await self.client.get_post('https://x.com/user/status/3')
+
+
+class DownloadVariantsTest(test.SimpleTestCase):
+    async def test_empty_variants(self):
+        with self.assertRaises(exceptions.IntegrationClientError):
+            await base.BaseClient._download_variants(mock.Mock(), urls=[])
+
+
+class SchedulerStatsTest(test.SimpleTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.scheduler = accounts.Scheduler(usernames=['user'], db_file=os.path.join(tmp_dir.name, 'accounts.db'))
+
+    async def _request(self):
+        async def func(api):
+            return {}
+
+        await self.scheduler._run(func)
+
+    async def test_stats_logged_periodically(self):
+        with mock.patch.object(self.scheduler, 'log_stats') as log_stats:
+            await self._request()
+            log_stats.assert_not_called()
+
+            with mock.patch.object(accounts, '_STATS_INTERVAL', 0):
+                await self._request()
+            log_stats.assert_called_once()
+
+        self.assertEqual(self.scheduler.stats()[0].requests, 2)
+
+
+class AccountsPoolTest(test.SimpleTestCase):
+    async def test_hands_out_only_its_account(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, 'accounts.db')
+            pool = accounts._AccountsPool(username="o'brien", db_file=db_file)
+            for username in ('other', "o'brien"):
+                await pool.add_account(username=username, password='pw', email='e', email_password='pw')
+                await pool.set_active(username, True)
+
+            account = await pool.get_for_queue(accounts.QUEUE)
+            self.assertEqual(account.username, "o'brien")
+            # Locked by the request until it is released
+            self.assertIsNone(await pool.get_for_queue(accounts.QUEUE))
+            with self.assertRaises(twscrape.NoAccountError):
+                await pool.get_for_queue_or_wait(accounts.QUEUE)
+
+            await pool.unlock("o'brien", accounts.QUEUE)
+            self.assertEqual((await pool.get_for_queue(accounts.QUEUE)).username, "o'brien")
+
+            await pool.unlock("o'brien", accounts.QUEUE)
+            await pool.set_active("o'brien", False)
+            self.assertIsNone(await pool.get_for_queue(accounts.QUEUE))
+
+
+class TwitterHedgedTest(test.SimpleTestCase):
+    def setUp(self):
+        self.client = client.TwitterClient(accounts=[], hedge_delay=0.01)
+        self.client.client = mock.Mock()
+        self.authenticated_post = domain.Post(url='https://x.com/user/status/1', description='authenticated')
+        self.syndication_post = domain.Post(url='https://x.com/user/status/1', description='syndication')
+
+    async def _get_post(self, photos, authenticated_delay, authenticated_error=None):
+        async def get_post_authenticated(url, uid, index):
+            await asyncio.sleep(authenticated_delay)
+            if authenticated_error:
+                raise authenticated_error
+            return self.authenticated_post
+
+        tweet = {'mediaDetails': [{'type': 'photo'}] * photos}
+        with (
+            mock.patch.object(self.client, '_get_post_authenticated', side_effect=get_post_authenticated),
+            mock.patch.object(self.client, '_get_syndication_tweet', return_value=tweet),
+            mock.patch.object(self.client, '_get_post_no_login', return_value=self.syndication_post),
+        ):
+            return await self.client.get_post('https://x.com/user/status/1')
+
+    async def test_slow_authenticated_loses_to_syndication(self):
+        post = await self._get_post(photos=1, authenticated_delay=1)
+
+        self.assertIs(post, self.syndication_post)
+
+    async def test_fast_authenticated_wins(self):
+        post = await self._get_post(photos=1, authenticated_delay=0)
+
+        self.assertIs(post, self.authenticated_post)
+
+    async def test_gallery_waits_for_slow_authenticated(self):
+        post = await self._get_post(photos=2, authenticated_delay=0.05)
+
+        self.assertIs(post, self.authenticated_post)
+
+    async def test_gallery_falls_back_to_syndication(self):
+        error = exceptions.IntegrationClientError('Failed')
+        post = await self._get_post(photos=2, authenticated_delay=0.05, authenticated_error=error)
+
+        self.assertIs(post, self.syndication_post)
@@ -0,0 +1,36 @@
+import io
+import random
+
+from PIL import Image
+from django import test
+
+from bot.common import media
+from bot.common import utils
+
+
+def _jpeg(quality):
+    rng = random.Random(0)
+    image = Image.frombytes('RGB', (400, 400), bytes(rng.getrandbits(8) for _ in range(400 * 400 * 3)))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    buffer.seek(0)
+    return buffer
+
+
+@test.override_settings(IMAGE_PROCESS_POOL_SIZE=0)
+class ResizeImageTest(test.SimpleTestCase):
+    async def test_larger_encoding_keeps_original(self):
+        buffer = _jpeg(quality=20)
+
+        resized = await utils.resize_image(buffer, factor=1.0, max_size=10 * 1024 * 1024)
+
+        self.assertIs(resized, buffer)
+        self.assertEqual(resized.tell(), 0)
+
+    async def test_resize_shrinks_by_a_quarter(self):
+        buffer = _jpeg(quality=95)
+        size = media.buffer_size(buffer)
+
+        resized = await utils.resize(buffer, extension='.jpg')
+
+        self.assertLessEqual(media.buffer_size(resized), size * 0.75)